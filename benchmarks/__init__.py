@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads')
+
+
+def load_payload(name):
+    """
+    Записанный ответ Qiwi API из ``benchmarks/payloads``
+    """
+    with open(os.path.join(PAYLOAD_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
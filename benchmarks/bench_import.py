@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module):
+    """
+    Суммарное время импорта модуля в чистом интерпретаторе по ``python -X importtime``, в секундах
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {0}'.format(module)],
+                            env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    for line in output.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e6
+    raise ValueError('{0} not found in -X importtime output'.format(module))
+
+
+class ImportTime:
+    def track_import_pyqiwi(self):
+        return import_time('pyqiwi')
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import copy
+import datetime
+
+from pyqiwi import types, util
+from pyqiwi.index import TransactionIndex
+from pyqiwi.rates import RateTable
+from pyqiwi.reconcile import Reconciler
+from pyqiwi.watcher import SeenSet
+
+from . import load_payload
+
+
+def _transactions(count):
+    template = load_payload('history.json')['data'][0]
+    start = datetime.datetime(2018, 5, 1, tzinfo=util.MSK)
+    transactions = []
+    for i in range(count):
+        row = copy.deepcopy(template)
+        row['txnId'] = i
+        row['date'] = (start + datetime.timedelta(seconds=i)).isoformat()
+        row['comment'] = 'order-{0}'.format(i)
+        row['sum']['amount'] = float(i % 10000)
+        transactions.append(types.Transaction.de_json(row))
+    return transactions
+
+
+class TransactionLookup:
+    """
+    Поиск платежа по комментарию и сумме среди 100 000 транзакций
+    """
+
+    def setup(self):
+        self.transactions = _transactions(100000)
+        self.index = TransactionIndex()
+        self.index.update(self.transactions)
+
+    def time_index_find(self):
+        self.index.find(comment='order-77777', amount=7777.0)
+
+    def time_index_amount_range(self):
+        self.index.find(amount=(7777.0, 7777.0))
+
+    def time_linear_scan(self):
+        [t for t in self.transactions if t.comment == 'order-77777' and t.sum.amount == 7777.0]
+
+
+class Reconciliation:
+    """
+    Сверка 1000 платежей при 200 000 открытых счетов
+    """
+
+    def setup(self):
+        self.transactions = _transactions(1000)
+        self.reconciler = Reconciler()
+        # Счета остаются частично оплаченными при любом числе повторов
+        for i in range(200000):
+            self.reconciler.expect('order-{0}'.format(i), 1e9)
+
+    def time_feed(self):
+        # Дубликаты отбрасываются до поиска, поэтому между повторами забываем увиденные ID
+        self.reconciler.seen = SeenSet()
+        for transaction in self.transactions:
+            self.reconciler.feed(transaction)
+
+
+class CurrencyConversion:
+    """
+    Пересчет 10 000 цен из евро в рубли
+    """
+
+    unit = (10000, 'amounts')
+
+    def setup(self):
+        self.rates = [types.Rate.de_json(rate) for rate in load_payload('cross_rates.json')['result']]
+        self.table = RateTable(self.rates)
+        self.amounts = [float(i % 1000) + 0.99 for i in range(10000)]
+
+    def time_rate_table(self):
+        self.table.convert_many(self.amounts, 978, 643)
+
+    def time_linear_search(self):
+        [amount * next(r.rate for r in self.rates if r._from == 978 and r.to == 643) for amount in self.amounts]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import io
+
+from pyqiwi import export, types
+
+from . import load_payload
+
+
+class TransactionParsing:
+    unit = (50, 'rows')
+
+    def setup(self):
+        self.rows = load_payload('history.json')['data']
+
+    def time_de_json(self):
+        for row in self.rows:
+            types.Transaction.de_json(row)
+
+
+class TransactionExport:
+    unit = (50, 'rows')
+
+    def setup(self):
+        self.rows = load_payload('history.json')['data']
+
+    def time_ndjson(self):
+        writer = export.NDJSONWriter(io.StringIO())
+        for row in self.rows:
+            writer.write(export.flatten(row))
+
+
+class DateDecoding:
+    def setup(self):
+        self.date = load_payload('history.json')['data'][0]['date']
+
+    def time_decode_date(self):
+        types.JsonDeserializable.decode_date(self.date)
+
+
+class ProfileParsing:
+    def setup(self):
+        self.profile = load_payload('profile.json')
+
+    def time_de_json(self):
+        types.Profile.de_json(self.profile)
+
+
+class RateParsing:
+    def setup(self):
+        self.rates = load_payload('cross_rates.json')['result']
+
+    def time_de_json(self):
+        for rate in self.rates:
+            types.Rate.de_json(rate)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+import requests
+
+import pyqiwi
+from pyqiwi import apihelper, transport
+from pyqiwi.cache import CacheMiddleware
+from pyqiwi.metrics import Metrics
+from pyqiwi.profiling import Profiler
+from pyqiwi.refresh import RefreshMiddleware
+from pyqiwi.simulator import Simulator
+
+from . import load_payload
+
+
+class _CannedSession:
+    """
+    Сессия, отвечающая заранее записанным ответом без обращения к сети
+    """
+
+    def __init__(self, payload):
+        self.response = requests.Response()
+        self.response.status_code = 200
+        self.response.reason = 'OK'
+        self.response._content = json.dumps(payload).encode('utf-8')
+        self.response.encoding = 'utf-8'
+
+    def request(self, method, url, **kwargs):
+        return self.response
+
+
+class RequestOverhead:
+    """
+    Накладные расходы клиента на один запрос, без сети
+    """
+
+    def setup(self):
+        self.session = apihelper._default_session()
+        apihelper.session = _CannedSession(load_payload('history.json'))
+
+    def teardown(self):
+        apihelper.session = self.session
+
+    def time_make_request(self):
+        apihelper._make_request('token', 'payment-history/v2/persons/79000000000/payments', params={'rows': 50})
+
+    def time_history(self):
+        pyqiwi.Wallet('token', number='79000000000', contract_info=False).history(rows=50)
+
+
+class MetricsOverhead:
+    """
+    Накладные расходы на один запрос со сбором метрик, без сети
+    """
+
+    def setup(self):
+        self.session = apihelper._default_session()
+        apihelper.session = _CannedSession(load_payload('profile.json'))
+        self.metrics = Metrics().install()
+
+    def teardown(self):
+        self.metrics.uninstall()
+        apihelper.session = self.session
+
+    def time_make_request(self):
+        apihelper._make_request('token', 'person-profile/v1/profile/current')
+
+
+class ProfilerOverhead:
+    """
+    Накладные расходы на один запрос с профилированием по фазам, без сети
+    """
+
+    def setup(self):
+        self.session = apihelper._default_session()
+        apihelper.session = _CannedSession(load_payload('profile.json'))
+        self.profiler = Profiler().install()
+
+    def teardown(self):
+        self.profiler.uninstall()
+        apihelper.session = self.session
+
+    def time_make_request(self):
+        apihelper._make_request('token', 'person-profile/v1/profile/current')
+
+
+class FormLink:
+    def time_generate_form_link(self):
+        pyqiwi.generate_form_link('99', '79000000000', 123.45, 'order-1', blocked=['sum', 'account'])
+
+
+class LocalRoundTrip:
+    """
+    Полный запрос к локальному симулятору Qiwi API
+    """
+
+    def setup(self):
+        self.simulator = Simulator(transactions=10).__enter__()
+
+    def teardown(self):
+        self.simulator.__exit__(None, None, None)
+
+    def time_funding_sources(self):
+        apihelper.funding_sources(self.simulator.token)
+
+
+class TransportRoundTrip:
+    """
+    Запрос к локальному симулятору через разные транспорты
+    """
+
+    params = ['requests', 'urllib3', 'httpx']
+
+    def setup(self, name):
+        self.simulator = Simulator(transactions=10).__enter__()
+        if name == 'requests':
+            self.transport = transport.RequestsTransport()
+        elif name == 'urllib3':
+            self.transport = transport.Urllib3Transport()
+        else:
+            from pyqiwi.http2 import HTTP2Session
+            self.transport = HTTP2Session(max_connections=1, http2=False)
+
+    def teardown(self, name):
+        self.transport.close()
+        self.simulator.__exit__(None, None, None)
+
+    def time_funding_sources(self, name):
+        apihelper.funding_sources(self.simulator.token, transport=self.transport)
+
+
+class InMemoryRoundTrip:
+    """
+    Запрос к симулятору через транспорт в памяти: накладные расходы клиента и middleware
+    """
+
+    def setup(self):
+        self.simulator = Simulator(transactions=10)
+        self.transport = self.simulator.transport()
+
+    def time_funding_sources(self):
+        apihelper.funding_sources(self.simulator.token, transport=self.transport)
+
+
+class CachedRates:
+    """
+    Самый медленный запрос курсов валют за 0.3 секунды при времени жизни 200 мс и задержке Qiwi API 20 мс:
+    с кэшем вызов ждет сеть после каждого истечения, с фоновым обновлением - нет
+    """
+
+    params = ['cache', 'refresh']
+
+    def setup(self, name):
+        self.simulator = Simulator(latency=0.02).__enter__()
+        rules = [(r'sinap/crossRates', 0.2, True)]
+        if name == 'cache':
+            self.middleware = CacheMiddleware(rules=rules)
+        else:
+            self.middleware = RefreshMiddleware(rules=rules)
+        self.transport = transport.Urllib3Transport(middleware=[self.middleware])
+        apihelper.cross_rates(self.simulator.token, transport=self.transport)
+
+    def teardown(self, name):
+        if name == 'refresh':
+            self.middleware.close()
+        self.transport.close()
+        self.simulator.__exit__(None, None, None)
+
+    def track_slowest_call(self, name):
+        slowest = 0.0
+        end = time.perf_counter() + 0.3
+        while time.perf_counter() < end:
+            started = time.perf_counter()
+            apihelper.cross_rates(self.simulator.token, transport=self.transport)
+            slowest = max(slowest, time.perf_counter() - started)
+        return slowest
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+
+import pyqiwi
+from pyqiwi import apihelper
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import SessionPool
+
+
+class Pagination:
+    unit = (1000, 'rows')
+
+    def setup(self):
+        self.simulator = Simulator(transactions=1000).__enter__()
+        self.wallet = pyqiwi.Wallet(self.simulator.token)
+
+    def teardown(self):
+        self.simulator.__exit__(None, None, None)
+
+    def time_history_since(self):
+        self.wallet.history_since(0)
+
+
+class PayoutConcurrency:
+    """
+    Пачка из 64 платежей при разном числе потоков, задержка ответа 5 мс
+    """
+    params = [1, 4, 16, 64]
+    unit = (64, 'payouts')
+
+    def setup(self, workers):
+        self.simulator = Simulator(transactions=0, latency=0.005).__enter__()
+        self.simulator.wallets[self.simulator.token].balance = 10 ** 12
+        self.wallet = pyqiwi.Wallet(self.simulator.token)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        apihelper.configure_pool(workers)
+
+    def teardown(self, workers):
+        self.executor.shutdown()
+        self.simulator.__exit__(None, None, None)
+
+    def time_payouts(self, workers):
+        list(self.executor.map(lambda i: self.wallet.qiwi_transfer('79000000001', 1), range(64)))
+
+
+class SessionPoolThroughput:
+    """
+    256 запросов баланса через потокобезопасный транспорт при разном числе потоков, задержка ответа 5 мс:
+    по сессии на поток и пул из 16 сессий
+    """
+    params = [1, 8, 32, 128]
+    unit = (256, 'requests')
+
+    def setup(self, threads):
+        self.simulator = Simulator(wallets=8, transactions=0, latency=0.005).__enter__()
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.transports = {'thread': SessionPool(), 'pool': SessionPool(size=16)}
+        self.wallets = {name: [pyqiwi.Wallet(token, transport=transport) for token in self.simulator.wallets]
+                        for name, transport in self.transports.items()}
+
+    def teardown(self, threads):
+        self.executor.shutdown()
+        for transport in self.transports.values():
+            transport.close()
+        self.simulator.__exit__(None, None, None)
+
+    def _run(self, wallets):
+        list(self.executor.map(lambda i: wallets[i % len(wallets)].balance(), range(256)))
+
+    def time_per_thread_sessions(self, threads):
+        self._run(self.wallets['thread'])
+
+    def time_session_pool(self, threads):
+        self._run(self.wallets['pool'])
+
+
+class BulkTransactions:
+    """
+    Статус 50 платежей при задержке ответа 5 мс: по одному запросу подряд,
+    параллельно и повторно, когда все платежи уже завершены
+    """
+    unit = (50, 'transactions')
+
+    def setup(self):
+        self.simulator = Simulator(transactions=50, latency=0.005).__enter__()
+        self.wallet = pyqiwi.Wallet(self.simulator.token)
+        self.ids = [(t.txn_id, t.type) for t in self.wallet.history(rows=50)['transactions']]
+        apihelper.configure_pool(8)
+
+    def teardown(self):
+        self.simulator.__exit__(None, None, None)
+
+    def time_sequential(self):
+        for txn_id, txn_type in self.ids:
+            self.wallet.transaction(txn_id, txn_type)
+
+    def time_bulk(self):
+        self.wallet._final_transactions.clear()
+        self.wallet.transactions(self.ids)
+
+    def time_bulk_cached(self):
+        self.wallet.transactions(self.ids)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Запуск бенчмарков pyQiwi
+
+Бенчмарки описываются в стиле asv: модули ``bench_*.py``, классы с методами ``time_*``,
+необязательные ``setup``/``teardown`` и ``params``.
+Результат каждого бенчмарка - минимальное время одного вызова в секундах.
+Методы ``track_*`` сами возвращают измеренное значение в секундах, например время импорта.
+
+    $ python benchmarks/run.py                 # запуск и сравнение с baseline.json
+    $ python benchmarks/run.py --save          # сохранение результатов в baseline.json
+    $ python benchmarks/run.py -k parsing      # только бенчмарки, содержащие "parsing"
+"""
+import argparse
+import importlib
+import json
+import os
+import pkgutil
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+
+def discover(pattern=None):
+    for module_info in pkgutil.iter_modules([BENCHMARK_DIR]):
+        if not module_info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module('benchmarks.{0}'.format(module_info.name))
+        for class_name, cls in sorted(vars(module).items()):
+            if not isinstance(cls, type) or cls.__module__ != module.__name__ or class_name.startswith('_'):
+                continue
+            for method_name in sorted(dir(cls)):
+                if not method_name.startswith(('time_', 'track_')):
+                    continue
+                for param in getattr(cls, 'params', [None]):
+                    name = '{0}.{1}.{2}'.format(module_info.name, class_name, method_name)
+                    if param is not None:
+                        name = '{0}({1})'.format(name, param)
+                    if pattern is None or pattern in name:
+                        yield name, cls, method_name, param
+
+
+def measure(cls, method_name, param, repeat=5, min_time=0.2):
+    args = () if param is None else (param,)
+    instance = cls()
+    if hasattr(instance, 'setup'):
+        instance.setup(*args)
+    try:
+        func = getattr(instance, method_name)
+        if method_name.startswith('track_'):
+            return min(func(*args) for _ in range(repeat)), getattr(instance, 'unit', None)
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                func(*args)
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time or number >= 10 ** 6:
+                break
+            number *= 10 if elapsed < min_time / 10 else 2
+        timings = [elapsed / number]
+        for _ in range(repeat - 1):
+            started = time.perf_counter()
+            for _ in range(number):
+                func(*args)
+            timings.append((time.perf_counter() - started) / number)
+        return min(timings), getattr(instance, 'unit', None)
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*args)
+
+
+def _format(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{0:.3f} {1}'.format(seconds / scale, unit)
+    return '{0:.1f} ns'.format(seconds / 1e-9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-k', dest='pattern', help='запускать только бенчмарки, содержащие строку')
+    parser.add_argument('--save', action='store_true', help='сохранить результаты как baseline')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='допустимое замедление относительно baseline (по умолчанию 1.5)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    results = {}
+    regressions = []
+    for name, cls, method_name, param in discover(args.pattern):
+        seconds, unit = measure(cls, method_name, param, repeat=args.repeat)
+        results[name] = seconds
+        line = '{0:<70} {1:>12}'.format(name, _format(seconds))
+        if unit:
+            line += '  {0:>12,.0f} {1}/s'.format(unit[0] / seconds, unit[1])
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            line += '  x{0:.2f}'.format(ratio)
+            if ratio > args.threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+        sys.stdout.flush()
+    if args.save:
+        baseline.update(results)
+        with open(BASELINE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if regressions and not args.save:
+        print('{0} benchmark(s) slower than baseline x{1}: {2}'.format(
+            len(regressions), args.threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Сравнение транспортов под параллельной нагрузкой: p50/p99 задержки и число соединений
+
+    $ python benchmarks/transports.py                          # на локальном симуляторе (HTTP/1.1)
+    $ TOKEN=... NUMBER=... python benchmarks/transports.py     # на edge.qiwi.com (HTTP/2 через TLS)
+
+Симулятор работает только по HTTP/1.1, поэтому реальный выигрыш от мультиплексирования
+виден только при замере на edge.qiwi.com.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyqiwi import apihelper  # noqa: E402
+from pyqiwi.http2 import HTTP2Session  # noqa: E402
+from pyqiwi.simulator import Simulator  # noqa: E402
+
+
+def requests_connections(session):
+    total = 0
+    for adapter in set(session.adapters.values()):
+        for key in adapter.poolmanager.pools.keys():
+            total += adapter.poolmanager.pools[key].num_connections
+    return total
+
+
+def run(transport, token, number, workers, calls):
+    def call(i):
+        started = time.perf_counter()
+        if i % 2:
+            apihelper.payment_history(token, number, 10, transport=transport)
+        else:
+            apihelper.cross_rates(token, transport=transport)
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(workers) as executor:
+        started = time.perf_counter()
+        latencies = sorted(executor.map(call, range(calls)))
+        elapsed = time.perf_counter() - started
+    return {'p50': statistics.median(latencies) * 1000,
+            'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            'rps': calls / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.01, help='задержка ответа симулятора в секундах')
+    args = parser.parse_args()
+
+    simulator = None
+    if 'TOKEN' in os.environ and 'NUMBER' in os.environ:
+        token, number = os.environ['TOKEN'], os.environ['NUMBER']
+    else:
+        simulator = Simulator(transactions=100, latency=args.latency).__enter__()
+        token, number = simulator.token, simulator.number
+    try:
+        session = requests.session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        result = run(session, token, number, args.workers, args.calls)
+        result['connections'] = requests_connections(session)
+        print('{0:<10} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  {rps:8.1f} req/s  {connections} connections'
+              .format('requests', **result))
+        with HTTP2Session(max_connections=4) as transport:
+            result = run(transport, token, number, args.workers, args.calls)
+            result['connections'] = transport.connections
+        print('{0:<10} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  {rps:8.1f} req/s  {connections} connections'
+              .format('http2', **result))
+    finally:
+        if simulator is not None:
+            simulator.__exit__(None, None, None)
+
+
+if __name__ == '__main__':
+    main()
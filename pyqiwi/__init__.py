@@ -6,10 +6,52 @@ by mostm
 See pyQiwi Documentation: pyqiwi.readthedocs.io
 """
 import datetime
-from functools import partial
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+from functools import wraps
 from urllib.parse import urlencode
 
 from . import apihelper, types, util
+from .deadline import Deadline
+
+# Статусы транзакций, которые больше не меняются
+FINAL_STATUSES = frozenset(('SUCCESS', 'ERROR'))
+# Сколько завершенных транзакций запоминает кошелек, см. Wallet.transactions
+FINAL_TRANSACTIONS_SIZE = 10000
+# Потоки для Wallet.transactions, общие для всех кошельков, см. _lookup_executor
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _operation(method):
+    # Каждый вызов метода кошелька ограничен Wallet.timeout, включая все его запросы к API,
+    # и профилируется как одна операция, если установлен pyqiwi.profiling.Profiler
+    name = 'Wallet.' + method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = apihelper.profiler
+        if self.timeout is None and profiler is None:
+            return method(self, *args, **kwargs)
+        with ExitStack() as stack:
+            if profiler is not None:
+                stack.enter_context(profiler.operation(name))
+            if self.timeout is not None:
+                stack.enter_context(Deadline(self.timeout))
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _lookup_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='pyqiwi-transactions')
+        return _executor
 
 
 class Wallet:
@@ -33,6 +75,15 @@ class Wallet:
     user_info : Optional[bool]
         Логический признак выгрузки прочих пользовательских данных.
         По умолчанию - ``True``.
+    transport : Optional[:class:`Transport <pyqiwi.transport.Transport>`]
+        Транспорт для запросов этого кошелька: любой объект с методом ``request`` как у ``requests.Session``,
+        например :class:`Urllib3Transport <pyqiwi.transport.Urllib3Transport>`
+        или :class:`HTTP2Session <pyqiwi.http2.HTTP2Session>`.
+        По умолчанию - общая :data:`apihelper.session <pyqiwi.apihelper.session>`.
+    timeout : Optional[float]
+        Лимит времени в секундах на каждый вызов метода кошелька, включая все его запросы,
+        например все страницы :meth:`history_since`. См. :class:`Deadline <pyqiwi.deadline.Deadline>`.
+        По умолчанию - ``None``, без ограничения.
 
     Attributes
     -----------
@@ -43,20 +94,24 @@ class Wallet:
         Профиль пользователя.
     offered_accounts : iterable of :class:`Account <pyqiwi.types.Account>`
         Доступные счета для создания
+    active_webhook : dict
+        Активный обработчик уведомлений о платежах
     """
 
     def __str__(self):
         return '<Wallet(number={0}, token={1})>'.format(self.number, self.token)
 
     @property
+    @_operation
     def accounts(self):
-        result_json = apihelper.funding_sources(self.token)
+        result_json = apihelper.funding_sources(self.token, transport=self.transport)
         accounts = []
         for account in result_json['accounts']:
             accounts.append(types.Account.de_json(account))
         return accounts
 
     @property
+    @_operation
     def cross_rates(self):
         """
         Курсы валют QIWI Кошелька
@@ -67,12 +122,13 @@ class Wallet:
             Состоит из:
             :class:`Rate <pyqiwi.types.Rate>` - Курса.
         """
-        result_json = apihelper.cross_rates(self.token)
+        result_json = apihelper.cross_rates(self.token, transport=self.transport)
         rates = []
         for rate in result_json['result']:
             rates.append(types.Rate.de_json(rate))
         return rates
 
+    @_operation
     def balance(self, currency=643):
         """
         Баланс Visa QIWI Кошелька
@@ -105,11 +161,14 @@ class Wallet:
                          "really old Qiwi Account that needs password change.")
 
     @property
+    @_operation
     def profile(self):
         result_json = apihelper.person_profile(self.token, self.auth_info_enabled,
-                                               self.contract_info_enabled, self.user_info_enabled)
+                                               self.contract_info_enabled, self.user_info_enabled,
+                                               transport=self.transport)
         return types.Profile.de_json(result_json)
 
+    @_operation
     def history(self, rows=20, operation=None, start_date=None, end_date=None, sources=None, next_txn_date=None,
                 next_txn_id=None):
         """
@@ -160,7 +219,8 @@ class Wallet:
         """
         result_json = apihelper.payment_history(self.token, self.number, rows, operation=operation,
                                                 start_date=start_date, end_date=end_date, sources=sources,
-                                                next_txn_date=next_txn_date, next_txn_id=next_txn_id)
+                                                next_txn_date=next_txn_date, next_txn_id=next_txn_id,
+                                                transport=self.transport)
         transactions = []
         for transaction in result_json['data']:
             transactions.append(types.Transaction.de_json(transaction))
@@ -171,6 +231,53 @@ class Wallet:
                 "next_txn_date": ntd,
                 "next_txn_id": result_json.get('nextTxnId')}
 
+    @_operation
+    def history_since(self, since, operation=None, sources=None, rows=50):
+        """
+        История платежей, совершенных после контрольной точки
+
+        Страницы истории запрашиваются до тех пор, пока не встретится транзакция,
+        совершенная в момент контрольной точки или раньше.
+
+        Parameters
+        ----------
+        since : datetime.datetime or int
+            Контрольная точка: дата/время (без часового пояса считается московским временем)
+            или ID последней уже известной транзакции.
+        operation : Optional[str]
+            Тип операций в отчете, для отбора.
+            Варианты: ALL, IN, OUT, QIWI_CARD.
+        sources : Optional[list]
+            Источники платежа, для отбора.
+        rows : Optional[int]
+            Число платежей в одной странице ответа (от 1 до 50).
+
+        Returns
+        -------
+        list[:class:`Transaction <pyqiwi.types.Transaction>`]
+            Транзакции новее контрольной точки, от новых к старым.
+        """
+        if isinstance(since, datetime.datetime) and since.tzinfo is None:
+            since = since.replace(tzinfo=util.MSK)
+        transactions = []
+        next_txn_date = None
+        next_txn_id = None
+        while True:
+            page = self.history(rows=rows, operation=operation, sources=sources,
+                                next_txn_date=next_txn_date, next_txn_id=next_txn_id)
+            for transaction in page['transactions']:
+                if isinstance(since, datetime.datetime):
+                    if transaction.date is not None and transaction.date <= since:
+                        return transactions
+                elif transaction.txn_id <= since:
+                    return transactions
+                transactions.append(transaction)
+            next_txn_date = page['next_txn_date']
+            next_txn_id = page['next_txn_id']
+            if not next_txn_date or not next_txn_id:
+                return transactions
+
+    @_operation
     def transaction(self, txn_id, txn_type):
         """
         Получение транзакции из Qiwi API
@@ -187,9 +294,105 @@ class Wallet:
         :class:`Transaction <pyqiwi.types.Transaction>`
             Транзакция
         """
-        result_json = apihelper.get_transaction(self.token, txn_id, txn_type)
+        result_json = apihelper.get_transaction(self.token, txn_id, txn_type, transport=self.transport)
         return types.Transaction.de_json(result_json)
 
+    @_operation
+    def transactions(self, ids, txn_type=None, max_workers=8):
+        """
+        Получение нескольких транзакций параллельно
+
+        Повторяющиеся ID запрашиваются один раз. Транзакции в конечном статусе (SUCCESS, ERROR)
+        больше не меняются и запоминаются кошельком (не больше ``FINAL_TRANSACTIONS_SIZE``
+        последних): при следующих вызовах запрашиваются только транзакции, которые еще не завершены (WAITING).
+
+        Parameters
+        ----------
+        ids : iterable
+            Пары ``(ID, тип)`` или ID транзакций, если задан ``txn_type``.
+        txn_type : Optional[str]
+            Тип транзакций, заданных без типа (IN/OUT/QIWI_CARD).
+        max_workers : Optional[int]
+            Максимальное число одновременных запросов.
+            По умолчанию - 8.
+
+        Returns
+        -------
+        dict
+            Элемент ``ids`` - :class:`Transaction <pyqiwi.types.Transaction>`, в порядке ``ids``
+
+        Raises
+        ------
+        ValueError
+            ID транзакции задан без типа, а ``txn_type`` не указан.
+        :class:`APIError <pyqiwi.exceptions.APIError>`
+            Первая ошибка запроса, остальные запросы при этом отменяются.
+
+        Examples
+        --------
+        >>> payouts = wallet.transactions(payout_ids, txn_type='OUT')
+        >>> statuses = {txn_id: t.status for txn_id, t in payouts.items()}
+        """
+        keys = {}
+        for item in ids:
+            if item not in keys:
+                if isinstance(item, tuple):
+                    txn_id, kind = item
+                elif txn_type is None:
+                    raise ValueError("Не указан тип транзакции {0}".format(item))
+                else:
+                    txn_id, kind = item, txn_type
+                keys[item] = (str(txn_id), kind)
+        found = {}
+        missing = []
+        with self._final_lock:
+            for key in dict.fromkeys(keys.values()):
+                transaction = self._final_transactions.get(key)
+                if transaction is not None:
+                    self._final_transactions.move_to_end(key)
+                    found[key] = transaction
+                else:
+                    missing.append(key)
+        if len(missing) == 1:
+            found[missing[0]] = self._lookup(missing[0])
+        elif missing:
+            import contextvars
+            from concurrent.futures import FIRST_COMPLETED, wait
+
+            executor = _lookup_executor()
+            waiting = iter(missing)
+            pending = {}
+
+            def submit(count):
+                for key in itertools.islice(waiting, count):
+                    # Лимит времени вызова и профилирование передаются в потоки вместе с контекстом
+                    pending[executor.submit(contextvars.copy_context().run, self._lookup, key)] = key
+
+            # Общий пул потоков, но одновременно не больше max_workers запросов этого вызова
+            submit(max_workers)
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        found[pending.pop(future)] = future.result()
+                    submit(len(done))
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        return {item: found[key] for item, key in keys.items()}
+
+    def _lookup(self, key):
+        result_json = apihelper.get_transaction(self.token, key[0], key[1], transport=self.transport)
+        transaction = types.Transaction.de_json(result_json)
+        if transaction.status in FINAL_STATUSES:
+            with self._final_lock:
+                self._final_transactions[key] = transaction
+                while len(self._final_transactions) > FINAL_TRANSACTIONS_SIZE:
+                    self._final_transactions.popitem(last=False)
+        return transaction
+
+    @_operation
     def stat(self, start_date=None, end_date=None, operation=None, sources=None):
         """
         Статистика платежей
@@ -228,9 +431,10 @@ class Wallet:
         else:
             end_date = datetime.datetime.utcnow()
         result_json = apihelper.total_payment_history(self.token, self.number, start_date, end_date,
-                                                      operation=operation, sources=sources)
+                                                      operation=operation, sources=sources, transport=self.transport)
         return types.Statistics.de_json(result_json)
 
+    @_operation
     def commission(self, pid, recipient, amount):
         """
         Расчет комиссии для платежа
@@ -252,9 +456,10 @@ class Wallet:
         :class:`OnlineCommission <pyqiwi.types.OnlineCommission>`
             Комиссия для платежа
         """
-        result_json = apihelper.online_commission(self.token, recipient, pid, amount)
+        result_json = apihelper.online_commission(self.token, recipient, pid, amount, transport=self.transport)
         return types.OnlineCommission.de_json(result_json)
 
+    @_operation
     def send(self, pid, recipient, amount, comment=None, fields=None):
         """
         Отправить платеж
@@ -282,9 +487,11 @@ class Wallet:
         :class:`Payment <pyqiwi.types.Payment>`
             Платеж
         """
-        result_json = apihelper.payments(self.token, pid, amount, recipient, comment=comment, fields=fields)
+        result_json = apihelper.payments(self.token, pid, amount, recipient, comment=comment, fields=fields,
+                                         transport=self.transport)
         return types.Payment.de_json(result_json)
 
+    @_operation
     def identification(self, birth_date, first_name, middle_name, last_name, passport, inn=None, snils=None, oms=None):
         """
         Идентификация пользователя
@@ -322,10 +529,11 @@ class Wallet:
             Параметр внутри отвечающий за подтверждение успешной идентификации: Identity.check
         """
         result_json = apihelper.identification(self.token, self.number, birth_date, first_name, middle_name, last_name,
-                                               passport, inn, snils, oms)
+                                               passport, inn, snils, oms, transport=self.transport)
         result_json['base_inn'] = inn
         return types.Identity.de_json(result_json)
 
+    @_operation
     def create_account(self, account_alias):
         """
         Создание счета-баланса в Visa QIWI Wallet
@@ -341,17 +549,19 @@ class Wallet:
         bool
             Был ли успешно создан счет?
         """
-        created = apihelper.create_account(self.token, self.number, account_alias)
+        created = apihelper.create_account(self.token, self.number, account_alias, transport=self.transport)
         return created
 
     @property
+    @_operation
     def offered_accounts(self):
-        result_json = apihelper.get_accounts_offer(self.token, self.number)
+        result_json = apihelper.get_accounts_offer(self.token, self.number, transport=self.transport)
         accounts = []
         for account in result_json:
             accounts.append(types.Account.de_json(account))
         return accounts
 
+    @_operation
     def cheque(self, txn_id, txn_type, file_format='PDF', email=None):
         """
         Получение чека по транзакции, на E-Mail или файл.
@@ -372,10 +582,11 @@ class Wallet:
             ??? | Прямой возврат ответа от Qiwi API
         """
         if email:
-            return apihelper.cheque_send(self.token, txn_id, txn_type, email)
+            return apihelper.cheque_send(self.token, txn_id, txn_type, email, transport=self.transport)
         else:
-            return apihelper.cheque_file(self.token, txn_id, txn_type, file_format)
+            return apihelper.cheque_file(self.token, txn_id, txn_type, file_format, transport=self.transport)
 
+    @_operation
     def qiwi_transfer(self, account, amount, comment=None):
         """
         Перевод на Qiwi Кошелек
@@ -396,6 +607,7 @@ class Wallet:
         """
         return self.send("99", account, amount, comment=comment)
 
+    @_operation
     def mobile(self, account, amount):
         """
         Оплата мобильной связи.
@@ -423,7 +635,73 @@ class Wallet:
         else:
             raise ValueError("Не удалось определить провайдера!")
 
-    def __init__(self, token, number=None, contract_info=True, auth_info=True, user_info=True):
+    @_operation
+    def register_webhook(self, url, txn_type=2):
+        """
+        Регистрация обработчика уведомлений о платежах (webhook)
+
+        Parameters
+        ----------
+        url : str
+            Адрес, на который Qiwi будет отправлять уведомления.
+        txn_type : int
+            Тип транзакций для уведомлений: 0 - входящие, 1 - исходящие, 2 - все.
+
+        Returns
+        -------
+        dict
+            Описание обработчика, ID обработчика в ``hookId``.
+        """
+        return apihelper.register_webhook(self.token, url, txn_type, transport=self.transport)
+
+    @property
+    @_operation
+    def active_webhook(self):
+        return apihelper.active_webhook(self.token, transport=self.transport)
+
+    @_operation
+    def delete_webhook(self, hook_id):
+        """
+        Удаление обработчика уведомлений
+
+        Parameters
+        ----------
+        hook_id : str
+            ID обработчика.
+        """
+        return apihelper.delete_webhook(self.token, hook_id, transport=self.transport)
+
+    @_operation
+    def webhook_key(self, hook_id):
+        """
+        Секретный ключ для проверки подписи уведомлений
+
+        Parameters
+        ----------
+        hook_id : str
+            ID обработчика.
+
+        Returns
+        -------
+        str
+            Ключ в base64, используемый :class:`WebhookReceiver <pyqiwi.webhook.WebhookReceiver>`.
+        """
+        return apihelper.webhook_key(self.token, hook_id, transport=self.transport)['key']
+
+    @_operation
+    def get_commission(self, pid):
+        """
+        Получение стандартной комиссии, см. :func:`get_commission <pyqiwi.get_commission>`
+        """
+        return get_commission(self.token, pid, transport=self.transport)
+
+    def __init__(self, token, number=None, contract_info=True, auth_info=True, user_info=True, transport=None,
+                 timeout=None):
+        self.transport = transport
+        self.timeout = timeout
+        # Транзакции в конечном статусе по (ID, тип) в порядке использования, см. transactions
+        self._final_transactions = OrderedDict()
+        self._final_lock = threading.Lock()
         if isinstance(number, str):
             self.number = number.replace('+', '')
             if self.number.startswith('8'):
@@ -432,7 +710,6 @@ class Wallet:
         self.auth_info_enabled = auth_info
         self.contract_info_enabled = contract_info
         self.user_info_enabled = user_info
-        self.get_commission = partial(get_commission, self.token)
         self.headers = {'Accept': 'application/json',
                         'Content-Type': 'application/json',
                         'Authorization': "Bearer {0}".format(self.token)}
@@ -440,7 +717,7 @@ class Wallet:
             self.number = str(self.profile.contract_info.contract_id)
 
 
-def get_commission(token, pid):
+def get_commission(token, pid, transport=None):
     """
     Получение стандартной комиссии
 
@@ -450,13 +727,16 @@ def get_commission(token, pid):
         `Ключ Qiwi API`_
     pid : str
         Идентификатор провайдера.
+    transport : Optional[:class:`Transport <pyqiwi.transport.Transport>`]
+        Транспорт для запроса.
+        По умолчанию - :data:`apihelper.session <pyqiwi.apihelper.session>`.
 
     Returns
     -------
     :class:`Commission <pyqiwi.types.Commission>`
         Комиссия для платежа
     """
-    result_json = apihelper.local_commission(token, pid)
+    result_json = apihelper.local_commission(token, pid, transport=transport)
     return types.Commission.de_json(result_json)
 
 
@@ -503,6 +783,7 @@ def generate_form_link(pid, account, amount, comment, blocked=None, account_type
     params = util.merge_dicts(params, util.split_float(amount))
     if amount > 99999:
         raise ValueError('amount не может превышать 99999 из-за ограничений на один платеж внутри QIWI')
+    pid = str(pid)
     if pid == "99" and comment:
         params["extra['comment']"] = comment
     if account:
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 import logging
+import threading
+import time
+from contextlib import ExitStack, nullcontext
 from datetime import datetime
 from sys import stderr
 
-import requests
-
 # noinspection PyCompatibility
-from . import exceptions, util
+from . import deadline, exceptions, util
 
 logger = logging.getLogger(__name__)
 formatter = logging.Formatter(
@@ -18,37 +19,287 @@ logger.addHandler(console_output_handler)
 logger.setLevel(logging.ERROR)
 ad = True
 proxy = None
-session = requests.session()
+# Сбор метрик запросов, см. pyqiwi.metrics.Metrics.install
+metrics = None
+# Трассировка запросов, см. pyqiwi.tracing.Tracing.install
+tracer = None
+# Профилирование по фазам, см. pyqiwi.profiling.Profiler.install
+profiler = None
+_unprofiled = nullcontext()
+# session создается при первом обращении, см. _default_session
+_session_lock = threading.Lock()
 API_URL = 'https://edge.qiwi.com/{0}'
 
 CONNECT_TIMEOUT = 3.5
 READ_TIMEOUT = 9999
 
+_current = object()
+
+
+class Settings:
+    """
+    Неизменяемые параметры запросов одного транспорта
+
+    Глобальные :data:`proxy`, :data:`ad`, :data:`API_URL`, :data:`CONNECT_TIMEOUT` и :data:`READ_TIMEOUT`
+    общие для всех потоков, и изменение их в одном потоке влияет на запросы остальных.
+    Транспорт с атрибутом ``settings`` (см. :class:`SessionPool <pyqiwi.transport.SessionPool>`)
+    берет параметры только из него и не читает глобальные переменные модуля.
+    Не указанные параметры берутся из глобальных переменных на момент создания.
+
+    Parameters
+    ----------
+    api_url : Optional[str]
+        Шаблон адреса API.
+    proxy : Optional[dict]
+        Прокси-серверы в формате requests, ``None`` - без прокси.
+    connect_timeout : Optional[float]
+        Таймаут соединения в секундах.
+    read_timeout : Optional[float]
+        Таймаут чтения в секундах.
+    ad : Optional[bool]
+        Добавлять ли комментарий по умолчанию к платежам без комментария.
+
+    Examples
+    --------
+    >>> settings = Settings(proxy={'https': 'socks5://127.0.0.1:9050'}, read_timeout=30)
+    >>> transport = SessionPool(settings=settings)
+    """
+
+    __slots__ = ('api_url', 'proxy', 'connect_timeout', 'read_timeout', 'ad')
+
+    def __init__(self, api_url=_current, proxy=_current, connect_timeout=_current, read_timeout=_current,
+                 ad=_current):
+        if proxy is _current:
+            proxy = globals()['proxy']
+        values = {'api_url': API_URL if api_url is _current else api_url,
+                  'proxy': dict(proxy) if proxy else None,
+                  'connect_timeout': CONNECT_TIMEOUT if connect_timeout is _current else connect_timeout,
+                  'read_timeout': READ_TIMEOUT if read_timeout is _current else read_timeout,
+                  'ad': globals()['ad'] if ad is _current else ad}
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Settings are immutable, use replace()')
+
+    def __repr__(self):
+        return '<Settings({0})>'.format(', '.join('{0}={1!r}'.format(name, getattr(self, name))
+                                                  for name in self.__slots__))
+
+    def replace(self, **changes):
+        """
+        Копия с измененными параметрами
+
+        Returns
+        -------
+        :class:`Settings <pyqiwi.apihelper.Settings>`
+        """
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Settings(**values)
+
+
+def configure_pool(maxsize, session=None):
+    """
+    Увеличивает пул keep-alive соединений общей сессии
+
+    По умолчанию requests держит не более 10 соединений на хост,
+    что ограничивает параллельные запросы из нескольких потоков.
+    Установленные в сессии адаптеры заменяются.
+
+    Parameters
+    ----------
+    maxsize : int
+        Максимальное число соединений к одному хосту.
+    session : Optional[requests.Session]
+        Сессия для настройки.
+        По умолчанию - общая :data:`session`.
+    """
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=maxsize)
+    if session is None:
+        session = _default_session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+
+def _default_session():
+    # requests импортируется только при первом запросе:
+    # ``import pyqiwi`` не должен тянуть за собой requests и urllib3
+    default_session = globals().get('session')
+    if default_session is None:
+        with _session_lock:
+            default_session = globals().get('session')
+            if default_session is None:
+                import requests
+                default_session = globals()['session'] = requests.session()
+    return default_session
+
+
+def __getattr__(name):
+    if name == 'session':
+        return _default_session()
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+
+def _make_request(token, method_name, method='get', params=None, base_url=None, json=None, passthru=False,
+                  transport=None):
+    if transport is None:
+        transport = _default_session()
+    if getattr(transport, 'is_async', False):
+        return _make_request_async(transport, token, method_name, method, params, base_url, json, passthru)
+    if tracer is not None or profiler is not None:
+        with _instruments(method_name, method):
+            return _send(transport, token, method_name, method, params, base_url, json, passthru)
+    return _send(transport, token, method_name, method, params, base_url, json, passthru)
+
+
+def _instruments(method_name, method):
+    family = _family(method_name)
+    stack = ExitStack()
+    if profiler is not None:
+        stack.enter_context(profiler.operation(family))
+    if tracer is not None:
+        stack.enter_context(tracer.request(family, method))
+    return stack
+
+
+class _Exchange:
+    # Подготовка запроса и обработка ответа, общие для _send и _send_async
+    __slots__ = ('method_name', 'method', 'url', 'kwargs', 'profile', 'collector', 'family', 'started')
+
+    def __init__(self, transport, token, method_name, method, params, base_url, json):
+        profile = profiler
+        if profile is not None:
+            mark = time.perf_counter()
+        settings = getattr(transport, 'settings', None)
+        request_url, headers, timeout = _prepare(token, method_name, method, params, base_url, settings)
+        if profile is not None:
+            profile.phase('prepare', mark)
+        self.method_name = method_name
+        self.method = method
+        self.url = request_url
+        self.kwargs = {'params': params, 'timeout': timeout, 'proxies': proxy if settings is None else settings.proxy,
+                       'headers': headers, 'json': json}
+        self.profile = profile
+        self.collector = collector = metrics
+        if collector is not None:
+            self.family = _family(method_name)
+            collector.started(self.family)
+            self.started = time.perf_counter()
+
+    def transport(self):
+        return self.profile.transport() if self.profile is not None else _unprofiled
+
+    def failed(self, error):
+        if self.collector is not None:
+            self.collector.finished(self.family, self.method, type(error).__name__,
+                                    time.perf_counter() - self.started, None)
+        _raise_if_expired(self.method_name, error)
+
+    def finished(self, result, passthru):
+        if self.collector is not None:
+            self.collector.finished(self.family, self.method, result.status_code,
+                                    time.perf_counter() - self.started, result)
+        return _handle_result(self.method_name, result, passthru)
+
+
+def _send(transport, token, method_name, method, params, base_url, json, passthru):
+    exchange = _Exchange(transport, token, method_name, method, params, base_url, json)
+    try:
+        with exchange.transport():
+            result = transport.request(method, exchange.url, **exchange.kwargs)
+    except Exception as e:
+        exchange.failed(e)
+        raise
+    return exchange.finished(result, passthru)
+
+
+async def _make_request_async(transport, token, method_name, method, params, base_url, json, passthru):
+    # Для асинхронных транспортов (см. pyqiwi.transport.AsyncTransport)
+    # _make_request возвращает корутину, которую нужно дождаться
+    if tracer is not None or profiler is not None:
+        with _instruments(method_name, method):
+            return await _send_async(transport, token, method_name, method, params, base_url, json, passthru)
+    return await _send_async(transport, token, method_name, method, params, base_url, json, passthru)
+
+
+async def _send_async(transport, token, method_name, method, params, base_url, json, passthru):
+    exchange = _Exchange(transport, token, method_name, method, params, base_url, json)
+    try:
+        with exchange.transport():
+            result = await transport.request(method, exchange.url, **exchange.kwargs)
+    except Exception as e:
+        exchange.failed(e)
+        raise
+    return exchange.finished(result, passthru)
+
+
+def _raise_if_expired(method_name, error):
+    # Таймаут транспорта, сокращенный до оставшегося времени, означает истекший лимит вызова
+    current = deadline.current()
+    if current is not None and current.expired() and not isinstance(error, exceptions.APIError):
+        raise current.exceeded(_family(method_name)) from error
 
-def _make_request(token, method_name, method='get', params=None, base_url=API_URL, json=None, passthru=False):
+
+def _prepare(token, method_name, method, params, base_url, settings=None):
+    if base_url is None:
+        base_url = API_URL if settings is None else settings.api_url
     headers = {'Accept': 'application/json',
                'Content-Type': 'application/json',
                'Authorization': "Bearer {0}".format(token)}
     request_url = base_url.format(method_name)
     logger.debug("Request: method={0} url={1} params={2}".format(method, request_url, params))
-    read_timeout = READ_TIMEOUT
-    connect_timeout = CONNECT_TIMEOUT
+    if settings is None:
+        read_timeout, connect_timeout = READ_TIMEOUT, CONNECT_TIMEOUT
+    else:
+        read_timeout, connect_timeout = settings.read_timeout, settings.connect_timeout
     if params:
         if 'timeout' in params:
             read_timeout = params['timeout'] + 10
         if 'connect-timeout' in params:
             connect_timeout = params['connect-timeout'] + 10
-    result = session.request(method, request_url, params=params, timeout=(connect_timeout, read_timeout),
-                             proxies=proxy, headers=headers, json=json)
-    logger.debug("The server returned: '{0}'".format(result.text.encode('utf8')))
+    current = deadline.current()
+    if current is not None:
+        remaining = current.check(_family(method_name))
+        connect_timeout = min(connect_timeout, remaining)
+        read_timeout = min(read_timeout, remaining)
+    return request_url, headers, (connect_timeout, read_timeout)
+
+
+def _family(method_name):
+    """
+    Семейство методов API: первая часть пути, для sinap - последняя
+    """
     if method_name.split('/')[0] == 'sinap':
-        method_name = method_name.split('/')[len(method_name.split('/')) - 1]
-    else:
-        method_name = method_name.split('/')[0]
-    return _check_result(method_name, result, passthru)
+        return method_name.split('/')[len(method_name.split('/')) - 1]
+    return method_name.split('/')[0]
+
+
+def _handle_result(method_name, result, passthru):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("The server returned: '{0}'".format(result.text.encode('utf8')))
+    if tracer is not None:
+        tracer.response(result)
+        with tracer.span('qiwi.decode'):
+            return _decode(method_name, result, passthru)
+    return _decode(method_name, result, passthru)
+
+
+def _decode(method_name, result, passthru):
+    if profiler is not None:
+        mark = time.perf_counter()
+        try:
+            return _check_result(_family(method_name), result, passthru)
+        finally:
+            profiler.phase('decode', mark)
+    return _check_result(_family(method_name), result, passthru)
 
 
 def _check_result(method_name, result, passthru):
+    if result.text == '' and result.status_code in (201, 204):
+        return True
     if result.text == '':
         description = exceptions.find_exception_desc(result.status_code, method_name)
         msg = 'Error code: {0} Description: {1}'.format(result.status_code, description)
@@ -72,41 +323,41 @@ def _check_result(method_name, result, passthru):
     return result_json
 
 
-def person_profile(token, auth_info_enabled, contract_info_enabled, user_info_enabled):
+def person_profile(token, auth_info_enabled, contract_info_enabled, user_info_enabled, **kwargs):
     params = {'authInfoEnabled': str(auth_info_enabled).lower(),
               'contractInfoEnabled': str(contract_info_enabled).lower(),
               'userInfoEnabled': str(user_info_enabled).lower()
               }
     api_method = 'person-profile/v1/profile/current'
-    return _make_request(token, api_method, params=params)
+    return _make_request(token, api_method, params=params, **kwargs)
 
 
-def funding_sources(token):
+def funding_sources(token, **kwargs):
     api_method = 'funding-sources/v1/accounts/current'
-    return _make_request(token, api_method)
+    return _make_request(token, api_method, **kwargs)
 
 
-def get_by_alias(token, person_id):
+def get_by_alias(token, person_id, **kwargs):
     # V2 alternative to funding_sources
     api_method = 'funding-sources/v2/persons/{0}/accounts'.format(person_id)
-    return _make_request(token, api_method)
+    return _make_request(token, api_method, **kwargs)
 
 
-def get_accounts_offer(token, person_id):
+def get_accounts_offer(token, person_id, **kwargs):
     api_method = 'funding-sources/v2/persons/{0}/accounts/offer'.format(person_id)
-    return _make_request(token, api_method)
+    return _make_request(token, api_method, **kwargs)
 
 
-def create_account(token, person_id, dto):
+def create_account(token, person_id, dto, **kwargs):
     api_method = '/funding-sources/v2/persons/{0}/accounts'.format(person_id)
     body = {
         "accountAlias": dto
     }
-    return _make_request(token, api_method, method='post', json=body)
+    return _make_request(token, api_method, method='post', json=body, **kwargs)
 
 
 def payment_history(token, number, rows, operation=None, start_date=None, end_date=None, sources=None,
-                    next_txn_date=None, next_txn_id=None):
+                    next_txn_date=None, next_txn_id=None, **kwargs):
     api_method = "payment-history/v2/persons/{0}/payments".format(number)
     params = {'rows': rows}
     if operation:
@@ -118,10 +369,10 @@ def payment_history(token, number, rows, operation=None, start_date=None, end_da
     if next_txn_id and next_txn_date:
         params['nextTxnId'] = next_txn_id
         params['nextTxnDate'] = util.qiwi_date(next_txn_date)
-    return _make_request(token, api_method, params=params)
+    return _make_request(token, api_method, params=params, **kwargs)
 
 
-def total_payment_history(token, number, start_date, end_date, operation=None, sources=None):
+def total_payment_history(token, number, start_date, end_date, operation=None, sources=None, **kwargs):
     api_method = "payment-history/v2/persons/{0}/payments/total".format(number)
     params = {}
     if operation:
@@ -129,10 +380,10 @@ def total_payment_history(token, number, start_date, end_date, operation=None, s
     if sources:
         params = util.sources_list(sources, params)
     params = util.stat_dates(start_date, end_date, params)
-    return _make_request(token, api_method, params=params)
+    return _make_request(token, api_method, params=params, **kwargs)
 
 
-def online_commission(token, recipient, pid, amount):
+def online_commission(token, recipient, pid, amount, **kwargs):
     api_method = "sinap/providers/{0}/onlineCommission".format(pid)
     body = {'account': recipient,
             'paymentMethod':
@@ -142,10 +393,10 @@ def online_commission(token, recipient, pid, amount):
                 {'total': {'amount': amount,
                            'currency': '643'}}
             }
-    return _make_request(token, api_method, method='post', json=body)
+    return _make_request(token, api_method, method='post', json=body, **kwargs)
 
 
-def payments(token, pid, amount, recipient, comment=None, fields=None):
+def payments(token, pid, amount, recipient, comment=None, fields=None, **kwargs):
     api_method = "sinap/api/v2/terms/{0}/payments".format(pid)
     if fields:
         pass
@@ -157,24 +408,26 @@ def payments(token, pid, amount, recipient, comment=None, fields=None):
             'paymentMethod': {'type': 'Account',
                               'accountId': '643'},
             'fields': fields}
+    settings = getattr(kwargs.get('transport'), 'settings', None)
     if comment:
         body['comment'] = comment
-    elif ad:
+    elif ad if settings is None else settings.ad:
         body['comment'] = 'Отправлено с помощью pyQiwi'
-    return _make_request(token, api_method, method='post', json=body)
+    return _make_request(token, api_method, method='post', json=body, **kwargs)
 
 
-def local_commission(token, pid):
+def local_commission(token, pid, **kwargs):
     api_method = "sinap/providers/{0}/form".format(pid)
-    return _make_request(token, api_method)
+    return _make_request(token, api_method, **kwargs)
 
 
-def get_transaction(token, txn_id, txn_type):
+def get_transaction(token, txn_id, txn_type, **kwargs):
     api_method = 'payment-history/v2/transactions/{0}?type={1}'.format(txn_id, txn_type)
-    return _make_request(token, api_method)
+    return _make_request(token, api_method, **kwargs)
 
 
-def identification(token, wallet, birth_date, first_name, middle_name, last_name, passport, inn, snils, oms):
+def identification(token, wallet, birth_date, first_name, middle_name, last_name, passport, inn, snils, oms,
+                   **kwargs):
     api_method = 'identification/v1/persons/{0}/identification'.format(wallet)
     if inn is None:
         inn = ""
@@ -192,10 +445,12 @@ def identification(token, wallet, birth_date, first_name, middle_name, last_name
         "snils": snils,
         "oms": oms
     }
-    return _make_request(token, api_method, method='post', json=identity)
+    return _make_request(token, api_method, method='post', json=identity, **kwargs)
 
 
 def detect(phone):
+    import requests
+
     result_json = requests.post('https://qiwi.com/mobile/detect.action', data={"phone": phone})
     result_json = result_json.json()
     if result_json.get('code', {}).get('value') == '0':
@@ -204,16 +459,43 @@ def detect(phone):
         return None
 
 
-def cheque_file(token, txn_id, _type, _format):
+def cheque_file(token, txn_id, _type, _format, **kwargs):
     api_method = 'payment-history/v1/transactions/{0}/cheque/file'.format(txn_id)
-    return _make_request(token, api_method, params={"type": _type, "format": _format}, passthru=True)
+    return _make_request(token, api_method, params={"type": _type, "format": _format}, passthru=True, **kwargs)
 
 
-def cheque_send(token, txn_id, _type, email):
+def cheque_send(token, txn_id, _type, email, **kwargs):
     api_method = 'payment-history/v1/transactions/{0}/cheque/send'.format(txn_id)
-    return _make_request(token, api_method, method='post', params={"type": _type}, json={"email": email})
+    return _make_request(token, api_method, method='post', params={"type": _type}, json={"email": email},
+                         **kwargs)
 
 
-def cross_rates(token):
+def cross_rates(token, **kwargs):
     api_method = 'sinap/crossRates'
-    return _make_request(token, api_method)
+    return _make_request(token, api_method, **kwargs)
+
+
+def register_webhook(token, url, txn_type, **kwargs):
+    api_method = 'payment-notifier/v1/hooks'
+    params = {'hookType': 1, 'param': url, 'txnType': txn_type}
+    return _make_request(token, api_method, method='put', params=params, **kwargs)
+
+
+def active_webhook(token, **kwargs):
+    api_method = 'payment-notifier/v1/hooks/active'
+    return _make_request(token, api_method, **kwargs)
+
+
+def delete_webhook(token, hook_id, **kwargs):
+    api_method = 'payment-notifier/v1/hooks/{0}'.format(hook_id)
+    return _make_request(token, api_method, method='delete', **kwargs)
+
+
+def webhook_key(token, hook_id, **kwargs):
+    api_method = 'payment-notifier/v1/hooks/{0}/key'.format(hook_id)
+    return _make_request(token, api_method, **kwargs)
+
+
+def send_test_webhook(token, **kwargs):
+    api_method = 'payment-notifier/v1/hooks/test'
+    return _make_request(token, api_method, **kwargs)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+
+from . import exceptions, metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = CLOSED
+        self.outcomes = deque()
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для каждого семейства методов API
+
+    Middleware транспорта: если доля неудачных запросов к семейству методов
+    (например, ``payment-history``) за последние ``window`` секунд превышает ``failure_rate``,
+    выключатель размыкается и следующие ``open_time`` секунд запросы к этому семейству
+    сразу завершаются :class:`CircuitOpenError <pyqiwi.exceptions.CircuitOpenError>`,
+    не занимая поток на время таймаута. Затем пропускаются пробные запросы:
+    при успехе выключатель замыкается, при ошибке снова размыкается.
+    Остальные семейства методов продолжают работать.
+
+    Неудачным считается запрос, завершившийся исключением транспорта
+    (обрыв соединения, таймаут) или ответом с кодом из ``failure_statuses``.
+
+    Parameters
+    ----------
+    failure_rate : Optional[float]
+        Доля неудачных запросов, при которой выключатель размыкается.
+        По умолчанию - 0.5.
+    min_calls : Optional[int]
+        Минимальное число запросов в окне для принятия решения.
+        По умолчанию - 10.
+    window : Optional[float]
+        Окно подсчета запросов в секундах.
+        По умолчанию - 30.
+    open_time : Optional[float]
+        Время в разомкнутом состоянии до пробных запросов в секундах.
+        По умолчанию - 30.
+    half_open_calls : Optional[int]
+        Число одновременных пробных запросов.
+        По умолчанию - 1.
+    failure_statuses : Optional[iterable]
+        HTTP-коды, считающиеся отказом сервиса.
+        По умолчанию - 423 и 5xx.
+
+    Examples
+    --------
+    >>> breaker = CircuitBreaker(failure_rate=0.5, open_time=10)
+    >>> wallet = Wallet(token, transport=RequestsTransport(middleware=[breaker]))
+    >>> breaker.state('payment-history')
+    'closed'
+    """
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window=30, open_time=30, half_open_calls=1,
+                 failure_statuses=None):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_time = open_time
+        self.half_open_calls = half_open_calls
+        if failure_statuses is None:
+            failure_statuses = [423] + list(range(500, 600))
+        self.failure_statuses = frozenset(failure_statuses)
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, request, send):
+        family = request.family
+        probe = self._acquire(family)
+        try:
+            response = send(request)
+        except exceptions.APIError:
+            self._release(family, probe, None)
+            raise
+        except Exception:
+            self._release(family, probe, True)
+            raise
+        self._release(family, probe, response.status_code in self.failure_statuses)
+        return response
+
+    def state(self, family):
+        """
+        Состояние выключателя для семейства методов
+
+        Returns
+        -------
+        str
+            ``closed``, ``open`` или ``half-open``
+        """
+        with self._lock:
+            circuit = self._circuits.get(family)
+            if circuit is None:
+                return CLOSED
+            if circuit.state == OPEN and time.monotonic() - circuit.opened_at >= self.open_time:
+                return HALF_OPEN
+            return circuit.state
+
+    def reset(self, family=None):
+        """
+        Замыкание выключателя для семейства методов или для всех сразу
+        """
+        with self._lock:
+            if family is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(family, None)
+
+    def _acquire(self, family):
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.get(family)
+            if circuit is None:
+                circuit = self._circuits[family] = _Circuit()
+            if circuit.state == CLOSED:
+                return False
+            if circuit.state == OPEN and now - circuit.opened_at >= self.open_time:
+                circuit.state = HALF_OPEN
+            if circuit.state == HALF_OPEN and circuit.probes < self.half_open_calls:
+                circuit.probes += 1
+                return True
+            retry_after = max(self.open_time - (now - circuit.opened_at), 0.0)
+        metrics.count('circuit_open', family)
+        raise exceptions.CircuitOpenError('Circuit breaker is open for {0}, retry after {1:.1f}s'
+                                          .format(family, retry_after), family, retry_after)
+
+    def _release(self, family, probe, failed):
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.get(family)
+            if circuit is None:
+                return
+            if probe:
+                circuit.probes -= 1
+                if failed is None:
+                    return
+                circuit.outcomes.clear()
+                circuit.failures = 0
+                if failed:
+                    circuit.state = OPEN
+                    circuit.opened_at = now
+                else:
+                    circuit.state = CLOSED
+                return
+            if failed is None or circuit.state != CLOSED:
+                return
+            outcomes = circuit.outcomes
+            outcomes.append((now, failed))
+            circuit.failures += failed
+            while outcomes and outcomes[0][0] <= now - self.window:
+                circuit.failures -= outcomes.popleft()[1]
+            if len(outcomes) >= self.min_calls and circuit.failures >= self.failure_rate * len(outcomes):
+                circuit.state = OPEN
+                circuit.opened_at = now
+                outcomes.clear()
+                circuit.failures = 0
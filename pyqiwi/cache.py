@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш ответов Qiwi API, общий для процессов на одной машине
+
+Курсы валют, формы провайдеров и профиль меняются редко, а запрашиваются каждым
+воркером отдельно. :class:`CacheMiddleware <pyqiwi.cache.CacheMiddleware>` сохраняет такие ответы
+в хранилище, а :class:`SQLiteCache <pyqiwi.cache.SQLiteCache>` делает одну копию доступной
+всем процессам, открывшим тот же файл:
+
+>>> cache = CacheMiddleware(SQLiteCache('/tmp/pyqiwi-cache.db'))
+>>> transport = RequestsTransport(middleware=[cache])
+>>> wallet = Wallet(token, transport=transport)
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+from . import metrics
+from .transport import Response
+
+# (шаблон пути, время жизни в секундах, общий ли ответ для всех токенов)
+DEFAULT_RULES = [
+    (r'sinap/crossRates', 60, True),
+    (r'sinap/providers/\d+/form', 3600, True),
+    (r'person-profile/v1/profile/current', 300, False),
+]
+
+
+class CacheBackend:
+    """
+    Интерфейс хранилища кэша
+
+    Хранилище сохраняет байтовые значения по строковому ключу до истечения времени жизни.
+    """
+
+    def get(self, key):
+        """
+        Значение по ключу
+
+        Returns
+        -------
+        Optional[bytes]
+            Значение или ``None``, если его нет или время жизни истекло
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """
+        Сохранение значения
+
+        Parameters
+        ----------
+        key : str
+            Ключ
+        value : bytes
+            Значение
+        ttl : float
+            Время жизни в секундах
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """
+    Хранилище в памяти текущего процесса
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            now = time.time()
+            self._entries[key] = (now + ttl, value)
+            if len(self._entries) % 1024 == 0:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Хранилище в файле SQLite в режиме WAL, общее для всех процессов, открывших этот файл
+
+    Чтение не блокирует запись, поэтому воркеры не мешают друг другу.
+    У каждого потока и процесса свое соединение, после ``fork`` оно открывается заново.
+
+    Parameters
+    ----------
+    path : str
+        Путь к файлу базы данных.
+    timeout : Optional[float]
+        Время ожидания блокировки при записи в секундах.
+        По умолчанию - 5.
+    """
+
+    def __init__(self, path, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._sets = 0
+        self._connection().execute('CREATE TABLE IF NOT EXISTS cache '
+                                   '(key TEXT PRIMARY KEY, expires REAL NOT NULL, value BLOB NOT NULL)')
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key):
+        row = self._connection().execute('SELECT value FROM cache WHERE key = ? AND expires > ?',
+                                         (key, time.time())).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('INSERT OR REPLACE INTO cache (key, expires, value) VALUES (?, ?, ?)',
+                           (key, now + ttl, value))
+        self._sets += 1
+        if self._sets % 256 == 0:
+            connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local = threading.local()
+
+
+def dumps(status_code, content_type, content):
+    """
+    Компактная сериализация ответа: JSON-заголовок и тело, сжатые zlib, если это выгодно
+    """
+    header = json.dumps([status_code, content_type], separators=(',', ':')).encode('utf-8')
+    data = header + b'\n' + content
+    if len(data) > 512:
+        return b'z' + zlib.compress(data)
+    return b'r' + data
+
+
+def loads(value):
+    """
+    Обратное преобразование для :func:`dumps`
+
+    Returns
+    -------
+    tuple
+        (HTTP-код, Content-Type, тело ответа)
+    """
+    data = bytes(value)
+    data = zlib.decompress(data[1:]) if data[:1] == b'z' else data[1:]
+    header, content = data.split(b'\n', 1)
+    status_code, content_type = json.loads(header.decode('utf-8'))
+    return status_code, content_type, content
+
+
+class CacheMiddleware:
+    """
+    Middleware транспорта, кэширующее успешные GET-ответы по правилам
+
+    Ключ кэша - адрес запроса с параметрами, для ответов, зависящих от пользователя, -
+    еще и хэш токена. Сам токен в кэш не попадает.
+    Работает с синхронными транспортами, см. :class:`Transport <pyqiwi.transport.Transport>`.
+
+    Parameters
+    ----------
+    backend : Optional[:class:`CacheBackend <pyqiwi.cache.CacheBackend>`]
+        Хранилище. По умолчанию - :class:`MemoryCache <pyqiwi.cache.MemoryCache>`.
+    rules : Optional[list]
+        Список ``(шаблон пути, время жизни, общий для всех токенов)``.
+        По умолчанию - :data:`DEFAULT_RULES`: курсы валют на 60 секунд,
+        формы провайдеров на час и профиль на 5 минут.
+
+    Attributes
+    ----------
+    hits : int
+        Число ответов из кэша
+    misses : int
+        Число запросов, выполненных по сети
+    """
+
+    def __init__(self, backend=None, rules=None):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.rules = [(re.compile(pattern), ttl, shared) for pattern, ttl, shared in (rules or DEFAULT_RULES)]
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, request, send):
+        rule = self._rule(request)
+        if rule is None:
+            return send(request)
+        key, ttl = rule
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            metrics.count('cache_hits', request.family)
+            status_code, content_type, content = loads(value)
+            return Response(status_code, content, {'Content-Type': content_type}, 'OK', request)
+        self.misses += 1
+        metrics.count('cache_misses', request.family)
+        response = send(request)
+        if response.status_code == 200:
+            self.backend.set(key, dumps(response.status_code, response.headers.get('Content-Type'),
+                                        response.content), ttl)
+        return response
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _rule(self, request):
+        if request.method != 'GET':
+            return None
+        path = urlsplit(request.url).path.strip('/')
+        for pattern, ttl, shared in self.rules:
+            if pattern.fullmatch(path):
+                return _key(request, shared), ttl
+        return None
+
+
+def _key(request, shared):
+    # Адрес с параметрами, для ответов конкретного пользователя - еще и хэш токена
+    key = request.full_url
+    if not shared:
+        token = request.headers.get('Authorization', '').encode('utf-8')
+        key += '#' + hashlib.sha256(token).hexdigest()[:32]
+    return key
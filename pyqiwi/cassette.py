@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import requests
+
+from . import apihelper, exceptions
+
+REDACTED = 'Bearer <redacted>'
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, mode + 'b'), encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _path(url):
+    parts = urlsplit(url)
+    return parts.path.lstrip('/') + ('?' + parts.query if parts.query else '')
+
+
+def _key(method, path, params, body):
+    if isinstance(body, dict):
+        # ID платежа генерируется из времени и при воспроизведении всегда отличается
+        body = {k: v for k, v in body.items() if k != 'id'}
+    params = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return json.dumps([method.upper(), path, params, body], sort_keys=True, ensure_ascii=False)
+
+
+class Cassette:
+    """
+    Запись и воспроизведение обменов с Qiwi API
+
+    Кассета подменяет :data:`apihelper.session <pyqiwi.apihelper.session>`:
+    в режиме ``record`` запросы выполняются по сети и сохраняются в файл,
+    в режиме ``replay`` ответы берутся из файла без обращения к сети
+    и проходят ту же проверку в ``_check_result``, что и настоящие.
+    Файл хранится в формате JSON Lines, при расширении ``.gz`` - со сжатием gzip.
+    Заголовок ``Authorization`` в файл не записывается.
+
+    Parameters
+    ----------
+    path : str
+        Путь к файлу кассеты.
+    mode : Optional[str]
+        ``record`` или ``replay``.
+        По умолчанию - ``replay``.
+    realtime : Optional[bool]
+        Воспроизводить ответы с записанной задержкой.
+        По умолчанию - ``False``, ответы отдаются сразу.
+    session : Optional[requests.Session]
+        Сессия для выполнения запросов при записи.
+        По умолчанию - текущая :data:`apihelper.session <pyqiwi.apihelper.session>`.
+
+    Examples
+    --------
+    >>> with Cassette('history.jsonl.gz', mode='record'):
+    ...     wallet.history_since(checkpoint)
+    >>> with Cassette('history.jsonl.gz'):
+    ...     wallet.history_since(checkpoint)  # без сети
+    """
+
+    def __init__(self, path, mode='replay', realtime=False, session=None):
+        if mode not in ('record', 'replay'):
+            raise ValueError('Cassette mode should be record or replay')
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.session = session
+        self._lock = threading.Lock()
+        self._file = None
+        self._installed = None
+        self._entries = defaultdict(deque)
+        if mode == 'replay':
+            self._load()
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def _load(self):
+        with _open(self.path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[_key(entry['method'], entry['path'], entry['params'], entry['json'])].append(entry)
+
+    def install(self):
+        """
+        Подмена :data:`apihelper.session <pyqiwi.apihelper.session>` кассетой
+        """
+        self._installed = apihelper._default_session()
+        if self.session is None:
+            self.session = self._installed
+        if self.mode == 'record':
+            self._file = _open(self.path, 'w')
+        apihelper.session = self
+        return self
+
+    def uninstall(self):
+        """
+        Возврат исходной сессии и закрытие файла кассеты
+        """
+        if self._installed is not None:
+            apihelper.session = self._installed
+            self._installed = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def request(self, method, url, params=None, json=None, headers=None, **kwargs):
+        if self.mode == 'record':
+            return self._record(method, url, params, json, headers, kwargs)
+        return self._replay(method, url, params, json)
+
+    def _record(self, method, url, params, body, headers, kwargs):
+        started = time.perf_counter()
+        response = self.session.request(method, url, params=params, json=body, headers=headers, **kwargs)
+        elapsed = time.perf_counter() - started
+        headers = dict(headers or {})
+        if 'Authorization' in headers:
+            headers['Authorization'] = REDACTED
+        entry = {'method': method.upper(), 'path': _path(url), 'params': params, 'json': body,
+                 'headers': headers, 'status': response.status_code, 'reason': response.reason,
+                 'content_type': response.headers.get('Content-Type'), 'body': response.text,
+                 'elapsed': round(elapsed, 6)}
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        return response
+
+    def _replay(self, method, url, params, body):
+        key = _key(method, _path(url), params, body)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise exceptions.CassetteError('No recorded response for {0} {1}'.format(method.upper(), url))
+            entry = entries[0] if len(entries) == 1 else entries.popleft()
+        if self.realtime:
+            time.sleep(entry['elapsed'])
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response._content = entry['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = url
+        if entry.get('content_type'):
+            response.headers['Content-Type'] = entry['content_type']
+        response.request = requests.Request(method.upper(), url, params=params).prepare()
+        return response
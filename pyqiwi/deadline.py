@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import contextvars
+import time
+
+from . import exceptions
+
+_current = contextvars.ContextVar('pyqiwi_deadline', default=None)
+
+
+class Deadline:
+    """
+    Общий лимит времени на все запросы к API внутри блока ``with``
+
+    Лимит распространяется на повторные попытки (:class:`Retry <pyqiwi.retry.Retry>`),
+    постраничную загрузку истории и операции над пулом кошельков
+    (:class:`WalletPool <pyqiwi.pool.WalletPool>`): таймауты каждого запроса
+    сокращаются до оставшегося времени, а по его истечении запросы завершаются
+    :class:`DeadlineExceeded <pyqiwi.exceptions.DeadlineExceeded>`.
+    Вложенный лимит не может быть дольше внешнего.
+
+    Parameters
+    ----------
+    timeout : float
+        Лимит времени в секундах.
+
+    Examples
+    --------
+    >>> with Deadline(5):
+    ...     wallet.history_since(checkpoint)
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expires = None
+        self._token = None
+
+    def __enter__(self):
+        self.expires = time.monotonic() + self.timeout
+        parent = _current.get()
+        if parent is not None and parent.expires < self.expires:
+            self.expires = parent.expires
+            self.timeout = parent.timeout
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current.reset(self._token)
+        self._token = None
+
+    def __repr__(self):
+        return '<Deadline(timeout={0}, remaining={1:.3f})>'.format(self.timeout, self.remaining())
+
+    def remaining(self):
+        """
+        Оставшееся время в секундах, отрицательное после истечения
+        """
+        return self.expires - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, method_name):
+        """
+        Проверка, что время еще не истекло
+
+        Returns
+        -------
+        float
+            Оставшееся время в секундах
+
+        Raises
+        ------
+        :class:`DeadlineExceeded <pyqiwi.exceptions.DeadlineExceeded>`
+            Если время истекло
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise self.exceeded(method_name)
+        return remaining
+
+    def exceeded(self, method_name):
+        return exceptions.DeadlineExceeded('Deadline of {0}s exceeded for {1}'.format(self.timeout, method_name),
+                                           method_name, self.timeout)
+
+
+def current():
+    """
+    Действующий лимит времени
+
+    Returns
+    -------
+    Optional[:class:`Deadline <pyqiwi.deadline.Deadline>`]
+        Ближайший лимит или ``None``, если вызов не ограничен
+    """
+    return _current.get()
+
+
+def limit(timeout):
+    """
+    Ограничение таймаутов ``(connect, read)`` оставшимся временем действующего лимита
+
+    Returns
+    -------
+    tuple
+        Таймауты, не превышающие оставшееся время
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return timeout
+    remaining = max(deadline.remaining(), 0.001)
+    if timeout is None:
+        return remaining, remaining
+    return min(timeout[0], remaining), min(timeout[1], remaining)
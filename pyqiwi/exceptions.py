@@ -33,10 +33,63 @@ class APIError(Exception):
     def __init__(self, msg, method_name, response=None):
         self.msg = msg
         self.method_name = method_name
-        self.response = response.text
         self.request = response
+        if response is None:
+            # Ошибка возникла до обращения к серверу
+            self.response = None
+            self.method = None
+            self.params = {}
+            return
+        self.response = response.text
         self.method = response.request.path_url
-        self.params = url_params(response.request.url)
+        params = getattr(response.request, 'params', None)
+        if isinstance(params, dict):
+            self.params = dict(params)
+        else:
+            self.params = url_params(response.request.url)
+
+
+class CircuitOpenError(APIError):
+    """
+    Запрос не выполнен: автоматический выключатель для этого семейства методов разомкнут
+
+    Attributes
+    ----------
+    retry_after : float
+        Через сколько секунд выключатель пропустит пробный запрос
+    """
+
+    def __init__(self, msg, method_name, retry_after):
+        super().__init__(msg, method_name)
+        self.retry_after = retry_after
+
+
+class SignatureError(ValueError):
+    """
+    Подпись уведомления о платеже не совпадает с ожидаемой
+    """
+
+
+class CassetteError(LookupError):
+    """
+    В кассете нет записанного ответа на запрос
+    """
+
+
+class DeadlineExceeded(APIError, TimeoutError):
+    """
+    Истекло время, отведенное на вызов, см. :class:`Deadline <pyqiwi.deadline.Deadline>`
+
+    Attributes
+    ----------
+    timeout : float
+        Отведенное время в секундах
+    """
+
+    def __init__(self, msg, method_name, timeout=None):
+        super().__init__(msg, method_name)
+        self.args = (msg,)
+        self.timeout = timeout
 
 
 def find_exception_desc(status_code, method_name):
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковая выгрузка истории платежей
+
+Страницы :func:`apihelper.payment_history <pyqiwi.apihelper.payment_history>` записываются
+в файл по мере получения, без сборки объектов :class:`Transaction <pyqiwi.types.Transaction>`,
+поэтому память не растет с числом транзакций. Вложенные данные о сумме, комиссии,
+итоговой сумме и провайдере разворачиваются в плоские колонки :data:`COLUMNS`.
+
+>>> export_history(wallet, 'history-2018-05.csv.gz', format='csv',
+...                start_date=datetime(2018, 5, 1), end_date=datetime(2018, 6, 1))
+12408
+"""
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import sys
+
+from . import apihelper, types
+
+# Колонка и путь к значению в ответе Qiwi API
+FIELDS = (
+    ('txn_id', ('txnId',)),
+    ('person_id', ('personId',)),
+    ('date', ('date',)),
+    ('type', ('type',)),
+    ('status', ('status',)),
+    ('status_text', ('statusText',)),
+    ('error_code', ('errorCode',)),
+    ('error', ('error',)),
+    ('trm_txn_id', ('trmTxnId',)),
+    ('account', ('account',)),
+    ('sum_amount', ('sum', 'amount')),
+    ('sum_currency', ('sum', 'currency')),
+    ('commission_amount', ('commission', 'amount')),
+    ('commission_currency', ('commission', 'currency')),
+    ('total_amount', ('total', 'amount')),
+    ('total_currency', ('total', 'currency')),
+    ('provider_id', ('provider', 'id')),
+    ('provider_short_name', ('provider', 'shortName')),
+    ('provider_long_name', ('provider', 'longName')),
+    ('comment', ('comment',)),
+    ('currency_rate', ('currencyRate',)),
+    ('source', ('source',)),
+)
+
+COLUMNS = tuple(column for column, _ in FIELDS)
+
+_COMPRESSION = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+_OPENERS = {'gzip': lambda stream: gzip.GzipFile(fileobj=stream, mode='wb'),
+            'bz2': lambda stream: bz2.BZ2File(stream, 'wb'),
+            'xz': lambda stream: lzma.LZMAFile(stream, 'wb')}
+
+
+def flatten(row):
+    """
+    Плоская запись транзакции из ответа Qiwi API
+
+    Дата остается строкой ISO-8601 из ответа, источники платежа объединяются через запятую.
+
+    Parameters
+    ----------
+    row : dict
+        Транзакция из поля ``data`` ответа истории платежей.
+
+    Returns
+    -------
+    dict
+        Значения колонок :data:`COLUMNS`
+    """
+    record = {}
+    for column, path in FIELDS:
+        value = row.get(path[0])
+        if len(path) == 2:
+            value = value.get(path[1]) if value is not None else None
+        record[column] = value
+    if record['source'] is not None:
+        record['source'] = ','.join(record['source'])
+    return record
+
+
+def iter_history(wallet, rows=50, operation=None, start_date=None, end_date=None, sources=None):
+    """
+    Транзакции из истории платежей кошелька в виде словарей ответа Qiwi API, страница за страницей
+
+    Parameters
+    ----------
+    wallet : :class:`Wallet <pyqiwi.Wallet>`
+        Кошелек с указанным номером.
+    rows : Optional[int]
+        Число платежей в одной странице ответа (от 1 до 50).
+    operation : Optional[str]
+        Тип операций, см. :meth:`Wallet.history <pyqiwi.Wallet.history>`.
+    start_date : Optional[datetime.datetime]
+        Начальная дата.
+    end_date : Optional[datetime.datetime]
+        Конечная дата.
+    sources : Optional[list]
+        Источники платежа.
+
+    Yields
+    ------
+    dict
+        Транзакция, от новых к старым
+    """
+    next_txn_date = None
+    next_txn_id = None
+    while True:
+        page = apihelper.payment_history(wallet.token, wallet.number, rows, operation=operation,
+                                         start_date=start_date, end_date=end_date, sources=sources,
+                                         next_txn_date=next_txn_date, next_txn_id=next_txn_id,
+                                         transport=wallet.transport)
+        yield from page['data']
+        if not page.get('nextTxnDate') or not page.get('nextTxnId'):
+            return
+        next_txn_date = types.JsonDeserializable.decode_date(page['nextTxnDate'])
+        next_txn_id = page['nextTxnId']
+
+
+class NDJSONWriter:
+    """
+    Запись в формате NDJSON: один JSON-объект на строку
+
+    Parameters
+    ----------
+    stream : file
+        Текстовый поток для записи.
+    """
+
+    binary = False
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.stream.write('\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+class CSVWriter:
+    """
+    Запись в формате CSV с заголовком из :data:`COLUMNS`
+
+    Parameters
+    ----------
+    stream : file
+        Текстовый поток для записи, открытый с ``newline=''``.
+    """
+
+    binary = False
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._writer = csv.DictWriter(stream, COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, record):
+        self._writer.writerow(record)
+
+    def close(self):
+        self.stream.flush()
+
+
+class ParquetWriter:
+    """
+    Запись в формате Parquet группами строк, требуется pyarrow
+
+    Parameters
+    ----------
+    stream : file
+        Двоичный поток для записи.
+    batch_size : Optional[int]
+        Число строк в одной группе: столько записей держится в памяти.
+        По умолчанию - 10000.
+    compression : Optional[str]
+        Сжатие колонок Parquet.
+        По умолчанию - ``snappy``.
+    """
+
+    binary = True
+
+    def __init__(self, stream, batch_size=10000, compression='snappy'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet export requires pyarrow: pip install qiwipy[parquet]')
+        self._pyarrow = pyarrow
+        integer, number, string = pyarrow.int64(), pyarrow.float64(), pyarrow.string()
+        types_ = {'txn_id': integer, 'person_id': integer, 'error_code': integer, 'provider_id': integer,
+                  'sum_amount': number, 'sum_currency': integer, 'commission_amount': number,
+                  'commission_currency': integer, 'total_amount': number, 'total_currency': integer,
+                  'currency_rate': number}
+        self.schema = pyarrow.schema([(column, types_.get(column, string)) for column in COLUMNS])
+        self.batch_size = batch_size
+        self._writer = pyarrow.parquet.ParquetWriter(stream, self.schema, compression=compression)
+        self._batch = []
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+    def _flush(self):
+        if self._batch:
+            self._writer.write_table(self._pyarrow.Table.from_pylist(self._batch, schema=self.schema))
+            self._batch = []
+
+
+WRITERS = {'ndjson': NDJSONWriter, 'csv': CSVWriter, 'parquet': ParquetWriter}
+
+
+def _open(output, binary, compression):
+    # Возвращает поток для записи и открытые здесь потоки в порядке закрытия
+    if isinstance(output, (str, os.PathLike)) and output != '-' and compression is None:
+        compression = _COMPRESSION.get(os.path.splitext(os.fspath(output))[1])
+    if compression is not None and compression not in _OPENERS:
+        raise ValueError('Unknown compression: {0}'.format(compression))
+    raw = binary or compression is not None
+    opened = []
+    if output is None or output == '-':
+        stream = sys.stdout.buffer if raw else sys.stdout
+    elif isinstance(output, (str, os.PathLike)):
+        stream = open(output, 'wb') if raw else open(output, 'w', encoding='utf-8', newline='')
+        opened.append(stream)
+    else:
+        stream = output
+    if compression is not None:
+        stream = _OPENERS[compression](stream)
+        opened.insert(0, stream)
+        if not binary:
+            stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+            opened.insert(0, stream)
+    return stream, opened
+
+
+def export_history(wallet, output, format='ndjson', compression=None, rows=50, operation=None, start_date=None,
+                   end_date=None, sources=None):
+    """
+    Выгрузка истории платежей кошелька
+
+    Parameters
+    ----------
+    wallet : :class:`Wallet <pyqiwi.Wallet>`
+        Кошелек с указанным номером.
+    output : str, os.PathLike or file
+        Путь к файлу, открытый поток или ``'-'`` для стандартного вывода.
+    format : Optional[str]
+        ``ndjson``, ``csv`` или ``parquet`` (требуется pyarrow).
+        По умолчанию - ``ndjson``.
+    compression : Optional[str]
+        Сжатие потока: ``gzip``, ``bz2`` или ``xz``.
+        По умолчанию определяется по расширению файла (``.gz``, ``.bz2``, ``.xz``).
+        Для Parquet - сжатие колонок, например ``zstd``.
+    rows : Optional[int]
+        Число платежей в одной странице ответа (от 1 до 50).
+    operation : Optional[str]
+        Тип операций, см. :meth:`Wallet.history <pyqiwi.Wallet.history>`.
+    start_date : Optional[datetime.datetime]
+        Начальная дата.
+    end_date : Optional[datetime.datetime]
+        Конечная дата.
+    sources : Optional[list]
+        Источники платежа.
+
+    Returns
+    -------
+    int
+        Число выгруженных транзакций
+    """
+    if format not in WRITERS:
+        raise ValueError('Unknown export format: {0}'.format(format))
+    writer_class = WRITERS[format]
+    # Parquet сжимает колонки сам, поток остается несжатым
+    stream, opened = _open(output, writer_class.binary, None if writer_class.binary else compression)
+    count = 0
+    try:
+        if writer_class.binary:
+            writer = writer_class(stream, compression=compression or 'snappy')
+        else:
+            writer = writer_class(stream)
+        for row in iter_history(wallet, rows, operation, start_date, end_date, sources):
+            writer.write(flatten(row))
+            count += 1
+        writer.close()
+    finally:
+        for stream in opened:
+            stream.close()
+    return count
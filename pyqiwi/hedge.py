@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import copy
+import threading
+import time
+from collections import deque
+
+from . import metrics
+
+DEFAULT_FAMILIES = ('funding-sources', 'payment-history')
+
+
+class _Latencies:
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.delay = None
+        self.pending = 0
+
+
+class Hedging:
+    """
+    Дублирующие запросы для снижения хвостовых задержек идемпотентных GET-запросов
+
+    Middleware транспорта: запрос отправляется в потоке вызывающего с таймаутом чтения,
+    равным ``percentile``-му процентилю наблюдаемых задержек семейства методов.
+    Если за это время сервер не ответил, зависшее соединение закрывается транспортом,
+    и копия запроса отправляется по новому соединению с исходным таймаутом.
+    Доля дублирующих запросов ограничена ``budget``, чтобы нагрузка на Qiwi API
+    оставалась предсказуемой: без накопленного бюджета запрос отправляется как есть.
+
+    Parameters
+    ----------
+    families : Optional[iterable]
+        Семейства методов, запросы к которым дублируются.
+        По умолчанию - ``funding-sources`` и ``payment-history``.
+    percentile : Optional[float]
+        Процентиль задержки, после которой отправляется копия запроса.
+        По умолчанию - 95.
+    delay : Optional[float]
+        Фиксированная задержка в секундах вместо процентиля.
+    initial_delay : Optional[float]
+        Задержка, пока собрано меньше ``min_samples`` замеров.
+        По умолчанию - 1 секунда.
+    min_samples : Optional[int]
+        Число замеров, после которого используется процентиль.
+        По умолчанию - 20.
+    budget : Optional[float]
+        Максимальная доля дублирующих запросов от общего числа.
+        По умолчанию - 0.05, ``0`` отключает дублирование.
+
+    Attributes
+    ----------
+    requests : int
+        Число запросов, для которых применялось дублирование
+    hedges : int
+        Число отправленных копий запросов
+    wins : int
+        Сколько раз копия вернула ответ вместо зависшего запроса
+
+    Examples
+    --------
+    >>> hedging = Hedging(percentile=95, budget=0.05)
+    >>> wallet = Wallet(token, transport=RequestsTransport(middleware=[hedging]))
+    >>> hedging.hedge_rate  # доля запросов с копией, не больше budget
+    """
+
+    def __init__(self, families=DEFAULT_FAMILIES, percentile=95, delay=None, initial_delay=1.0, min_samples=20,
+                 budget=0.05):
+        self.families = frozenset(families)
+        self.percentile = percentile
+        self.fixed_delay = delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        # Копии только из накопленного бюджета: с budget=0 запросы не дублируются
+        self._tokens = 0.0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, request, send):
+        if request.method != 'GET':
+            return send(request)
+        family = request.family
+        if family not in self.families:
+            return send(request)
+        from requests.exceptions import ReadTimeout
+
+        delay = self.delay(family)
+        timeout = request.timeout
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.budget, 10.0)
+            # Токен резервируется до ответа: если копия не понадобится, он возвращается
+            reserved = self._tokens >= 1 and (read_timeout is None or delay < read_timeout)
+            if reserved:
+                self._tokens -= 1
+        if not reserved:
+            return self._send(send, request, family)
+        primary = self._copy(request)
+        primary.timeout = (timeout[0] if isinstance(timeout, tuple) else timeout, delay)
+        started = time.perf_counter()
+        try:
+            response = send(primary)
+        except ReadTimeout:
+            # Зависший запрос тоже замер: без него процентиль смещался бы вниз
+            self._observe(family, time.perf_counter() - started)
+        except Exception:
+            self._refund()
+            raise
+        else:
+            self._observe(family, time.perf_counter() - started)
+            self._refund()
+            return response
+        with self._lock:
+            self.hedges += 1
+        metrics.count('hedges', family)
+        response = self._send(send, self._copy(request), family)
+        with self._lock:
+            self.wins += 1
+        metrics.count('hedge_wins', family)
+        return response
+
+    @property
+    def hedge_rate(self):
+        """
+        Доля запросов, для которых отправлялась копия
+        """
+        return self.hedges / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self):
+        """
+        Доля копий, вернувших ответ
+        """
+        return self.wins / self.hedges if self.hedges else 0.0
+
+    def delay(self, family):
+        """
+        Текущая задержка перед отправкой копии запроса для семейства методов, в секундах
+        """
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        latencies = self._latencies.get(family)
+        if latencies is None or latencies.delay is None:
+            return self.initial_delay
+        return latencies.delay
+
+    def _send(self, send, request, family):
+        started = time.perf_counter()
+        response = send(request)
+        self._observe(family, time.perf_counter() - started)
+        return response
+
+    def _copy(self, request):
+        request = copy.copy(request)
+        request.headers = dict(request.headers)
+        return request
+
+    def _refund(self):
+        with self._lock:
+            self._tokens = min(self._tokens + 1, 10.0)
+
+    def _observe(self, family, elapsed):
+        with self._lock:
+            latencies = self._latencies.get(family)
+            if latencies is None:
+                latencies = self._latencies[family] = _Latencies(1000)
+            latencies.samples.append(elapsed)
+            latencies.pending += 1
+            # Процентиль пересчитывается не на каждый запрос, а раз в min_samples замеров
+            if latencies.pending >= self.min_samples:
+                latencies.pending = 0
+                samples = sorted(latencies.samples)
+                index = min(int(len(samples) * self.percentile / 100.0), len(samples) - 1)
+                latencies.delay = samples[index]
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import inspect
+import threading
+from urllib.parse import urlsplit
+
+from .transport import AsyncTransport, Transport
+
+
+class _Request:
+    def __init__(self, method, url, body=None):
+        self.method = method
+        self.url = url
+        self.body = body
+        parts = urlsplit(url)
+        self.path_url = parts.path + ('?' + parts.query if parts.query else '')
+
+
+class HTTP2Response:
+    """
+    Ответ httpx с интерфейсом ``requests.Response``, которого ожидает :mod:`apihelper <pyqiwi.apihelper>`
+
+    Attributes
+    ----------
+    http_version : str
+        Версия протокола ответа, например ``HTTP/2``
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.reason = response.reason_phrase
+        self.headers = response.headers
+        self.content = response.content
+        self.url = str(response.url)
+        self.http_version = response.http_version
+        self.elapsed = response.elapsed
+        self.request = _Request(response.request.method, str(response.request.url), response.request.content)
+
+    @property
+    def text(self):
+        return self._response.text
+
+    def json(self, **kwargs):
+        return self._response.json(**kwargs)
+
+
+def _import_httpx(name):
+    try:
+        import httpx
+    except ImportError:
+        raise ImportError('{0} requires httpx with HTTP/2 support: pip install qiwipy[http2]'.format(name))
+    return httpx
+
+
+def _proxy_kwargs(httpx, proxy):
+    # httpx 0.26 заменил параметр proxies на proxy, а последняя версия для Python 3.7 - 0.24
+    if proxy is None:
+        return {}
+    if 'proxy' in inspect.signature(httpx.Client).parameters:
+        return {'proxy': proxy}
+    return {'proxies': proxy}
+
+
+def _timeout(httpx, timeout):
+    if isinstance(timeout, tuple):
+        return httpx.Timeout(timeout[1], connect=timeout[0])
+    return timeout
+
+
+def _transport_error(httpx, e):
+    import requests
+
+    if isinstance(e, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(e)
+    if isinstance(e, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(e)
+    return requests.exceptions.ConnectionError(e)
+
+
+class HTTP2Session(Transport):
+    """
+    Транспорт HTTP/2 на основе httpx
+
+    Параллельные запросы мультиплексируются в несколько соединений вместо
+    отдельного HTTP/1.1 соединения на каждый поток.
+    Если HTTP/2 недоступен (``http2=False`` или адрес ``http://``), число
+    одновременных запросов ограничивается ``max_connections``: пул httpx
+    не потокобезопасен, когда потоки ждут освобождения HTTP/1.1 соединения.
+    Подходит в качестве ``transport`` для :class:`Wallet <pyqiwi.Wallet>`.
+    Требует ``pip install qiwipy[http2]``.
+
+    Parameters
+    ----------
+    max_connections : Optional[int]
+        Максимальное число соединений к одному хосту.
+        По умолчанию - 4.
+    http2 : Optional[bool]
+        Использовать HTTP/2. При ``False`` - HTTP/1.1 через httpx.
+        По умолчанию - ``True``.
+    proxy : Optional[str]
+        Адрес прокси-сервера для всех запросов.
+    middleware : Optional[list]
+        Middleware для всех запросов транспорта, см. :class:`Transport <pyqiwi.transport.Transport>`.
+    client_kwargs
+        Прочие параметры ``httpx.Client``.
+
+    Examples
+    --------
+    >>> transport = HTTP2Session()
+    >>> wallet = Wallet(token, transport=transport)
+    """
+
+    def __init__(self, max_connections=4, http2=True, proxy=None, middleware=None, **client_kwargs):
+        httpx = _import_httpx('HTTP2Session')
+        self._httpx = httpx
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        client_kwargs.update(_proxy_kwargs(httpx, proxy))
+        self.client = httpx.Client(http2=http2, limits=limits, **client_kwargs)
+        self.http2 = http2
+        self._slots = threading.BoundedSemaphore(max_connections)
+        super().__init__(middleware)
+
+    @property
+    def connections(self):
+        """
+        Число открытых соединений в пуле
+
+        httpx не публикует состояние пула, поэтому значение читается из его внутренних объектов
+        и равно ``None``, если в установленной версии httpx они устроены иначе.
+        """
+        pool = getattr(getattr(self.client, '_transport', None), '_pool', None)
+        connections = getattr(pool, 'connections', None)
+        if not isinstance(connections, (list, tuple)):
+            return None
+        return len(connections)
+
+    def prewarm(self, connections=1, dns_cache=None, base_url=None):
+        """
+        Прогрев соединений, см. :meth:`Transport.prewarm <pyqiwi.transport.Transport.prewarm>`
+
+        Для HTTP/2 обычно достаточно одного соединения.
+        """
+        return super().prewarm(connections, dns_cache, base_url)
+
+    def _send(self, request):
+        if request.proxies:
+            raise ValueError('HTTP2Session does not support per-request proxies, use HTTP2Session(proxy=...)')
+        if self.http2 and request.url.startswith('https://'):
+            return self._request(request)
+        with self._slots:
+            return self._request(request)
+
+    def _request(self, request):
+        try:
+            response = self.client.request(request.method, request.url, params=request.params, json=request.json,
+                                           headers=request.headers, timeout=_timeout(self._httpx, request.timeout))
+        except self._httpx.TransportError as e:
+            raise _transport_error(self._httpx, e)
+        return HTTP2Response(response)
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncHTTP2Session(AsyncTransport):
+    """
+    Асинхронный транспорт HTTP/2 на основе ``httpx.AsyncClient``
+
+    С ним функции :mod:`apihelper <pyqiwi.apihelper>` возвращают корутины.
+    Параметры те же, что у :class:`HTTP2Session <pyqiwi.http2.HTTP2Session>`.
+
+    Examples
+    --------
+    >>> async with AsyncHTTP2Session() as transport:
+    ...     accounts = await apihelper.funding_sources(token, transport=transport)
+    """
+
+    def __init__(self, max_connections=4, http2=True, proxy=None, middleware=None, **client_kwargs):
+        httpx = _import_httpx('AsyncHTTP2Session')
+        self._httpx = httpx
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        client_kwargs.update(_proxy_kwargs(httpx, proxy))
+        self.client = httpx.AsyncClient(http2=http2, limits=limits, **client_kwargs)
+        super().__init__(middleware)
+
+    async def _send(self, request):
+        if request.proxies:
+            raise ValueError('AsyncHTTP2Session does not support per-request proxies, '
+                             'use AsyncHTTP2Session(proxy=...)')
+        try:
+            response = await self.client.request(request.method, request.url, params=request.params,
+                                                 json=request.json, headers=request.headers,
+                                                 timeout=_timeout(self._httpx, request.timeout))
+        except self._httpx.TransportError as e:
+            raise _transport_error(self._httpx, e)
+        return HTTP2Response(response)
+
+    async def prewarm(self, connections=1, dns_cache=None, base_url=None):
+        """
+        Прогрев соединений, см. :meth:`AsyncTransport.prewarm <pyqiwi.transport.AsyncTransport.prewarm>`
+        """
+        return await super().prewarm(connections, dns_cache, base_url)
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс транзакций в памяти для поиска платежей
+
+>>> index = TransactionIndex(retention=7 * 24 * 3600)
+>>> index.update(wallet.history(rows=50)['transactions'])
+>>> watcher.add_callback(index.add)
+>>> index.find(comment='order-66024', amount=(2983.26, 2983.26))
+[<pyqiwi.types.Transaction object at ...>]
+"""
+import datetime
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from . import util
+
+
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=util.MSK)
+        return value.timestamp()
+    return value
+
+
+class TransactionIndex:
+    """
+    Транзакции с индексами по ID, комментарию, счету, дате и сумме
+
+    Поиск по ID, комментарию и счету выполняется за O(1). Даты и суммы хранятся в отсортированных
+    списках: границы интервала находятся двоичным поиском за O(log n), плюс копирование результата.
+    Вставка в такой список - это двоичный поиск и сдвиг хвоста, O(n) в худшем случае, но новые
+    транзакции обычно попадают в конец списка дат. Транзакции старше ``retention`` секунд и самые старые
+    сверх ``max_size`` вытесняются при добавлении новых: из списка дат удаляется начало, а список сумм
+    при вытеснении сразу многих транзакций перестраивается за O(n). Транзакции без даты
+    учитываются по времени добавления.
+
+    Parameters
+    ----------
+    retention : Optional[float]
+        Сколько секунд хранить транзакции, считая от их даты.
+        По умолчанию - ``None``, без ограничения.
+    max_size : Optional[int]
+        Максимальное число хранимых транзакций.
+        По умолчанию - ``None``, без ограничения.
+    """
+
+    def __init__(self, retention=None, max_size=None):
+        self.retention = retention
+        self.max_size = max_size
+        self._transactions = {}
+        self._by_comment = {}
+        self._by_account = {}
+        # Отсортированные списки (ключ, ID транзакции)
+        self._dates = []
+        self._amounts = []
+        self._keys = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def __contains__(self, txn_id):
+        return txn_id in self._transactions
+
+    def __iter__(self):
+        with self._lock:
+            transactions = [self._transactions[txn_id] for _, txn_id in self._dates]
+        return iter(transactions)
+
+    def add(self, transaction):
+        """
+        Добавление транзакции
+
+        Подходит как обработчик :meth:`PaymentWatcher.add_callback <pyqiwi.watcher.PaymentWatcher.add_callback>`.
+
+        Parameters
+        ----------
+        transaction : :class:`Transaction <pyqiwi.types.Transaction>`
+
+        Returns
+        -------
+        bool
+            ``True``, если транзакция добавлена, ``False`` - если она уже есть или старше ``retention``.
+        """
+        now = time.time()
+        when = _timestamp(transaction.date) if transaction.date is not None else now
+        if self.retention is not None and when < now - self.retention:
+            return False
+        txn_id = transaction.txn_id
+        amount = transaction.sum.amount if transaction.sum is not None else None
+        with self._lock:
+            if txn_id in self._transactions:
+                return False
+            self._transactions[txn_id] = transaction
+            self._keys[txn_id] = (when, amount)
+            if transaction.comment:
+                self._by_comment.setdefault(transaction.comment, {})[txn_id] = None
+            if transaction.account:
+                self._by_account.setdefault(transaction.account, {})[txn_id] = None
+            # insort сдвигает хвост списка, O(n), но это копирование памяти, а не обход в Python
+            insort(self._dates, (when, txn_id))
+            if amount is not None:
+                insort(self._amounts, (amount, txn_id))
+            self._evict(now)
+        return True
+
+    def update(self, transactions):
+        """
+        Добавление нескольких транзакций
+
+        Returns
+        -------
+        int
+            Число добавленных транзакций
+        """
+        return sum(1 for transaction in transactions if self.add(transaction))
+
+    def get(self, txn_id):
+        """
+        Транзакция по ID или ``None``
+        """
+        return self._transactions.get(txn_id)
+
+    def by_comment(self, comment):
+        """
+        Транзакции с комментарием, в порядке добавления
+        """
+        with self._lock:
+            return [self._transactions[txn_id] for txn_id in self._by_comment.get(comment, ())]
+
+    def by_account(self, account):
+        """
+        Транзакции со счетом отправителя или получателя, в порядке добавления
+        """
+        with self._lock:
+            return [self._transactions[txn_id] for txn_id in self._by_account.get(account, ())]
+
+    def between(self, start=None, end=None):
+        """
+        Транзакции с датой в интервале ``[start, end]``, от старых к новым
+
+        Parameters
+        ----------
+        start : Optional[datetime.datetime]
+            Начало интервала, без часового пояса считается московским временем.
+        end : Optional[datetime.datetime]
+            Конец интервала.
+        """
+        with self._lock:
+            matches = self._range(self._dates, _timestamp(start), _timestamp(end))
+            return [self._transactions[txn_id] for _, txn_id in matches]
+
+    def by_amount(self, low=None, high=None):
+        """
+        Транзакции с суммой платежа в интервале ``[low, high]``, по возрастанию суммы
+        """
+        with self._lock:
+            return [self._transactions[txn_id] for _, txn_id in self._range(self._amounts, low, high)]
+
+    def find(self, comment=None, account=None, amount=None, currency=None, start=None, end=None, type=None,
+             status=None):
+        """
+        Поиск транзакций по нескольким условиям
+
+        Кандидаты выбираются по самому избирательному индексу, остальные условия проверяются для них.
+
+        Parameters
+        ----------
+        comment : Optional[str]
+            Комментарий к платежу.
+        account : Optional[str]
+            Счет.
+        amount : Optional[float or tuple]
+            Сумма платежа или интервал ``(low, high)``.
+        currency : Optional[int]
+            Валюта суммы платежа.
+        start : Optional[datetime.datetime]
+            Начало интервала дат.
+        end : Optional[datetime.datetime]
+            Конец интервала дат.
+        type : Optional[str]
+            Тип платежа: IN, OUT или QIWI_CARD.
+        status : Optional[str]
+            Статус платежа.
+
+        Returns
+        -------
+        list[:class:`Transaction <pyqiwi.types.Transaction>`]
+        """
+        low = high = None
+        if amount is not None:
+            low, high = amount if isinstance(amount, tuple) else (amount, amount)
+        start, end = _timestamp(start), _timestamp(end)
+        with self._lock:
+            if comment is not None:
+                candidates = list(self._by_comment.get(comment, ()))
+            elif account is not None:
+                candidates = list(self._by_account.get(account, ()))
+            elif amount is not None:
+                candidates = [txn_id for _, txn_id in self._range(self._amounts, low, high)]
+            else:
+                candidates = [txn_id for _, txn_id in self._range(self._dates, start, end)]
+            result = []
+            for txn_id in candidates:
+                transaction = self._transactions[txn_id]
+                when, value = self._keys[txn_id]
+                if account is not None and transaction.account != account:
+                    continue
+                if amount is not None and (value is None or not low <= value <= high):
+                    continue
+                if currency is not None and (transaction.sum is None or transaction.sum.currency != currency):
+                    continue
+                if (start is not None and when < start) or (end is not None and when > end):
+                    continue
+                if type is not None and transaction.type != type:
+                    continue
+                if status is not None and transaction.status != status:
+                    continue
+                result.append(transaction)
+            return result
+
+    def remove(self, txn_id):
+        """
+        Удаление транзакции по ID
+
+        Returns
+        -------
+        bool
+            ``True``, если транзакция была в индексе.
+        """
+        with self._lock:
+            if txn_id not in self._transactions:
+                return False
+            when, amount = self._keys[txn_id]
+            del self._dates[bisect_left(self._dates, (when, txn_id))]
+            if amount is not None:
+                del self._amounts[bisect_left(self._amounts, (amount, txn_id))]
+            self._forget(txn_id)
+            return True
+
+    def evict(self, now=None):
+        """
+        Вытеснение транзакций старше ``retention`` и сверх ``max_size``
+
+        Returns
+        -------
+        int
+            Число вытесненных транзакций
+        """
+        with self._lock:
+            return self._evict(time.time() if now is None else now)
+
+    def clear(self):
+        with self._lock:
+            self._transactions.clear()
+            self._by_comment.clear()
+            self._by_account.clear()
+            self._dates = []
+            self._amounts = []
+            self._keys.clear()
+
+    def _range(self, keys, low, high):
+        start = 0 if low is None else bisect_left(keys, (low,))
+        stop = len(keys) if high is None else bisect_right(keys, (high, float('inf')))
+        return keys[start:stop]
+
+    def _evict(self, now):
+        dates = self._dates
+        count = 0
+        if self.retention is not None:
+            count = bisect_left(dates, (now - self.retention,))
+        if self.max_size is not None:
+            count = max(count, len(dates) - self.max_size)
+        if count <= 0:
+            return 0
+        evicted = {txn_id for _, txn_id in dates[:count]}
+        del dates[:count]
+        if len(evicted) > 16:
+            self._amounts = [key for key in self._amounts if key[1] not in evicted]
+        else:
+            for txn_id in evicted:
+                amount = self._keys[txn_id][1]
+                if amount is not None:
+                    del self._amounts[bisect_left(self._amounts, (amount, txn_id))]
+        for txn_id in evicted:
+            self._forget(txn_id)
+        return count
+
+    def _forget(self, txn_id):
+        transaction = self._transactions.pop(txn_id)
+        del self._keys[txn_id]
+        for index, key in ((self._by_comment, transaction.comment), (self._by_account, transaction.account)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(txn_id, None)
+                if not ids:
+                    del index[key]
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики запросов к Qiwi API
+
+После :meth:`Metrics.install` каждый запрос из :mod:`apihelper <pyqiwi.apihelper>`
+учитывается в приемниках метрик: задержка по семействам методов, HTTP-коды,
+объем переданных данных и число выполняющихся запросов. Middleware
+:class:`Retry <pyqiwi.retry.Retry>`, :class:`CacheMiddleware <pyqiwi.cache.CacheMiddleware>`,
+:class:`Hedging <pyqiwi.hedge.Hedging>` и :class:`CircuitBreaker <pyqiwi.breaker.CircuitBreaker>`
+дополнительно сообщают о повторах, попаданиях в кэш, дублирующих запросах и отказах выключателя.
+Пока метрики не установлены, их учет не стоит ничего, кроме одной проверки на ``None``.
+
+>>> metrics = Metrics().install()
+>>> wallet.history(rows=50)
+>>> print(metrics.render())
+# HELP pyqiwi_requests_total Requests to Qiwi API
+# TYPE pyqiwi_requests_total counter
+pyqiwi_requests_total{family="payment-history",method="GET",status="200"} 1
+...
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from . import apihelper
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = {
+    'retries': 'Retried requests',
+    'cache_hits': 'Responses served from cache',
+    'cache_misses': 'Cacheable requests sent to the network',
+    'refreshes': 'Cached responses refreshed in the background',
+    'stale_hits': 'Stale cached responses served after a failed request',
+    'hedges': 'Hedged duplicate requests',
+    'hedge_wins': 'Hedged requests that replaced a stalled original',
+    'circuit_open': 'Requests rejected by an open circuit breaker',
+}
+
+
+class MetricsSink:
+    """
+    Интерфейс приемника метрик
+
+    Приемник можно реализовать для отправки метрик в StatsD, логи или другую систему мониторинга.
+    """
+
+    def request(self, family, method, status, elapsed, bytes_out, bytes_in):
+        """
+        Завершенный запрос
+
+        Parameters
+        ----------
+        family : str
+            Семейство методов API
+        method : str
+            HTTP-метод
+        status : str
+            HTTP-код ответа или имя исключения транспорта
+        elapsed : float
+            Время выполнения в секундах
+        bytes_out : int
+            Размер тела запроса
+        bytes_in : int
+            Размер тела ответа
+        """
+        raise NotImplementedError
+
+    def in_flight(self, family, delta):
+        """
+        Изменение числа выполняющихся запросов
+        """
+        raise NotImplementedError
+
+    def count(self, name, family):
+        """
+        Событие middleware: ``retries``, ``cache_hits``, ``cache_misses``, ``refreshes``,
+        ``stale_hits``, ``hedges``, ``hedge_wins`` или ``circuit_open``
+        """
+        raise NotImplementedError
+
+
+def _labels(**labels):
+    return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')
+                                             .replace('\n', '\\n'))
+                          for k, v in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Приемник, накапливающий метрики в памяти и отдающий их в текстовом формате Prometheus
+
+    Сам является WSGI-приложением, которое можно подключить как ``/metrics``.
+
+    Parameters
+    ----------
+    buckets : Optional[tuple]
+        Границы корзин гистограммы задержек в секундах.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._histograms = {}
+        self._bytes_out = defaultdict(int)
+        self._bytes_in = defaultdict(int)
+        self._in_flight = defaultdict(int)
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def __call__(self, environ, start_response):
+        body = self.render().encode('utf-8')
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    def request(self, family, method, status, elapsed, bytes_out, bytes_in):
+        with self._lock:
+            self._requests[(family, method, status)] += 1
+            histogram = self._histograms.get(family)
+            if histogram is None:
+                histogram = self._histograms[family] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][bisect_left(self.buckets, elapsed)] += 1
+            histogram[1] += elapsed
+            self._bytes_out[family] += bytes_out
+            self._bytes_in[family] += bytes_in
+
+    def in_flight(self, family, delta):
+        with self._lock:
+            self._in_flight[family] += delta
+
+    def count(self, name, family):
+        with self._lock:
+            self._counters[name][family] += 1
+
+    def cache_hit_ratio(self):
+        with self._lock:
+            hits = sum(self._counters.get('cache_hits', {}).values())
+            misses = sum(self._counters.get('cache_misses', {}).values())
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def render(self):
+        """
+        Метрики в текстовом формате Prometheus
+
+        Returns
+        -------
+        str
+        """
+        lines = []
+
+        def header(name, kind, description):
+            lines.append('# HELP {0} {1}'.format(name, description))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+
+        with self._lock:
+            header('pyqiwi_requests_total', 'counter', 'Requests to Qiwi API')
+            for (family, method, status), value in sorted(self._requests.items()):
+                lines.append('pyqiwi_requests_total{0} {1}'.format(
+                    _labels(family=family, method=method, status=status), value))
+            header('pyqiwi_request_duration_seconds', 'histogram', 'Request latency')
+            for family, (counts, total) in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    lines.append('pyqiwi_request_duration_seconds_bucket{0} {1}'.format(
+                        _labels(family=family, le=_number(bound)), cumulative))
+                lines.append('pyqiwi_request_duration_seconds_sum{0} {1}'.format(_labels(family=family),
+                                                                                 _number(total)))
+                lines.append('pyqiwi_request_duration_seconds_count{0} {1}'.format(_labels(family=family),
+                                                                                   cumulative))
+            for name, values, description in (('pyqiwi_request_bytes_total', self._bytes_out, 'Request body bytes'),
+                                              ('pyqiwi_response_bytes_total', self._bytes_in,
+                                               'Response body bytes')):
+                header(name, 'counter', description)
+                for family, value in sorted(values.items()):
+                    lines.append('{0}{1} {2}'.format(name, _labels(family=family), value))
+            header('pyqiwi_requests_in_flight', 'gauge', 'Requests in progress')
+            for family, value in sorted(self._in_flight.items()):
+                lines.append('pyqiwi_requests_in_flight{0} {1}'.format(_labels(family=family), value))
+            for name, description in COUNTERS.items():
+                if name not in self._counters:
+                    continue
+                header('pyqiwi_{0}_total'.format(name), 'counter', description)
+                for family, value in sorted(self._counters[name].items()):
+                    lines.append('pyqiwi_{0}_total{1} {2}'.format(name, _labels(family=family), value))
+        if 'cache_hits' in self._counters or 'cache_misses' in self._counters:
+            header('pyqiwi_cache_hit_ratio', 'gauge', 'Share of cacheable requests served from cache')
+            lines.append('pyqiwi_cache_hit_ratio {0}'.format(_number(self.cache_hit_ratio())))
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """
+    Сбор метрик запросов к Qiwi API
+
+    Parameters
+    ----------
+    sinks : Optional[list of :class:`MetricsSink <pyqiwi.metrics.MetricsSink>`]
+        Приемники метрик.
+        По умолчанию - один :class:`PrometheusSink <pyqiwi.metrics.PrometheusSink>`.
+    """
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks) if sinks is not None else [PrometheusSink()]
+        self._previous = None
+        self._installed = False
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def install(self):
+        """
+        Включение сбора метрик для всех запросов :mod:`apihelper <pyqiwi.apihelper>`
+        """
+        if not self._installed:
+            self._previous = apihelper.metrics
+            apihelper.metrics = self
+            self._installed = True
+        return self
+
+    def uninstall(self):
+        if self._installed:
+            apihelper.metrics = self._previous
+            self._previous = None
+            self._installed = False
+
+    def render(self):
+        """
+        Метрики первого :class:`PrometheusSink <pyqiwi.metrics.PrometheusSink>` в текстовом формате Prometheus
+        """
+        for sink in self.sinks:
+            if isinstance(sink, PrometheusSink):
+                return sink.render()
+        raise LookupError('No PrometheusSink configured')
+
+    def started(self, family):
+        for sink in self.sinks:
+            sink.in_flight(family, 1)
+
+    def finished(self, family, method, status, elapsed, response):
+        # Тело запроса уже закодировано транспортом: requests.PreparedRequest.body или Request.body
+        body = getattr(getattr(response, 'request', None), 'body', None)
+        bytes_out = len(body) if body else 0
+        bytes_in = len(response.content) if response is not None else 0
+        method = method.upper()
+        status = str(status)
+        for sink in self.sinks:
+            sink.in_flight(family, -1)
+            sink.request(family, method, status, elapsed, bytes_out, bytes_in)
+
+    def count(self, name, family):
+        for sink in self.sinks:
+            sink.count(name, family)
+
+
+def count(name, family):
+    """
+    Учет события middleware в установленных метриках, если они есть
+    """
+    metrics = apihelper.metrics
+    if metrics is not None:
+        metrics.count(name, family)
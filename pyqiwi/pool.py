@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+import contextvars
+import queue
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import Wallet, apihelper
+
+
+class PoolResult:
+    """
+    Результат операции над одним кошельком из :class:`WalletPool <pyqiwi.pool.WalletPool>`
+
+    Attributes
+    ----------
+    wallet : :class:`Wallet <pyqiwi.Wallet>`
+        Кошелек, над которым выполнялась операция
+    result : object
+        Результат операции (``None``, если произошла ошибка)
+    error : Optional[Exception]
+        Исключение, возникшее при выполнении операции
+    """
+
+    def __init__(self, wallet, result=None, error=None):
+        self.wallet = wallet
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<PoolResult(wallet={0}, ok={1})>'.format(getattr(self.wallet, 'number', None), self.ok)
+
+
+class WalletPool:
+    """
+    Набор кошельков с параллельным выполнением операций над всеми сразу
+
+    Кошельки без своего транспорта переводятся на ``transport`` пула: по умолчанию это отдельная
+    ``requests.Session`` с ``max_workers`` keep-alive соединениями, общая сессия
+    :mod:`apihelper <pyqiwi.apihelper>` и ее адаптеры не изменяются.
+    Запросы токена сверх ``per_wallet`` ждут в очереди пула, не занимая потоки.
+    Результаты выдаются по мере готовности, а не в порядке добавления кошельков.
+
+    Parameters
+    ----------
+    wallets : Optional[iterable of :class:`Wallet <pyqiwi.Wallet>`]
+        Кошельки пула.
+    max_workers : Optional[int]
+        Максимальное число одновременных запросов для всего пула.
+        По умолчанию - 32.
+    per_wallet : Optional[int]
+        Максимальное число одновременных запросов для одного токена.
+        По умолчанию - 1.
+    transport : Optional[:class:`Transport <pyqiwi.transport.Transport>`]
+        Транспорт для кошельков пула без своего транспорта.
+        По умолчанию - сессия пула, создаваемая при добавлении первого такого кошелька
+        и закрываемая в :meth:`close`.
+
+    Examples
+    --------
+    >>> pool = WalletPool.from_tokens(tokens)
+    >>> for item in pool.balances():
+    ...     print(item.wallet.number, item.result)
+    """
+
+    def __init__(self, wallets=None, max_workers=32, per_wallet=1, transport=None):
+        self.max_workers = max_workers
+        self.per_wallet = per_wallet
+        self.transport = transport
+        self._session = None
+        self.wallets = []
+        # Число выполняющихся задач и очередь ожидающих задач для каждого токена
+        self._active = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._executor = None
+        for wallet in wallets or []:
+            self.add(wallet)
+
+    def __len__(self):
+        return len(self.wallets)
+
+    def __iter__(self):
+        return iter(list(self.wallets))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @classmethod
+    def from_tokens(cls, tokens, max_workers=32, per_wallet=1, **wallet_kwargs):
+        """
+        Параллельное создание пула из списка токенов
+
+        Parameters
+        ----------
+        tokens : iterable of str
+            `Ключ Qiwi API`_ для каждого кошелька.
+        max_workers : Optional[int]
+            Максимальное число одновременных запросов для всего пула.
+        per_wallet : Optional[int]
+            Максимальное число одновременных запросов для одного токена.
+        wallet_kwargs
+            Параметры, передаваемые в :class:`Wallet <pyqiwi.Wallet>`.
+            Без ``transport`` кошельки используют транспорт пула.
+
+        Returns
+        -------
+        :class:`WalletPool <pyqiwi.pool.WalletPool>`
+            Пул кошельков
+        """
+        pool = cls(max_workers=max_workers, per_wallet=per_wallet)
+        if wallet_kwargs.get('transport') is None:
+            wallet_kwargs['transport'] = pool._transport()
+        futures = [pool._get_executor().submit(contextvars.copy_context().run, Wallet, token, **wallet_kwargs)
+                   for token in tokens]
+        for future in futures:
+            pool.add(future.result())
+        return pool
+
+    def add(self, wallet):
+        """
+        Добавление кошелька в пул
+
+        Parameters
+        ----------
+        wallet : :class:`Wallet <pyqiwi.Wallet>`
+            Кошелек
+        """
+        if getattr(wallet, 'transport', None) is None:
+            wallet.transport = self._transport()
+        with self._lock:
+            self.wallets.append(wallet)
+
+    def close(self):
+        """
+        Остановка потоков пула и закрытие его сессии
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            session, self._session = self._session, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if session is not None:
+            session.close()
+
+    def _transport(self):
+        with self._lock:
+            if self.transport is None:
+                import requests
+
+                self._session = self.transport = requests.Session()
+                apihelper.configure_pool(self.max_workers, session=self._session)
+            return self.transport
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _call(self, wallet, func, args, kwargs):
+        try:
+            return PoolResult(wallet, result=func(wallet, *args, **kwargs))
+        except Exception as e:
+            return PoolResult(wallet, error=e)
+
+    def _run(self, job):
+        wallet, func, args, kwargs, context, results = job
+        results.put(context.run(self._call, wallet, func, args, kwargs))
+
+    def _schedule(self, job):
+        token = job[0].token
+        with self._lock:
+            if self._active[token] >= self.per_wallet:
+                self._waiting[token].append(job)
+                return
+            self._active[token] += 1
+        self._submit(token, job)
+
+    def _submit(self, token, job):
+        while job is not None:
+            try:
+                future = self._get_executor().submit(self._run, job)
+            except RuntimeError as e:
+                # Пул закрыт во время map(): задача завершается ошибкой, очередь токена разбирается дальше
+                job[5].put(PoolResult(job[0], error=e))
+                job = self._next(token)
+            else:
+                future.add_done_callback(lambda _: self._submit(token, self._next(token)))
+                return
+
+    def _next(self, token):
+        with self._lock:
+            waiting = self._waiting[token]
+            if waiting:
+                return waiting.popleft()
+            self._active[token] -= 1
+            return None
+
+    def map(self, func, *args, **kwargs):
+        """
+        Выполнение функции над каждым кошельком пула
+
+        Parameters
+        ----------
+        func : callable
+            Функция, первым аргументом принимающая :class:`Wallet <pyqiwi.Wallet>`.
+        args, kwargs
+            Остальные аргументы функции.
+
+        Yields
+        ------
+        :class:`PoolResult <pyqiwi.pool.PoolResult>`
+            Результаты в порядке завершения.
+        """
+        wallets = list(self)
+        results = queue.Queue()
+        # Каждая задача получает копию контекста, чтобы на нее действовал Deadline вызывающего
+        context = contextvars.copy_context()
+        for wallet in wallets:
+            self._schedule((wallet, func, args, kwargs, context.copy(), results))
+        for _ in wallets:
+            yield results.get()
+
+    def balances(self, currency=643):
+        """
+        Балансы всех кошельков
+
+        Parameters
+        ----------
+        currency : int
+            ID валюты в ``number-3 ISO-4217``.
+
+        Yields
+        ------
+        :class:`PoolResult <pyqiwi.pool.PoolResult>`
+            ``result`` - баланс кошелька (float).
+        """
+        return self.map(Wallet.balance, currency)
+
+    def profiles(self):
+        """
+        Профили всех кошельков
+
+        Yields
+        ------
+        :class:`PoolResult <pyqiwi.pool.PoolResult>`
+            ``result`` - :class:`Profile <pyqiwi.types.Profile>`.
+        """
+        return self.map(lambda wallet: wallet.profile)
+
+    def stats(self, start_date=None, end_date=None, operation=None, sources=None):
+        """
+        Статистика платежей всех кошельков
+
+        Parameters
+        ----------
+        start_date, end_date, operation, sources
+            Те же, что и у :meth:`Wallet.stat <pyqiwi.Wallet.stat>`.
+
+        Yields
+        ------
+        :class:`PoolResult <pyqiwi.pool.PoolResult>`
+            ``result`` - :class:`Statistics <pyqiwi.types.Statistics>`.
+        """
+        return self.map(Wallet.stat, start_date=start_date, end_date=end_date,
+                        operation=operation, sources=sources)
+
+    def histories(self, since, operation=None, sources=None):
+        """
+        Новые платежи всех кошельков с контрольной точки
+
+        Parameters
+        ----------
+        since : datetime.datetime or int or dict
+            Контрольная точка для :meth:`Wallet.history_since <pyqiwi.Wallet.history_since>`,
+            либо dict с контрольной точкой для каждого номера кошелька.
+        operation : Optional[str]
+            Тип операций в отчете, для отбора.
+        sources : Optional[list]
+            Источники платежа, для отбора.
+
+        Yields
+        ------
+        :class:`PoolResult <pyqiwi.pool.PoolResult>`
+            ``result`` - list[:class:`Transaction <pyqiwi.types.Transaction>`].
+        """
+        def history(wallet):
+            checkpoint = since[getattr(wallet, 'number', None)] if isinstance(since, dict) else since
+            return wallet.history_since(checkpoint, operation=operation, sources=sources)
+
+        return self.map(history)
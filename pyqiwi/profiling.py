@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Профилирование вызовов кошелька по фазам
+
+После :meth:`Profiler.install` каждый вызов метода :class:`Wallet <pyqiwi.Wallet>`
+(или функции :mod:`apihelper <pyqiwi.apihelper>` вне кошелька) раскладывается на фазы:
+
+* ``prepare`` - сборка заголовков и параметров запроса;
+* ``connect`` - установка соединения и TLS, если соединение не было открыто;
+* ``ttfb`` - ожидание первого байта и чтение заголовков ответа;
+* ``body`` - остальное время транспорта: отправка запроса, чтение тела ответа и middleware;
+* ``decode`` - проверка ответа и разбор JSON;
+* ``build`` - сборка объектов :mod:`types <pyqiwi.types>` без разбора дат;
+* ``date`` - разбор дат.
+
+``connect`` и ``ttfb`` измеряются для транспортов на основе urllib3
+(:class:`RequestsTransport <pyqiwi.transport.RequestsTransport>`, общая сессия
+и :class:`Urllib3Transport <pyqiwi.transport.Urllib3Transport>`), у остальных это время входит в ``body``.
+Время вызова, не вошедшее в фазы, показывается как ``other``.
+Замеры накапливаются в :class:`ProfileStats <pyqiwi.profiling.ProfileStats>`.
+
+>>> profiler = Profiler().install()
+>>> profiler.dump_on_signal(signal.SIGUSR1)
+>>> wallet.history(rows=50)
+>>> print(profiler.stats.format())
+operation         calls  total ms  prepare  connect  ttfb  body  decode  build  date  other
+Wallet.history        1     ...
+"""
+import contextvars
+import http.client
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from . import apihelper, types
+
+PHASES = ('prepare', 'connect', 'ttfb', 'body', 'decode', 'build', 'date')
+
+_call = contextvars.ContextVar('pyqiwi_profile', default=None)
+_local = threading.local()
+
+
+class _Call:
+    __slots__ = ('phases',)
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+
+def _timed(function, phase):
+    # Вызов учитывается, только если он сделан внутри профилируемого вызова кошелька
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        call = _call.get()
+        if call is None or getattr(_local, 'active', False):
+            return function(*args, **kwargs)
+        _local.active = True
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            call.phases[phase] += time.perf_counter() - started
+            _local.active = False
+    return wrapper
+
+
+class ProfileStats:
+    """
+    Накопленные замеры фаз по операциям
+
+    Операция - метод кошелька, например ``Wallet.history``, или семейство методов API
+    для вызовов :mod:`apihelper <pyqiwi.apihelper>` вне кошелька.
+    """
+
+    def __init__(self):
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def add(self, operation, total, phases):
+        with self._lock:
+            entry = self._operations.get(operation)
+            if entry is None:
+                entry = self._operations[operation] = [0, 0.0, dict.fromkeys(PHASES, 0.0)]
+            entry[0] += 1
+            entry[1] += total
+            for phase, seconds in phases.items():
+                entry[2][phase] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+    def as_dict(self):
+        """
+        Замеры в виде словаря
+
+        Returns
+        -------
+        dict
+            ``{операция: {'calls': число вызовов, 'total': секунды, 'phases': {фаза: секунды}}}``,
+            фаза ``other`` - время вне остальных фаз
+        """
+        with self._lock:
+            result = {}
+            for operation, (calls, total, phases) in self._operations.items():
+                phases = dict(phases)
+                phases['other'] = max(total - sum(phases.values()), 0.0)
+                result[operation] = {'calls': calls, 'total': total, 'phases': phases}
+            return result
+
+    def format(self):
+        """
+        Таблица среднего времени фаз на вызов в миллисекундах
+        """
+        columns = PHASES + ('other',)
+        operations = self.as_dict()
+        width = max([len('operation')] + [len(operation) for operation in operations])
+        lines = ['{0:<{1}}  {2:>7}  {3:>9}  '.format('operation', width, 'calls', 'total ms') +
+                 '  '.join('{0:>8}'.format(column) for column in columns)]
+        for operation, entry in sorted(operations.items()):
+            calls = entry['calls']
+            lines.append('{0:<{1}}  {2:>7}  {3:>9.3f}  '.format(operation, width, calls,
+                                                                entry['total'] * 1000 / calls) +
+                         '  '.join('{0:>8.3f}'.format(entry['phases'][column] * 1000 / calls)
+                                   for column in columns))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, file=None):
+        """
+        Вывод таблицы :meth:`format`
+
+        Parameters
+        ----------
+        file : Optional[file]
+            Файл для вывода.
+            По умолчанию - ``sys.stderr``.
+        """
+        file = file if file is not None else sys.stderr
+        file.write(self.format())
+        file.flush()
+
+
+class Profiler:
+    """
+    Профилирование вызовов кошелька по фазам
+
+    Parameters
+    ----------
+    stats : Optional[:class:`ProfileStats <pyqiwi.profiling.ProfileStats>`]
+        Накопитель замеров.
+        По умолчанию - новый.
+
+    Attributes
+    ----------
+    stats : :class:`ProfileStats <pyqiwi.profiling.ProfileStats>`
+        Накопленные замеры
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats if stats is not None else ProfileStats()
+        self._previous = None
+        self._patched = []
+        self._installed = False
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def install(self):
+        """
+        Включение профилирования
+
+        Кроме :mod:`apihelper <pyqiwi.apihelper>` подменяет установку соединения urllib3
+        и чтение заголовков ответа ``http.client``, чтобы измерить ``connect`` и ``ttfb``.
+        """
+        if not self._installed:
+            import urllib3.connection
+
+            self._previous = apihelper.profiler
+            apihelper.profiler = self
+            types.observers.append(self)
+            for owner, name, phase in ((urllib3.connection.HTTPConnection, 'connect', 'connect'),
+                                       (urllib3.connection.HTTPSConnection, 'connect', 'connect'),
+                                       (http.client.HTTPResponse, 'begin', 'ttfb')):
+                original = owner.__dict__[name]
+                self._patched.append((owner, name, original))
+                setattr(owner, name, _timed(original, phase))
+            self._installed = True
+        return self
+
+    def uninstall(self):
+        if self._installed:
+            for owner, name, original in reversed(self._patched):
+                setattr(owner, name, original)
+            self._patched = []
+            apihelper.profiler = self._previous
+            types.observers.remove(self)
+            self._previous = None
+            self._installed = False
+
+    def dump_on_signal(self, signum, file=None):
+        """
+        Вывод замеров по сигналу, например ``signal.SIGUSR1``
+
+        Обработчик сигнала можно установить только из главного потока.
+
+        Parameters
+        ----------
+        signum : int
+            Номер сигнала.
+        file : Optional[file]
+            Файл для вывода.
+            По умолчанию - ``sys.stderr``.
+        """
+        import signal
+
+        signal.signal(signum, lambda *_: self.stats.dump(file))
+
+    @contextmanager
+    def operation(self, name):
+        """
+        Профилируемый вызов, вложенные вызовы входят во внешний
+        """
+        if _call.get() is not None:
+            yield
+            return
+        call = _Call()
+        token = _call.set(call)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - started
+            _call.reset(token)
+            self.stats.add(name, total, call.phases)
+
+    def phase(self, name, mark):
+        """
+        Учет времени фазы с момента ``mark`` (``time.perf_counter()``)
+
+        Returns
+        -------
+        float
+            Текущее значение ``time.perf_counter()`` для замера следующей фазы
+        """
+        now = time.perf_counter()
+        call = _call.get()
+        if call is not None:
+            call.phases[name] += now - mark
+        return now
+
+    @contextmanager
+    def transport(self):
+        """
+        Замер запроса транспорта: время вне ``connect`` и ``ttfb`` считается фазой ``body``
+        """
+        call = _call.get()
+        if call is None:
+            yield
+            return
+        phases = call.phases
+        measured = phases['connect'] + phases['ttfb']
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            phases['body'] += max(elapsed - (phases['connect'] + phases['ttfb'] - measured), 0.0)
+
+    @contextmanager
+    def building(self, cls):
+        call = _call.get()
+        if call is None:
+            yield
+            return
+        phases = call.phases
+        dates = phases['date']
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases['build'] += time.perf_counter() - started - (phases['date'] - dates)
+
+    def parsing_date(self):
+        call = _call.get()
+        if call is None:
+            return nullcontext()
+        return self._date(call)
+
+    @contextmanager
+    def _date(self, call):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            call.phases['date'] += time.perf_counter() - started
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Таблица курсов валют для быстрой конвертации
+
+Курсы из :attr:`Wallet.cross_rates <pyqiwi.Wallet.cross_rates>` раскладываются в плотную матрицу
+по кодам валют ISO-4217, недостающие пары вычисляются через промежуточные валюты.
+Конвертация - обращение к двум словарям и умножение, массив сумм пересчитывается одним курсом.
+
+>>> table = RateTable(wallet=wallet)
+>>> table.start(interval=600)
+>>> table.convert(100, 840, 643)
+6410.0
+>>> table.convert_many([10, 20, 50], 978, 643)
+[747.0, 1494.0, 3735.0]
+"""
+import math
+import threading
+
+from . import apihelper
+
+
+class _Matrix:
+    # Неизменяемый снимок курсов: таблица заменяет его целиком при обновлении
+
+    def __init__(self, currencies, index, rows, quoted):
+        self.currencies = currencies
+        self.index = index
+        self.rows = rows
+        self.quoted = quoted
+
+
+def _build(rates, base):
+    currencies = sorted({rate._from for rate in rates} | {rate.to for rate in rates})
+    index = {code: i for i, code in enumerate(currencies)}
+    size = len(currencies)
+    matrix = [[math.nan] * size for _ in range(size)]
+    hops = [[math.inf] * size for _ in range(size)]
+    quoted = set()
+    for i in range(size):
+        matrix[i][i] = 1.0
+        hops[i][i] = 0
+    for rate in rates:
+        i, j = index[rate._from], index[rate.to]
+        if i != j and rate.rate:
+            matrix[i][j] = float(rate.rate)
+            hops[i][j] = 1
+            quoted.add((rate._from, rate.to))
+    # Обратные курсы для пар, котируемых только в одну сторону
+    for i in range(size):
+        for j in range(size):
+            if hops[i][j] == math.inf and hops[j][i] == 1:
+                matrix[i][j] = 1 / matrix[j][i]
+                hops[i][j] = 1
+    # Кросс-курсы через наименьшее число промежуточных валют, базовая валюта проверяется первой
+    order = sorted(range(size), key=lambda k: currencies[k] != base)
+    for k in order:
+        row_k = matrix[k]
+        for i in range(size):
+            via = hops[i][k]
+            if via == math.inf:
+                continue
+            rate_ik = matrix[i][k]
+            row_i, hops_i, hops_k = matrix[i], hops[i], hops[k]
+            for j in range(size):
+                if via + hops_k[j] < hops_i[j]:
+                    hops_i[j] = via + hops_k[j]
+                    row_i[j] = rate_ik * row_k[j]
+    return _Matrix(tuple(currencies), index, tuple(tuple(row) for row in matrix), frozenset(quoted))
+
+
+class RateTable:
+    """
+    Матрица курсов валют с кросс-курсами и обновлением в фоне
+
+    Обновление строит новую матрицу и подменяет ее одним присваиванием,
+    поэтому конвертация из других потоков не блокируется и не видит частично обновленных курсов.
+
+    Parameters
+    ----------
+    rates : Optional[list[:class:`Rate <pyqiwi.types.Rate>`]]
+        Курсы валют. Если не указаны, загружаются через ``wallet``.
+    wallet : Optional[:class:`Wallet <pyqiwi.Wallet>`]
+        Кошелек для загрузки курсов при :meth:`refresh`.
+    base : Optional[int]
+        Валюта, через которую в первую очередь вычисляются кросс-курсы.
+        По умолчанию - 643 (рубли).
+    """
+
+    def __init__(self, rates=None, wallet=None, base=643):
+        self.wallet = wallet
+        self.base = base
+        self._matrix = _build([], base)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        if rates is not None or wallet is not None:
+            self.refresh(rates)
+
+    @property
+    def currencies(self):
+        """
+        Коды валют в порядке строк и столбцов :attr:`matrix`
+        """
+        return self._matrix.currencies
+
+    @property
+    def matrix(self):
+        """
+        Курсы: ``matrix[i][j]`` - стоимость единицы ``currencies[i]`` в ``currencies[j]``,
+        ``nan`` для пар, курс которых нельзя вычислить
+        """
+        return self._matrix.rows
+
+    def __contains__(self, currency):
+        return currency in self._matrix.index
+
+    def quoted(self, _from, to):
+        """
+        Указан ли курс пары в ответе Qiwi API напрямую, а не вычислен через другие валюты
+        """
+        return (_from, to) in self._matrix.quoted
+
+    def rate(self, _from, to):
+        """
+        Курс пары валют
+
+        Parameters
+        ----------
+        _from : int
+            Код исходной валюты (number-3 ISO-4217).
+        to : int
+            Код валюты результата.
+
+        Returns
+        -------
+        float
+
+        Raises
+        ------
+        ValueError
+            Валюта неизвестна или курс пары нельзя вычислить.
+        """
+        return self._rate(self._matrix, _from, to)
+
+    def convert(self, amount, _from, to):
+        """
+        Пересчет суммы из одной валюты в другую
+
+        Parameters
+        ----------
+        amount : float
+            Сумма в валюте ``_from``.
+        _from : int
+            Код исходной валюты.
+        to : int
+            Код валюты результата.
+
+        Returns
+        -------
+        float
+        """
+        return amount * self._rate(self._matrix, _from, to)
+
+    def convert_many(self, amounts, _from, to):
+        """
+        Пересчет массива сумм
+
+        Курсы берутся из одного снимка таблицы, даже если он обновляется во время пересчета.
+
+        Parameters
+        ----------
+        amounts : list[float] or numpy.ndarray
+            Суммы.
+        _from : int or list[int]
+            Код исходной валюты для всех сумм или список кодов для каждой суммы.
+        to : int
+            Код валюты результата.
+
+        Returns
+        -------
+        list[float] or numpy.ndarray
+            Массив numpy пересчитывается умножением на курс и возвращается того же типа.
+        """
+        matrix = self._matrix
+        if isinstance(_from, int):
+            rate = self._rate(matrix, _from, to)
+            if hasattr(amounts, '__array__'):
+                return amounts * rate
+            return [amount * rate for amount in amounts]
+        column = self._column(matrix, to)
+        index = matrix.index
+        try:
+            rates = [column[index[code]] for code in _from]
+        except KeyError as e:
+            raise ValueError('Unknown currency: {0}'.format(e.args[0]))
+        if any(math.isnan(rate) for rate in rates):
+            raise ValueError('No rate to {0} for some of the currencies'.format(to))
+        if hasattr(amounts, '__array__'):
+            return amounts * rates
+        return [amount * rate for amount, rate in zip(amounts, rates)]
+
+    def refresh(self, rates=None):
+        """
+        Пересчет матрицы по новым курсам
+
+        Parameters
+        ----------
+        rates : Optional[list[:class:`Rate <pyqiwi.types.Rate>`]]
+            Курсы валют.
+            По умолчанию загружаются через :attr:`Wallet.cross_rates <pyqiwi.Wallet.cross_rates>`.
+        """
+        if rates is None:
+            if self.wallet is None:
+                raise ValueError('RateTable has no wallet to load rates from')
+            rates = self.wallet.cross_rates
+        self._matrix = _build(list(rates), self.base)
+
+    def run(self, interval=3600):
+        """
+        Обновление курсов каждые ``interval`` секунд до вызова :meth:`stop`
+
+        Ошибки загрузки логируются, конвертация продолжается по прежним курсам.
+        """
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                apihelper.logger.error('RateTable refresh failed: {0}'.format(e))
+
+    def start(self, interval=3600):
+        """
+        Запуск :meth:`run` в отдельном потоке
+
+        Returns
+        -------
+        threading.Thread
+            Поток обновления
+        """
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, args=(interval,), name='RateTable', daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def stop(self):
+        """
+        Остановка обновления
+
+        Обновление снова запускается через :meth:`start`, :meth:`run` после остановки сразу завершается.
+        """
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _rate(self, matrix, _from, to):
+        try:
+            rate = matrix.rows[matrix.index[_from]][matrix.index[to]]
+        except KeyError as e:
+            raise ValueError('Unknown currency: {0}'.format(e.args[0]))
+        if math.isnan(rate):
+            raise ValueError('No rate from {0} to {1}'.format(_from, to))
+        return rate
+
+    def _column(self, matrix, to):
+        if to not in matrix.index:
+            raise ValueError('Unknown currency: {0}'.format(to))
+        j = matrix.index[to]
+        return [row[j] for row in matrix.rows]
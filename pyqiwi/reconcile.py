@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Сверка входящих платежей с ожидаемыми счетами
+
+Номер заказа передается в комментарии платежа, например через
+:func:`generate_form_link <pyqiwi.generate_form_link>`. Транзакции из истории платежей
+или уведомлений Qiwi сопоставляются со счетами по словарям комментариев и сумм,
+поэтому время обработки платежа не зависит от числа открытых счетов.
+
+>>> reconciler = Reconciler()
+>>> reconciler.expect('order-66024', 2983.26, expires=datetime.now() + timedelta(hours=1))
+>>> reconciler.add_callback(on_event)
+>>> watcher.add_callback(reconciler.feed)
+>>> receiver.add_handler(reconciler.feed)
+"""
+import heapq
+import re
+import threading
+import time
+
+from .index import _timestamp
+from .watcher import SeenSet
+
+OPEN = 'open'
+MATCHED = 'matched'
+PARTIAL = 'partial'
+OVERPAID = 'overpaid'
+UNMATCHED = 'unmatched'
+EXPIRED = 'expired'
+
+
+def _minor(amount):
+    # Сумма в копейках, чтобы частичные оплаты складывались без ошибок округления
+    return int(round(amount * 100))
+
+
+class Invoice:
+    """
+    Ожидаемый платеж
+
+    Attributes
+    ----------
+    order_id : str
+        Номер заказа из комментария платежа.
+    amount : float
+        Сумма счета.
+    currency : int
+        Валюта счета.
+    expires : Optional[float]
+        Время окончания срока оплаты (Unix timestamp).
+    status : str
+        ``open``, ``partial``, ``matched``, ``overpaid`` или ``expired``.
+    transactions : list[:class:`Transaction <pyqiwi.types.Transaction>`]
+        Платежи по счету.
+    """
+
+    def __init__(self, order_id, amount, currency=643, expires=None):
+        self.order_id = order_id
+        self.amount = amount
+        self.currency = currency
+        self.expires = expires
+        self.status = OPEN
+        self.transactions = []
+        self._expected = _minor(amount)
+        self._paid = 0
+
+    @property
+    def paid(self):
+        """
+        Оплаченная сумма
+        """
+        return self._paid / 100
+
+    @property
+    def remaining(self):
+        """
+        Оставшаяся к оплате сумма, отрицательная при переплате
+        """
+        return (self._expected - self._paid) / 100
+
+    def __repr__(self):
+        return '<Invoice {0} {1}/{2} {3}>'.format(self.order_id, self.paid, self.amount, self.status)
+
+
+class Event:
+    """
+    Результат сверки
+
+    Attributes
+    ----------
+    kind : str
+        ``matched`` - счет оплачен полностью,
+        ``partial`` - оплачен частично,
+        ``overpaid`` - оплачен с переплатой,
+        ``unmatched`` - платеж не относится ни к одному открытому счету,
+        ``expired`` - срок оплаты счета истек.
+    invoice : Optional[:class:`Invoice <pyqiwi.reconcile.Invoice>`]
+        Счет. Для ``unmatched`` - счет с номером из комментария, если валюта платежа не совпала.
+    transaction : Optional[:class:`Transaction <pyqiwi.types.Transaction>`]
+        Платеж, ``None`` для ``expired``.
+    """
+
+    def __init__(self, kind, invoice=None, transaction=None):
+        self.kind = kind
+        self.invoice = invoice
+        self.transaction = transaction
+
+    def __repr__(self):
+        return '<Event {0} {1!r}>'.format(self.kind, self.invoice)
+
+
+class Reconciler:
+    """
+    Сверка платежей со счетами
+
+    Учитываются только успешные входящие платежи, повторно переданная транзакция игнорируется.
+    Оплаченные полностью, с переплатой и просроченные счета закрываются и больше не хранятся:
+    следующий платеж по ним будет ``unmatched``. Частично оплаченный счет остается открытым.
+    Платеж, совершенный после окончания срока оплаты, закрывает счет событием ``expired``
+    и сам становится ``unmatched``.
+
+    Parameters
+    ----------
+    pattern : Optional[str]
+        Регулярное выражение для поиска номера заказа в комментарии, номер - первая группа.
+        По умолчанию - ``None``, номером считается весь комментарий без пробелов по краям.
+    match_amount : Optional[bool]
+        Сопоставлять ли платеж без известного номера заказа по сумме,
+        если неоплаченный счет с такой суммой и валютой ровно один.
+        По умолчанию - ``False``.
+    seen_size : Optional[int]
+        Сколько ID транзакций хранить для удаления дубликатов.
+    """
+
+    def __init__(self, pattern=None, match_amount=False, seen_size=100000):
+        self.pattern = re.compile(pattern) if pattern is not None else None
+        self.match_amount = match_amount
+        self.seen = SeenSet(seen_size)
+        self._invoices = {}
+        # (валюта, сумма в копейках) -> номера неоплаченных счетов в порядке регистрации
+        self._by_amount = {}
+        self._expiry = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._invoices)
+
+    def __contains__(self, order_id):
+        return order_id in self._invoices
+
+    def add_callback(self, callback):
+        """
+        Регистрация обработчика событий сверки
+
+        Parameters
+        ----------
+        callback : callable
+            Функция, принимающая :class:`Event <pyqiwi.reconcile.Event>`.
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def expect(self, order_id, amount, currency=643, expires=None):
+        """
+        Регистрация ожидаемого платежа
+
+        Parameters
+        ----------
+        order_id : str
+            Номер заказа, который плательщик передаст в комментарии.
+        amount : float
+            Сумма счета.
+        currency : Optional[int]
+            Валюта счета.
+            По умолчанию - 643 (рубли).
+        expires : Optional[datetime.datetime or float]
+            Окончание срока оплаты, без часового пояса считается московским временем.
+            По умолчанию - ``None``, без срока.
+
+        Returns
+        -------
+        :class:`Invoice <pyqiwi.reconcile.Invoice>`
+
+        Raises
+        ------
+        ValueError
+            Счет с таким номером заказа уже открыт.
+        """
+        invoice = Invoice(order_id, amount, currency, _timestamp(expires))
+        with self._lock:
+            if order_id in self._invoices:
+                raise ValueError('Invoice already registered: {0}'.format(order_id))
+            self._invoices[order_id] = invoice
+            self._by_amount.setdefault((currency, invoice._expected), {})[order_id] = None
+            if invoice.expires is not None:
+                heapq.heappush(self._expiry, (invoice.expires, order_id))
+        return invoice
+
+    def invoice(self, order_id):
+        """
+        Открытый счет по номеру заказа или ``None``
+        """
+        return self._invoices.get(order_id)
+
+    def cancel(self, order_id):
+        """
+        Удаление открытого счета без события
+
+        Returns
+        -------
+        Optional[:class:`Invoice <pyqiwi.reconcile.Invoice>`]
+        """
+        with self._lock:
+            invoice = self._invoices.get(order_id)
+            if invoice is not None:
+                self._close(invoice)
+            return invoice
+
+    def order_id(self, comment):
+        """
+        Номер заказа из комментария платежа или ``None``
+        """
+        if not comment:
+            return None
+        if self.pattern is None:
+            return comment.strip() or None
+        match = self.pattern.search(comment)
+        return match.group(1) if match else None
+
+    def feed(self, transaction):
+        """
+        Сверка платежа
+
+        Подходит как обработчик :meth:`PaymentWatcher.add_callback <pyqiwi.watcher.PaymentWatcher.add_callback>`
+        и :meth:`WebhookReceiver.add_handler <pyqiwi.webhook.WebhookReceiver.add_handler>`.
+
+        Parameters
+        ----------
+        transaction : :class:`Transaction <pyqiwi.types.Transaction>`
+
+        Returns
+        -------
+        Optional[:class:`Event <pyqiwi.reconcile.Event>`]
+            Событие по платежу, ``None`` для исходящих, неуспешных и уже сверенных платежей.
+        """
+        if transaction.type != 'IN' or transaction.status != 'SUCCESS' or transaction.sum is None:
+            return None
+        if not self.seen.add(transaction.txn_id):
+            return None
+        events = []
+        with self._lock:
+            event = self._match(transaction, events)
+        events.append(event)
+        self._emit(events)
+        return event
+
+    def update(self, transactions):
+        """
+        Сверка нескольких платежей, например страницы истории
+
+        Returns
+        -------
+        list[:class:`Event <pyqiwi.reconcile.Event>`]
+            События по платежам
+        """
+        return [event for event in map(self.feed, transactions) if event is not None]
+
+    def expire(self, now=None):
+        """
+        Закрытие счетов с истекшим сроком оплаты
+
+        Чтобы учесть задержку появления платежей в истории, можно передать ``now`` с запасом.
+
+        Parameters
+        ----------
+        now : Optional[datetime.datetime or float]
+            Текущее время.
+            По умолчанию - ``time.time()``.
+
+        Returns
+        -------
+        list[:class:`Event <pyqiwi.reconcile.Event>`]
+            События ``expired``
+        """
+        now = time.time() if now is None else _timestamp(now)
+        events = []
+        with self._lock:
+            expiry = self._expiry
+            while expiry and expiry[0][0] <= now:
+                expires, order_id = heapq.heappop(expiry)
+                invoice = self._invoices.get(order_id)
+                if invoice is not None and invoice.expires == expires:
+                    events.append(self._expired(invoice))
+        self._emit(events)
+        return events
+
+    def _match(self, transaction, events):
+        amount = _minor(transaction.sum.amount)
+        currency = transaction.sum.currency
+        invoice = self._invoices.get(self.order_id(transaction.comment))
+        if invoice is None and self.match_amount:
+            candidates = self._by_amount.get((currency, amount))
+            if candidates is not None and len(candidates) == 1:
+                invoice = self._invoices[next(iter(candidates))]
+        if invoice is None:
+            return Event(UNMATCHED, transaction=transaction)
+        if invoice.currency != currency:
+            return Event(UNMATCHED, invoice, transaction)
+        if invoice.expires is not None and transaction.date is not None and \
+                _timestamp(transaction.date) > invoice.expires:
+            events.append(self._expired(invoice))
+            return Event(UNMATCHED, transaction=transaction)
+        if invoice.status == OPEN:
+            self._unindex_amount(invoice)
+        invoice._paid += amount
+        invoice.transactions.append(transaction)
+        if invoice._paid < invoice._expected:
+            invoice.status = PARTIAL
+        else:
+            invoice.status = MATCHED if invoice._paid == invoice._expected else OVERPAID
+            self._close(invoice)
+        return Event(invoice.status, invoice, transaction)
+
+    def _expired(self, invoice):
+        invoice.status = EXPIRED
+        self._close(invoice)
+        return Event(EXPIRED, invoice)
+
+    def _close(self, invoice):
+        del self._invoices[invoice.order_id]
+        self._unindex_amount(invoice)
+
+    def _unindex_amount(self, invoice):
+        key = (invoice.currency, invoice._expected)
+        ids = self._by_amount.get(key)
+        if ids is not None:
+            ids.pop(invoice.order_id, None)
+            if not ids:
+                del self._by_amount[key]
+
+    def _emit(self, events):
+        for event in events:
+            for callback in list(self._callbacks):
+                callback(event)
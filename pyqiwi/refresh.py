@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Обновление курсов валют и форм провайдеров в фоне до истечения кэша
+
+:class:`CacheMiddleware <pyqiwi.cache.CacheMiddleware>` запрашивает ответ заново только после
+истечения времени жизни, и этот запрос ждет первый пришедший вызов.
+:class:`RefreshMiddleware <pyqiwi.refresh.RefreshMiddleware>` повторяет используемые запросы
+в отдельном потоке заранее, поэтому вызовы :attr:`Wallet.cross_rates <pyqiwi.Wallet.cross_rates>`
+и :meth:`Wallet.get_commission <pyqiwi.Wallet.get_commission>` получают ответ из памяти,
+а при недоступности Qiwi API - последний успешный ответ:
+
+>>> refresher = RefreshMiddleware(stale_if_error=600)
+>>> wallet = Wallet(token, transport=Urllib3Transport(middleware=[refresher]))
+"""
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from . import apihelper, metrics
+from .cache import _key
+from .transport import Response
+
+# (шаблон пути, время жизни в секундах, общий ли ответ для всех токенов)
+DEFAULT_RULES = [
+    (r'sinap/crossRates', 60, True),
+    (r'sinap/providers/\d+/form', 3600, True),
+]
+
+
+class _Entry:
+    def __init__(self, request, send, ttl):
+        self.request = request
+        self.send = send
+        self.ttl = ttl
+        self.response = None
+        self.expires = 0.0
+        self.stale_until = 0.0
+        self.due = 0.0
+        # Читали ли ответ с последнего обновления: неиспользуемые ответы не обновляются
+        self.read = False
+        self.failures = 0
+
+
+def _copy(response, request):
+    return Response(response.status_code, response.content, dict(response.headers), response.reason, request)
+
+
+class RefreshMiddleware:
+    """
+    Middleware транспорта, хранящее ответы в памяти и обновляющее их в фоне до истечения
+
+    Ответ, который читали после последнего обновления, запрашивается заново в отдельном потоке
+    за долю ``refresh_ahead`` времени жизни до истечения. Моменты обновления смещаются случайно
+    на долю ``jitter`` времени жизни, чтобы ответы, полученные одновременно, не обновлялись пачкой.
+    Неиспользуемые ответы не обновляются и удаляются из памяти после окна ``stale_if_error``.
+
+    Если обновление или запрос по сети завершились исключением транспорта либо ответом
+    с кодом из ``failure_statuses``, в течение ``stale_if_error`` секунд после истечения
+    возвращается последний успешный ответ, а фоновый поток продолжает попытки обновления.
+    Пока они неудачны, вызовы получают этот ответ сразу, не дожидаясь таймаута.
+    Ответ с любым другим кодом, кроме 200 (например, 401 для отозванного токена),
+    удаляет сохраненный ответ из памяти.
+
+    Работает с синхронными транспортами, см. :class:`Transport <pyqiwi.transport.Transport>`.
+
+    Parameters
+    ----------
+    rules : Optional[list]
+        Список ``(шаблон пути, время жизни, общий для всех токенов)``.
+        По умолчанию - :data:`DEFAULT_RULES`: курсы валют на 60 секунд и формы провайдеров на час.
+    refresh_ahead : Optional[float]
+        За какую долю времени жизни до истечения обновлять ответ.
+        По умолчанию - 0.2.
+    jitter : Optional[float]
+        Наибольшее случайное смещение обновления, в долях времени жизни.
+        По умолчанию - 0.1.
+    stale_if_error : Optional[float]
+        Сколько секунд после истечения отдавать последний ответ при ошибках Qiwi API.
+        По умолчанию - 300, ``0`` отключает.
+    failure_statuses : Optional[iterable]
+        HTTP-коды, считающиеся отказом сервиса.
+        По умолчанию - 423 и 5xx.
+
+    Attributes
+    ----------
+    hits : int
+        Число ответов из памяти, включая устаревшие
+    misses : int
+        Число запросов вызывающих потоков, выполненных по сети
+    refreshes : int
+        Число успешных обновлений в фоне
+    stale_hits : int
+        Число устаревших ответов, отданных из-за ошибок
+    """
+
+    def __init__(self, rules=None, refresh_ahead=0.2, jitter=0.1, stale_if_error=300, failure_statuses=None):
+        self.rules = [(re.compile(pattern), ttl, shared) for pattern, ttl, shared in (rules or DEFAULT_RULES)]
+        self.refresh_ahead = refresh_ahead
+        self.jitter = jitter
+        self.stale_if_error = stale_if_error
+        if failure_statuses is None:
+            failure_statuses = [423] + list(range(500, 600))
+        self.failure_statuses = frozenset(failure_statuses)
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.stale_hits = 0
+        self._entries = {}
+        # Куча (время, порядковый номер, ключ) следующей проверки ответа
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __call__(self, request, send):
+        rule = self._rule(request)
+        if rule is None:
+            return send(request)
+        key, ttl = rule
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.response is not None:
+            if now < entry.expires:
+                entry.read = True
+                self.hits += 1
+                metrics.count('cache_hits', request.family)
+                return _copy(entry.response, request)
+            if entry.failures and now < entry.stale_until:
+                entry.read = True
+                return self._stale(entry, request)
+        self.misses += 1
+        metrics.count('cache_misses', request.family)
+        try:
+            response = send(request)
+        except Exception:
+            if entry is not None and now < entry.stale_until:
+                return self._failed(key, entry, request)
+            raise
+        if response.status_code == 200:
+            self._store(key, ttl, request, send, response)
+        elif response.status_code not in self.failure_statuses:
+            self._drop(key, entry)
+        elif entry is not None and now < entry.stale_until:
+            return self._failed(key, entry, request)
+        return response
+
+    def close(self):
+        """
+        Остановка фонового потока
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _rule(self, request):
+        if request.method != 'GET':
+            return None
+        path = urlsplit(request.url).path.strip('/')
+        for pattern, ttl, shared in self.rules:
+            if pattern.fullmatch(path):
+                return _key(request, shared), ttl
+        return None
+
+    def _failed(self, key, entry, request):
+        # Дальше ответ обновляется в фоне, а вызовы сразу получают устаревший
+        with self._condition:
+            entry.read = True
+            if not entry.failures:
+                self._retry(key, entry, time.monotonic())
+        return self._stale(entry, request)
+
+    def _drop(self, key, entry):
+        with self._condition:
+            if entry is not None and self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def _stale(self, entry, request):
+        self.hits += 1
+        self.stale_hits += 1
+        metrics.count('stale_hits', request.family)
+        return _copy(entry.response, request)
+
+    def _store(self, key, ttl, request, send, response):
+        now = time.monotonic()
+        with self._condition:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(request, send, ttl)
+            entry.request, entry.send, entry.ttl = request, send, ttl
+            entry.response = _copy(response, request)
+            entry.expires = now + ttl
+            entry.stale_until = entry.expires + self.stale_if_error
+            entry.read = False
+            entry.failures = 0
+            due = entry.expires - ttl * (self.refresh_ahead + random.uniform(0, self.jitter))
+            self._push(key, entry, max(due, now))
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='RefreshMiddleware', daemon=True)
+                self._thread.start()
+
+    def _push(self, key, entry, due):
+        entry.due = due
+        heapq.heappush(self._schedule, (due, next(self._counter), key))
+        if self._schedule[0][2] == key:
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._schedule and self._schedule[0][0] <= now:
+                        break
+                    self._condition.wait(self._schedule[0][0] - now if self._schedule else None)
+                if self._closed:
+                    return
+                due, _, key = heapq.heappop(self._schedule)
+                entry = self._entries.get(key)
+                if entry is None or entry.due != due:
+                    continue
+                if not entry.read:
+                    # Ответ не нужен: проверяем еще раз при истечении и удаляем после окна stale_if_error
+                    if now >= entry.stale_until:
+                        del self._entries[key]
+                    else:
+                        self._push(key, entry, entry.expires if now < entry.expires else entry.stale_until)
+                    continue
+            self._refresh(key, entry)
+
+    def _refresh(self, key, entry):
+        family = entry.request.family
+        try:
+            response = entry.send(entry.request)
+        except Exception as e:
+            error = e
+        else:
+            if response.status_code == 200:
+                self.refreshes += 1
+                metrics.count('refreshes', family)
+                self._store(key, entry.ttl, entry.request, entry.send, response)
+                return
+            if response.status_code not in self.failure_statuses:
+                # Ответ больше не действителен, повторять запрос бесполезно
+                apihelper.logger.error('RefreshMiddleware dropped {0}: HTTP {1}'.format(family, response.status_code))
+                self._drop(key, entry)
+                return
+            error = 'HTTP {0}'.format(response.status_code)
+        apihelper.logger.error('RefreshMiddleware refresh of {0} failed: {1}'.format(family, error))
+        with self._condition:
+            self._retry(key, entry, time.monotonic())
+
+    def _retry(self, key, entry, now):
+        entry.failures += 1
+        if now >= entry.stale_until:
+            self._entries.pop(key, None)
+            return
+        # Повтор с нарастающей паузой, последняя попытка - в конце окна stale_if_error
+        delay = min(entry.ttl * self.refresh_ahead / 4 * 2 ** (entry.failures - 1), entry.ttl)
+        self._push(key, entry, min(now + delay * random.uniform(0.5, 1), entry.stale_until))
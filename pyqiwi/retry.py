@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+
+from . import deadline, exceptions, metrics, tracing
+
+
+class Retry:
+    """
+    Повторные попытки идемпотентных запросов при сбоях сети и временных ошибках API
+
+    Middleware транспорта. Между попытками выдерживается экспоненциальная пауза со случайным разбросом.
+    Если действует :class:`Deadline <pyqiwi.deadline.Deadline>`, таймауты каждой попытки
+    сокращаются до оставшегося времени, а попытка, которая не успеет до его истечения,
+    не выполняется: возвращается последний ответ или
+    :class:`DeadlineExceeded <pyqiwi.exceptions.DeadlineExceeded>`, если ответа не было.
+
+    Parameters
+    ----------
+    attempts : Optional[int]
+        Максимальное число попыток, включая первую.
+        По умолчанию - 3.
+    backoff : Optional[float]
+        Пауза перед второй попыткой в секундах, далее удваивается.
+        По умолчанию - 0.2.
+    max_backoff : Optional[float]
+        Максимальная пауза в секундах.
+        По умолчанию - 5.
+    statuses : Optional[iterable]
+        HTTP-коды, при которых запрос повторяется.
+        По умолчанию - 423, 500, 502, 503 и 504.
+    methods : Optional[iterable]
+        HTTP-методы, которые можно повторять.
+        По умолчанию - ``GET`` и ``HEAD``.
+
+    Attributes
+    ----------
+    retries : int
+        Число выполненных повторных попыток
+
+    Examples
+    --------
+    >>> transport = RequestsTransport(middleware=[Retry(attempts=4)])
+    >>> with Deadline(3):
+    ...     wallet = Wallet(token, transport=transport)
+    """
+
+    def __init__(self, attempts=3, backoff=0.2, max_backoff=5, statuses=(423, 500, 502, 503, 504),
+                 methods=('GET', 'HEAD')):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request, send):
+        if request.method not in self.methods:
+            return send(request)
+        response = None
+        for attempt in range(self.attempts):
+            if attempt:
+                if not self._wait(attempt):
+                    if response is not None:
+                        return response
+                    raise deadline.current().exceeded(request.family)
+                request.timeout = deadline.limit(request.timeout)
+                with self._lock:
+                    self.retries += 1
+                metrics.count('retries', request.family)
+                tracing.set_attribute('qiwi.retries', attempt)
+            try:
+                response = send(request)
+            except exceptions.APIError:
+                raise
+            except OSError:
+                # Ошибки сети requests и других транспортов наследуются от OSError
+                if attempt == self.attempts - 1:
+                    raise
+                response = None
+                continue
+            if response.status_code not in self.statuses:
+                return response
+        return response
+
+    def _wait(self, attempt):
+        pause = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        pause = random.uniform(pause / 2, pause)
+        current = deadline.current()
+        if current is not None and current.remaining() <= pause:
+            return False
+        time.sleep(pause)
+        return True
@@ -0,0 +1,555 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный симулятор Qiwi API для нагрузочного и интеграционного тестирования
+
+Реализует методы, используемые :mod:`apihelper <pyqiwi.apihelper>`, на localhost.
+Подключается подменой :data:`apihelper.API_URL <pyqiwi.apihelper.API_URL>`.
+
+Examples
+--------
+>>> with Simulator(transactions=1000, latency=0.01) as sim:
+...     wallet = Wallet(sim.token)
+...     wallet.history(rows=50)
+"""
+import base64
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from . import apihelper, util
+
+PROVIDERS = {99: 'QIWI Кошелек', 1963: 'Visa', 21013: 'MasterCard', 26476: 'Банковский перевод',
+             1: 'МТС', 2: 'Билайн', 3: 'МегаФон'}
+RATES = {(643, 840): 0.0156, (840, 643): 64.1, (643, 978): 0.0134, (978, 643): 74.7,
+         (840, 978): 0.858, (978, 840): 1.165, (643, 398): 5.78, (398, 643): 0.173}
+COMMISSION_RATE = 0.02
+
+
+def _date(value):
+    return util.qiwi_date(value)
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z')
+
+
+def _amount(value, currency=643):
+    return {'amount': value, 'currency': currency}
+
+
+class SimulatedWallet:
+    """
+    Кошелек симулятора
+
+    Attributes
+    ----------
+    token : str
+        Ключ Qiwi API кошелька
+    number : int
+        Номер кошелька
+    balance : float
+        Рублевый баланс
+    transactions : list[dict]
+        Транзакции в формате истории платежей, от новых к старым
+    """
+
+    def __init__(self, token, number, balance, transactions):
+        self.token = token
+        self.number = number
+        self.balance = balance
+        self.transactions = transactions
+        self.hook = None
+        self.history_calls = []
+
+
+class _Fault:
+    def __init__(self, status, endpoint, rate, count, body):
+        self.status = status
+        self.endpoint = endpoint
+        self.rate = rate
+        self.count = count
+        self.body = body
+
+
+class Simulator:
+    """
+    Симулятор Qiwi API
+
+    Parameters
+    ----------
+    wallets : Optional[int]
+        Число создаваемых кошельков с токенами ``token-0``, ``token-1``...
+    transactions : Optional[int]
+        Число транзакций в истории каждого кошелька.
+    latency : Optional[float or tuple]
+        Задержка ответа в секундах, либо (минимум, максимум) для случайной задержки.
+    history_limit : Optional[int]
+        Максимальное число запросов истории в минуту на кошелек, после которого отдается HTTP 423.
+        По умолчанию не ограничено.
+    seed : Optional[int]
+        Начальное значение генератора для воспроизводимых данных.
+    host : Optional[str]
+        Адрес для прослушивания.
+    port : Optional[int]
+        Порт для прослушивания (0 - любой свободный).
+
+    Attributes
+    ----------
+    api_url : str
+        Шаблон адреса API симулятора для :data:`apihelper.API_URL <pyqiwi.apihelper.API_URL>`
+    wallets : dict
+        :class:`SimulatedWallet <pyqiwi.simulator.SimulatedWallet>` по токену
+    requests : int
+        Число обработанных запросов
+    """
+
+    def __init__(self, wallets=1, transactions=100, latency=0.0, history_limit=None, seed=0,
+                 host='127.0.0.1', port=0):
+        self.latency = latency
+        self.history_limit = history_limit
+        self.host = host
+        self.port = port
+        self.wallets = {}
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._faults = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._previous_url = None
+        self._txn_id = 10000000000
+        for i in range(wallets):
+            self.add_wallet('token-{0}'.format(i), transactions=transactions)
+
+    def __enter__(self):
+        self.start()
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+        self.stop()
+
+    @property
+    def token(self):
+        return next(iter(self.wallets))
+
+    @property
+    def number(self):
+        return str(self.wallets[self.token].number)
+
+    @property
+    def api_url(self):
+        return 'http://{0}:{1}/{{0}}'.format(*self._server.server_address)
+
+    def add_wallet(self, token, number=None, balance=10000.0, transactions=100):
+        """
+        Добавление кошелька со сгенерированной историей
+
+        Returns
+        -------
+        :class:`SimulatedWallet <pyqiwi.simulator.SimulatedWallet>`
+            Кошелек
+        """
+        if number is None:
+            number = 79000000000 + len(self.wallets)
+        now = datetime.datetime.now(util.MSK).replace(microsecond=0)
+        rows = []
+        for i in range(transactions):
+            date = now - datetime.timedelta(minutes=7 * (transactions - i))
+            rows.append(self._make_transaction(number, date, self._random.choice(['IN', 'IN', 'OUT'])))
+        rows.reverse()
+        wallet = SimulatedWallet(token, number, balance, rows)
+        self.wallets[token] = wallet
+        return wallet
+
+    def _make_transaction(self, number, date, _type, amount=None, account=None, comment=None, provider=None):
+        self._txn_id += self._random.randint(1, 50)
+        if amount is None:
+            amount = round(self._random.uniform(1, 5000), 2)
+        if provider is None:
+            provider = self._random.choice(list(PROVIDERS))
+        commission = 0 if _type == 'IN' else round(amount * COMMISSION_RATE, 2)
+        return {'txnId': self._txn_id,
+                'personId': number,
+                'date': _date(date),
+                'errorCode': 0,
+                'error': None,
+                'status': 'SUCCESS',
+                'type': _type,
+                'statusText': 'Success',
+                'trmTxnId': str(self._random.randint(10 ** 12, 10 ** 13)),
+                'account': account or '+7{0}'.format(self._random.randint(9000000000, 9999999999)),
+                'sum': _amount(amount),
+                'commission': _amount(commission),
+                'total': _amount(round(amount + commission, 2)),
+                'provider': {'id': provider, 'shortName': PROVIDERS.get(provider, str(provider)),
+                             'longName': PROVIDERS.get(provider, str(provider)),
+                             'logoUrl': 'https://static.qiwi.com/img/providers/logoBig/{0}.png'.format(provider),
+                             'description': None, 'keys': None, 'siteUrl': None},
+                'source': ['QW_RUB'],
+                'comment': comment if comment is not None else 'order-{0}'.format(self._random.randint(1, 10 ** 6)),
+                'currencyRate': 1,
+                'features': {'chequeReady': True, 'bankDocumentReady': False,
+                             'regularPaymentEnabled': False, 'bankDocumentAvailable': False,
+                             'repeatPaymentEnabled': False, 'favoritePaymentEnabled': True},
+                'view': {'title': PROVIDERS.get(provider, ''), 'account': account or ''}}
+
+    def add_payment(self, token, amount, _type='IN', account=None, comment=None, provider=99):
+        """
+        Добавление новой транзакции в историю кошелька
+
+        Returns
+        -------
+        dict
+            Транзакция в формате истории платежей
+        """
+        with self._lock:
+            wallet = self.wallets[token]
+            row = self._make_transaction(wallet.number, datetime.datetime.now(util.MSK).replace(microsecond=0),
+                                         _type, amount=amount, account=account, comment=comment, provider=provider)
+            wallet.transactions.insert(0, row)
+            if _type == 'IN':
+                wallet.balance += amount
+            else:
+                wallet.balance -= row['total']['amount']
+        return row
+
+    def inject(self, status, endpoint=None, rate=1.0, count=None, body=''):
+        """
+        Внедрение ошибок в ответы
+
+        Parameters
+        ----------
+        status : int
+            HTTP-код ошибки (например 401, 404, 423, 500, 503).
+        endpoint : Optional[str]
+            Начало пути метода API (например ``payment-history``). По умолчанию - все методы.
+        rate : Optional[float]
+            Доля запросов, завершающихся ошибкой.
+        count : Optional[int]
+            Сколько раз отдать ошибку. По умолчанию - без ограничений.
+        body : Optional[str]
+            Тело ответа с ошибкой.
+        """
+        with self._lock:
+            self._faults.append(_Fault(status, endpoint, rate, count, body))
+
+    def clear_faults(self):
+        with self._lock:
+            self._faults = []
+
+    def start(self):
+        """
+        Запуск HTTP-сервера симулятора в отдельном потоке
+        """
+        handler = type('Handler', (_Handler,), {'simulator': self})
+        self._server = _Server((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), name='QiwiSimulator', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def install(self):
+        """
+        Направление запросов :mod:`apihelper <pyqiwi.apihelper>` на симулятор
+        """
+        self._previous_url = apihelper.API_URL
+        apihelper.API_URL = self.api_url
+
+    def uninstall(self):
+        if self._previous_url is not None:
+            apihelper.API_URL = self._previous_url
+            self._previous_url = None
+
+    def transport(self):
+        """
+        Транспорт в памяти, передающий запросы симулятору без HTTP-сервера
+
+        Returns
+        -------
+        :class:`FakeTransport <pyqiwi.transport.FakeTransport>`
+            Транспорт для :class:`Wallet <pyqiwi.Wallet>` или функций :mod:`apihelper <pyqiwi.apihelper>`
+        """
+        from .transport import FakeTransport
+        return FakeTransport(self.handle)
+
+    def handle(self, request):
+        """
+        Обработка :class:`Request <pyqiwi.transport.Request>` без HTTP-сервера
+
+        Returns
+        -------
+        :class:`Response <pyqiwi.transport.Response>`
+        """
+        from .transport import Response
+        query = {str(k): str(v) for k, v in request.params.items() if v is not None}
+        token = request.headers.get('Authorization', '')[len('Bearer '):]
+        status, text, content_type = self.dispatch(request.method, urlsplit(request.url).path, query,
+                                                   request.json, token)
+        return Response(status, text.encode('utf-8'), {'Content-Type': content_type}, request=request)
+
+    def _sleep(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self._random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _fault(self, path):
+        with self._lock:
+            for fault in self._faults:
+                if fault.endpoint and not path.startswith(fault.endpoint):
+                    continue
+                if fault.count == 0 or self._random.random() >= fault.rate:
+                    continue
+                if fault.count is not None:
+                    fault.count -= 1
+                return fault
+        return None
+
+    def dispatch(self, method, path, query, body, token):
+        """
+        Обработка запроса к API
+
+        Returns
+        -------
+        tuple
+            (HTTP-код, тело ответа, Content-Type)
+        """
+        with self._lock:
+            self.requests += 1
+        self._sleep()
+        path = path.strip('/')
+        fault = self._fault(path)
+        if fault is not None:
+            return fault.status, fault.body, 'application/json'
+        wallet = self.wallets.get(token)
+        if wallet is None:
+            return 401, '', 'application/json'
+        for pattern, route_method, handler in _ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and route_method == method:
+                return handler(self, wallet, query, body, *match.groups())
+        return 404, '', 'application/json'
+
+    def _person(self, wallet, number):
+        if str(wallet.number) != str(number):
+            return None
+        return wallet
+
+    def profile(self, wallet, query, body):
+        registered = _date(datetime.datetime(2017, 1, 1, tzinfo=util.MSK))
+        return _json({'authInfo': {'boundEmail': 'user@example.com', 'ip': '127.0.0.1',
+                                   'lastLoginDate': registered,
+                                   'mobilePinInfo': {'mobilePinUsed': True, 'lastMobilePinChange': registered,
+                                                     'nextMobilePinChange': registered},
+                                   'passInfo': {'lastPassChange': registered, 'nextPassChange': registered,
+                                                'passwordUsed': True},
+                                   'personId': wallet.number, 'pinInfo': {'pinUsed': True},
+                                   'registrationDate': registered},
+                      'contractInfo': {'blocked': False, 'contractId': wallet.number, 'creationDate': registered,
+                                       'features': [], 'identificationInfo': [
+                                           {'bankAlias': 'QIWI', 'identificationLevel': 'SIMPLE'}]},
+                      'userInfo': {'defaultPayCurrency': 643, 'defaultPaySource': 7, 'email': None,
+                                   'firstTxnId': 10000000000, 'language': 'Russian', 'operator': 'Beeline',
+                                   'phoneHash': 'hash', 'promoEnabled': None}})
+
+    def accounts(self, wallet, query, body, number=None):
+        if number is not None and self._person(wallet, number) is None:
+            return 404, '', 'application/json'
+        return _json({'accounts': [{'alias': 'qw_wallet_rub', 'fsAlias': 'qb_wallet', 'title': 'Qiwi Account',
+                                    'type': {'id': 'WALLET', 'title': 'QIWI Wallet'}, 'hasBalance': True,
+                                    'balance': _amount(round(wallet.balance, 2)), 'currency': 643}]})
+
+    def accounts_offer(self, wallet, query, body, number):
+        return _json([{'alias': 'qw_wallet_usd', 'currency': 840},
+                      {'alias': 'qw_wallet_eur', 'currency': 978}])
+
+    def create_account(self, wallet, query, body, number):
+        return 201, '', 'application/json'
+
+    def history(self, wallet, query, body, number):
+        if self._person(wallet, number) is None:
+            return 404, '', 'application/json'
+        if self.history_limit is not None:
+            now = time.monotonic()
+            with self._lock:
+                wallet.history_calls = [t for t in wallet.history_calls if now - t < 60] + [now]
+                if len(wallet.history_calls) > self.history_limit:
+                    return 423, '', 'application/json'
+        rows = int(query.get('rows', 20))
+        if not 1 <= rows <= 50:
+            return 400, _json({'errorCode': 'validation.error', 'userMessage': 'rows'})[1], 'application/json'
+        data = self._filter(wallet, query)
+        if 'nextTxnId' in query:
+            next_txn_id = int(query['nextTxnId'])
+            data = [row for row in data if row['txnId'] < next_txn_id]
+        page = data[:rows]
+        result = {'data': page, 'nextTxnId': None, 'nextTxnDate': None}
+        if len(data) > rows:
+            result['nextTxnId'] = page[-1]['txnId']
+            result['nextTxnDate'] = page[-1]['date']
+        return _json(result)
+
+    def _filter(self, wallet, query):
+        data = wallet.transactions
+        operation = query.get('operation', 'ALL')
+        if operation != 'ALL':
+            data = [row for row in data if row['type'] == operation]
+        if 'startDate' in query and 'endDate' in query:
+            start = _parse_date(query['startDate'])
+            end = _parse_date(query['endDate'])
+            data = [row for row in data if start <= _parse_date(row['date']) <= end]
+        return data
+
+    def total(self, wallet, query, body, number):
+        if self._person(wallet, number) is None:
+            return 404, '', 'application/json'
+        data = self._filter(wallet, query)
+        incoming = sum(row['sum']['amount'] for row in data if row['type'] == 'IN')
+        outgoing = sum(row['sum']['amount'] for row in data if row['type'] == 'OUT')
+        return _json({'incomingTotal': [_amount(round(incoming, 2))],
+                      'outgoingTotal': [_amount(round(outgoing, 2))]})
+
+    def transaction(self, wallet, query, body, txn_id):
+        for row in wallet.transactions:
+            if str(row['txnId']) == txn_id and row['type'] == query.get('type', row['type']):
+                return _json(row)
+        return 404, '', 'application/json'
+
+    def cheque_file(self, wallet, query, body, txn_id):
+        if self.transaction(wallet, query, body, txn_id)[0] != 200:
+            return 404, '', 'application/json'
+        return 200, '%PDF-1.4 cheque {0}'.format(txn_id), 'application/pdf'
+
+    def cheque_send(self, wallet, query, body, txn_id):
+        if self.transaction(wallet, query, body, txn_id)[0] != 200:
+            return 404, '', 'application/json'
+        return 204, '', 'application/json'
+
+    def form(self, wallet, query, body, pid):
+        return _json({'id': pid, 'content': {'terms': {'commission': {'ranges': [
+            {'bound': 0, 'fixed': 0, 'rate': COMMISSION_RATE}]}}}})
+
+    def online_commission(self, wallet, query, body, pid):
+        amount = float(body['purchaseTotals']['total']['amount'])
+        commission = round(amount * COMMISSION_RATE, 2)
+        return _json({'providerId': int(pid), 'withdrawSum': _amount(round(amount + commission, 2)),
+                      'enrollmentSum': _amount(amount), 'qwCommission': _amount(commission),
+                      'fundingSourceCommission': _amount(0), 'withdrawToEnrollmentRate': 1})
+
+    def payment(self, wallet, query, body, pid):
+        amount = float(body['sum']['amount'])
+        if amount > wallet.balance:
+            return 400, _json({'code': 'QWPRC-220', 'message': 'Недостаточно средств'})[1], 'application/json'
+        row = self.add_payment(wallet.token, amount, _type='OUT', account=body['fields'].get('account'),
+                               comment=body.get('comment'), provider=int(pid))
+        return _json({'id': body['id'], 'terms': pid, 'fields': body['fields'], 'sum': body['sum'],
+                      'transaction': {'id': str(row['txnId']), 'state': {'code': 'Accepted'}},
+                      'source': 'account_643', 'comment': body.get('comment')})
+
+    def cross_rates(self, wallet, query, body):
+        return _json({'result': [{'from': str(src), 'to': str(dst), 'rate': rate}
+                                 for (src, dst), rate in RATES.items()]})
+
+    def identification(self, wallet, query, body, number):
+        result = dict(body)
+        result['id'] = wallet.number
+        result['type'] = 'VERIFIED'
+        return _json(result)
+
+    def register_hook(self, wallet, query, body):
+        wallet.hook = {'hookId': str(uuid.uuid4()), 'hookParameters': {'url': query.get('param')},
+                       'hookType': 'WEB', 'txnType': 'BOTH',
+                       'key': base64.b64encode(uuid.uuid4().bytes).decode()}
+        return _json({k: v for k, v in wallet.hook.items() if k != 'key'})
+
+    def active_hook(self, wallet, query, body):
+        if wallet.hook is None:
+            return 404, '', 'application/json'
+        return _json({k: v for k, v in wallet.hook.items() if k != 'key'})
+
+    def test_hook(self, wallet, query, body):
+        if wallet.hook is None:
+            return 404, '', 'application/json'
+        return _json({'response': 'Webhook sent'})
+
+    def delete_hook(self, wallet, query, body, hook_id):
+        wallet.hook = None
+        return _json({'response': 'Hook deleted'})
+
+    def hook_key(self, wallet, query, body, hook_id):
+        if wallet.hook is None or wallet.hook['hookId'] != hook_id:
+            return 404, '', 'application/json'
+        return _json({'key': wallet.hook['key']})
+
+
+def _json(value):
+    return 200, json.dumps(value, ensure_ascii=False), 'application/json'
+
+
+_ROUTES = [
+    (r'person-profile/v1/profile/current', 'GET', Simulator.profile),
+    (r'funding-sources/v1/accounts/current', 'GET', Simulator.accounts),
+    (r'funding-sources/v2/persons/(\d+)/accounts', 'GET', Simulator.accounts),
+    (r'funding-sources/v2/persons/(\d+)/accounts/offer', 'GET', Simulator.accounts_offer),
+    (r'funding-sources/v2/persons/(\d+)/accounts', 'POST', Simulator.create_account),
+    (r'payment-history/v2/persons/(\d+)/payments', 'GET', Simulator.history),
+    (r'payment-history/v2/persons/(\d+)/payments/total', 'GET', Simulator.total),
+    (r'payment-history/v2/transactions/(\d+)', 'GET', Simulator.transaction),
+    (r'payment-history/v1/transactions/(\d+)/cheque/file', 'GET', Simulator.cheque_file),
+    (r'payment-history/v1/transactions/(\d+)/cheque/send', 'POST', Simulator.cheque_send),
+    (r'sinap/providers/(\d+)/form', 'GET', Simulator.form),
+    (r'sinap/providers/(\d+)/onlineCommission', 'POST', Simulator.online_commission),
+    (r'sinap/api/v2/terms/(\d+)/payments', 'POST', Simulator.payment),
+    (r'sinap/crossRates', 'GET', Simulator.cross_rates),
+    (r'identification/v1/persons/(\d+)/identification', 'POST', Simulator.identification),
+    (r'payment-notifier/v1/hooks', 'PUT', Simulator.register_hook),
+    (r'payment-notifier/v1/hooks/active', 'GET', Simulator.active_hook),
+    (r'payment-notifier/v1/hooks/test', 'GET', Simulator.test_hook),
+    (r'payment-notifier/v1/hooks/([\w-]+)', 'DELETE', Simulator.delete_hook),
+    (r'payment-notifier/v1/hooks/([\w-]+)/key', 'GET', Simulator.hook_key),
+]
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    simulator = None
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = None
+        if length:
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+        token = self.headers.get('Authorization', '')[len('Bearer '):]
+        status, text, content_type = self.simulator.dispatch(self.command, url.path, query, body, token)
+        payload = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+    def log_message(self, format, *args):
+        apihelper.logger.debug(format % args)
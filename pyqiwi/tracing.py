@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Трассировка запросов к Qiwi API в формате OpenTelemetry
+
+После :meth:`Tracing.install` каждый вызов :mod:`apihelper <pyqiwi.apihelper>` открывает span
+``qiwi <семейство методов>`` с атрибутами ``qiwi.family``, ``http.request.method``,
+``http.response.status_code``, ``http.response.body.size`` и ``qiwi.retries``, а внутри него -
+span ``qiwi.decode`` для проверки и разбора ответа. Сборка объектов :mod:`types <pyqiwi.types>`
+отмечается span'ами ``qiwi.build``. Span'ы открываются как дочерние к текущему span'у
+вызывающего кода, в том числе в потоках :class:`WalletPool <pyqiwi.pool.WalletPool>`,
+который копирует контекст.
+Пока трассировка не установлена, она не стоит ничего, кроме одной проверки на ``None``.
+
+>>> from opentelemetry import trace
+>>> tracer = trace.get_tracer(__name__)
+>>> with Tracing().install(), tracer.start_as_current_span('report'):
+...     wallet.history(rows=50)
+"""
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+from . import apihelper, types
+from .__version__ import __version__
+
+_span = contextvars.ContextVar('pyqiwi_span', default=None)
+
+
+def _default_tracer():
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        raise ImportError('Tracing without an explicit tracer requires opentelemetry-api: '
+                          'pip install qiwipy[tracing]')
+    return trace.get_tracer('pyqiwi', __version__)
+
+
+class Tracing:
+    """
+    Трассировка запросов к Qiwi API
+
+    Parameters
+    ----------
+    tracer : Optional[opentelemetry.trace.Tracer]
+        Tracer OpenTelemetry или любой объект с методом ``start_as_current_span(name, attributes=None)``.
+        По умолчанию - ``opentelemetry.trace.get_tracer('pyqiwi')``, требуется ``opentelemetry-api``.
+    """
+
+    def __init__(self, tracer=None):
+        self.tracer = tracer if tracer is not None else _default_tracer()
+        self._previous = None
+        self._installed = False
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def install(self):
+        """
+        Включение трассировки для всех запросов :mod:`apihelper <pyqiwi.apihelper>`
+        """
+        if not self._installed:
+            self._previous = apihelper.tracer
+            apihelper.tracer = self
+            types.observers.append(self)
+            self._installed = True
+        return self
+
+    def uninstall(self):
+        if self._installed:
+            apihelper.tracer = self._previous
+            types.observers.remove(self)
+            self._previous = None
+            self._installed = False
+
+    @contextmanager
+    def span(self, name, attributes=None):
+        """
+        Span, дочерний к текущему
+        """
+        with self.tracer.start_as_current_span(name, attributes=attributes) as span:
+            token = _span.set(span)
+            try:
+                yield span
+            finally:
+                _span.reset(token)
+
+    def request(self, family, method):
+        return self.span('qiwi ' + family, {'qiwi.family': family, 'http.request.method': method.upper()})
+
+    def response(self, result):
+        span = _span.get()
+        if span is not None:
+            span.set_attribute('http.response.status_code', result.status_code)
+            span.set_attribute('http.response.body.size', len(result.content))
+
+    def building(self, cls):
+        return self.span('qiwi.build', {'qiwi.type': cls.__name__})
+
+    def parsing_date(self):
+        return nullcontext()
+
+
+def set_attribute(key, value):
+    """
+    Атрибут span'а текущего запроса, если трассировка установлена
+
+    Предназначено для middleware транспорта, например :class:`Retry <pyqiwi.retry.Retry>`
+    записывает так число повторов в ``qiwi.retries``.
+    """
+    if apihelper.tracer is not None:
+        span = _span.get()
+        if span is not None:
+            span.set_attribute(key, value)
@@ -0,0 +1,786 @@
+# -*- coding: utf-8 -*-
+"""
+Транспорты для запросов к Qiwi API
+
+Транспорт - объект с методом ``request(method, url, params=None, json=None, headers=None,
+timeout=None, proxies=None)`` как у ``requests.Session``, возвращающий ответ с атрибутами
+``status_code``, ``reason``, ``headers``, ``content``, ``text``, ``request`` и методом ``json()``.
+Подходит любой такой объект, но наследники :class:`Transport <pyqiwi.transport.Transport>`
+дополнительно поддерживают цепочку middleware, через которую проходит каждый запрос:
+
+>>> def log_requests(request, send):
+...     response = send(request)
+...     print(request.method, request.path_url, response.status_code)
+...     return response
+>>> transport = Urllib3Transport(middleware=[log_requests])
+>>> wallet = Wallet(token, transport=transport)
+
+С асинхронным транспортом (:class:`AsyncTransport <pyqiwi.transport.AsyncTransport>`)
+функции :mod:`apihelper <pyqiwi.apihelper>` возвращают корутину:
+
+>>> accounts = await apihelper.funding_sources(token, transport=AsyncHTTP2Session())
+"""
+import json
+import queue
+import socket
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from . import apihelper
+
+
+class Request:
+    """
+    Запрос к API, проходящий через middleware транспорта
+
+    Attributes
+    ----------
+    method : str
+        HTTP-метод в верхнем регистре
+    url : str
+        Адрес без параметров запроса
+    params : dict
+        Параметры запроса
+    json : Optional[dict]
+        Тело запроса
+    headers : dict
+        Заголовки запроса
+    timeout : Optional[tuple]
+        Таймауты соединения и чтения в секундах
+    proxies : Optional[dict]
+        Прокси-серверы в формате requests
+    """
+
+    def __init__(self, method, url, params=None, json=None, headers=None, timeout=None, proxies=None):
+        self.method = method.upper()
+        self.url = url
+        self.params = params or {}
+        self.json = json
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.proxies = proxies
+        self._body = None
+
+    def __repr__(self):
+        return '<Request({0} {1})>'.format(self.method, self.path_url)
+
+    @property
+    def body(self):
+        """
+        Тело запроса в JSON в кодировке UTF-8 или ``None``, кодируется один раз
+        """
+        if self.json is None:
+            return None
+        if self._body is None:
+            self._body = json.dumps(self.json).encode('utf-8')
+        return self._body
+
+    @property
+    def query(self):
+        """
+        Параметры запроса в виде строки, без параметров со значением ``None``
+        """
+        return urlencode([(k, v) for k, v in self.params.items() if v is not None])
+
+    @property
+    def family(self):
+        """
+        Семейство методов API, как его определяет :mod:`apihelper <pyqiwi.apihelper>`,
+        например ``payment-history`` или ``crossRates``
+        """
+        path = urlsplit(self.url).path
+        base = urlsplit(apihelper.API_URL.format('')).path
+        if path.startswith(base):
+            path = path[len(base):]
+        return apihelper._family(path.strip('/'))
+
+    @property
+    def path_url(self):
+        parts = urlsplit(self.full_url)
+        return parts.path + ('?' + parts.query if parts.query else '')
+
+    @property
+    def full_url(self):
+        query = self.query
+        if not query:
+            return self.url
+        return self.url + ('&' if '?' in self.url else '?') + query
+
+
+class Response:
+    """
+    Ответ транспорта с интерфейсом ``requests.Response``, которого ожидает :mod:`apihelper <pyqiwi.apihelper>`
+
+    Attributes
+    ----------
+    status_code : int
+        HTTP-код ответа
+    content : bytes
+        Тело ответа
+    headers : dict
+        Заголовки ответа
+    reason : str
+        Текстовое описание HTTP-кода
+    request : :class:`Request <pyqiwi.transport.Request>`
+        Запрос, на который получен ответ
+    """
+
+    def __init__(self, status_code, content=b'', headers=None, reason='', request=None, encoding='utf-8'):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+        self.reason = reason
+        self.request = request
+        self.encoding = encoding
+        self._text = None
+
+    def __repr__(self):
+        return '<Response [{0}]>'.format(self.status_code)
+
+    @property
+    def url(self):
+        return self.request.full_url if self.request is not None else None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.content.decode(self.encoding, errors='replace')
+        return self._text
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+
+def _chain(send, middleware):
+    for handler in reversed(middleware):
+        send = _bind(handler, send)
+    return send
+
+
+def _bind(handler, send):
+    return lambda request: handler(request, send)
+
+
+class Transport:
+    """
+    Базовый класс синхронного транспорта
+
+    Наследники реализуют ``_send(request)``, выполняющий запрос по сети.
+    Каждый запрос проходит через middleware в порядке добавления:
+    middleware - это вызываемый объект ``middleware(request, send)``, который
+    может изменить :class:`Request <pyqiwi.transport.Request>`, вызвать ``send(request)``
+    для передачи запроса дальше по цепочке или вернуть ответ сам, например из кэша.
+
+    Parameters
+    ----------
+    middleware : Optional[list]
+        Middleware для всех запросов транспорта.
+
+    Attributes
+    ----------
+    settings : Optional[:class:`Settings <pyqiwi.apihelper.Settings>`]
+        Параметры запросов вместо глобальных переменных :mod:`apihelper <pyqiwi.apihelper>`.
+        По умолчанию - ``None``, используются глобальные.
+    """
+
+    is_async = False
+    settings = None
+
+    def __init__(self, middleware=None):
+        self.middleware = []
+        self._send_chain = self._send
+        for handler in middleware or []:
+            self.add_middleware(handler)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_middleware(self, middleware):
+        """
+        Добавление middleware в конец цепочки, ближе всего к сети
+        """
+        self.middleware.append(middleware)
+        self._send_chain = _chain(self._send, self.middleware)
+
+    def remove_middleware(self, middleware):
+        self.middleware.remove(middleware)
+        self._send_chain = _chain(self._send, self.middleware)
+
+    def send(self, request):
+        """
+        Выполнение запроса через цепочку middleware
+
+        Parameters
+        ----------
+        request : :class:`Request <pyqiwi.transport.Request>`
+            Запрос
+
+        Returns
+        -------
+        :class:`Response <pyqiwi.transport.Response>`
+            Ответ сервера или любой объект с интерфейсом ``requests.Response``
+        """
+        return self._send_chain(request)
+
+    def request(self, method, url, params=None, json=None, headers=None, timeout=None, proxies=None, **kwargs):
+        """
+        Выполнение запроса с сигнатурой ``requests.Session.request``
+        """
+        return self.send(Request(method, url, params, json, headers, timeout, proxies))
+
+    def prewarm(self, connections=4, dns_cache=None, base_url=None):
+        """
+        Прогрев пула соединений к Qiwi API
+
+        Параллельно открывает ``connections`` keep-alive соединений (DNS, TCP и TLS),
+        которые остаются в пуле транспорта для последующих запросов.
+        Полезно вызывать при старте воркера, до создания :class:`Wallet <pyqiwi.Wallet>`.
+
+        Parameters
+        ----------
+        connections : Optional[int]
+            Число открываемых соединений. Пул транспорта должен вмещать столько соединений.
+        dns_cache : Optional[:class:`DNSCache <pyqiwi.transport.DNSCache>`]
+            Кэш DNS, который будет установлен (см. :meth:`DNSCache.install <pyqiwi.transport.DNSCache.install>`)
+            и заполнен до открытия соединений.
+        base_url : Optional[str]
+            Шаблон адреса API. По умолчанию - из ``settings`` транспорта
+            или :data:`apihelper.API_URL <pyqiwi.apihelper.API_URL>`.
+
+        Returns
+        -------
+        :class:`PrewarmReport <pyqiwi.transport.PrewarmReport>`
+            Время до готовности и число открытых соединений
+        """
+        return _prewarm(self, connections, dns_cache, base_url)
+
+    def _send(self, request):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class AsyncTransport(Transport):
+    """
+    Базовый класс асинхронного транспорта
+
+    То же, что :class:`Transport <pyqiwi.transport.Transport>`, но ``_send``, ``send``, ``request``
+    и middleware являются корутинами: ``async def middleware(request, send)``,
+    внутри которой вызывается ``await send(request)``.
+    """
+
+    is_async = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def send(self, request):
+        return await self._send_chain(request)
+
+    async def request(self, method, url, params=None, json=None, headers=None, timeout=None, proxies=None,
+                      **kwargs):
+        return await self.send(Request(method, url, params, json, headers, timeout, proxies))
+
+    async def prewarm(self, connections=4, dns_cache=None, base_url=None):
+        """
+        Прогрев пула соединений, см. :meth:`Transport.prewarm <pyqiwi.transport.Transport.prewarm>`
+
+        Соединения открываются конкурентно в текущем цикле событий, DNS разрешается в потоке.
+        """
+        import asyncio
+
+        settings, url = _prewarm_target(self, base_url)
+        started = time.perf_counter()
+        if dns_cache is not None:
+            await asyncio.get_running_loop().run_in_executor(None, _prewarm_dns, dns_cache, url)
+        dns_time = time.perf_counter() - started
+
+        async def connect():
+            try:
+                await self.request('head', url, timeout=(settings.connect_timeout, settings.connect_timeout),
+                                   proxies=settings.proxy)
+            except Exception as e:
+                return e
+            return None
+
+        errors = [e for e in await asyncio.gather(*[connect() for _ in range(connections)]) if e is not None]
+        return PrewarmReport(time.perf_counter() - started, dns_time, connections - len(errors), errors)
+
+    async def _send(self, request):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    Транспорт на основе ``requests.Session``
+
+    Parameters
+    ----------
+    session : Optional[requests.Session]
+        Сессия для запросов.
+        По умолчанию - новая ``requests.Session``.
+    middleware : Optional[list]
+        Middleware для всех запросов транспорта.
+    """
+
+    def __init__(self, session=None, middleware=None):
+        if session is None:
+            import requests
+
+            session = requests.session()
+        self.session = session
+        super().__init__(middleware)
+
+    def _send(self, request):
+        return self.session.request(request.method, request.url, params=request.params, json=request.json,
+                                    headers=request.headers, timeout=request.timeout, proxies=request.proxies)
+
+    def close(self):
+        self.session.close()
+
+
+class _ThreadSession:
+    # Ссылка на сессию только из threading.local: finalize срабатывает, когда поток завершается
+    __slots__ = ('session', '__weakref__')
+
+    def __init__(self, session):
+        self.session = session
+
+
+class SessionPool(Transport):
+    """
+    Потокобезопасный транспорт на основе ``requests.Session``
+
+    requests не гарантирует потокобезопасность ``requests.Session``, поэтому сессия
+    никогда не используется двумя потоками одновременно. Без ``size`` у каждого потока своя сессия,
+    созданная при его первом запросе и закрываемая при завершении потока. С ``size`` потоки берут
+    сессию из пула на время запроса и ждут, если все ``size`` сессий заняты:
+    так число соединений не растет с числом потоков.
+
+    Вместе с ``settings`` запросы не читают изменяемых глобальных переменных модуля.
+
+    Parameters
+    ----------
+    size : Optional[int]
+        Число сессий в пуле.
+        По умолчанию - ``None``, по сессии на поток.
+    settings : Optional[:class:`Settings <pyqiwi.apihelper.Settings>`]
+        Параметры запросов.
+        По умолчанию - :class:`Settings <pyqiwi.apihelper.Settings>` с текущими значениями глобальных переменных.
+    factory : Optional[callable]
+        Функция без аргументов, создающая сессию.
+        По умолчанию - ``requests.Session``.
+    middleware : Optional[list]
+        Middleware для всех запросов транспорта.
+
+    Examples
+    --------
+    >>> transport = SessionPool(size=16)
+    >>> with ThreadPoolExecutor(max_workers=64) as executor:
+    ...     balances = list(executor.map(lambda token: Wallet(token, transport=transport).balance(), tokens))
+    """
+
+    def __init__(self, size=None, settings=None, factory=None, middleware=None):
+        if factory is None:
+            import requests
+
+            factory = requests.Session
+        self.size = size
+        self.settings = settings if settings is not None else apihelper.Settings()
+        self.factory = factory
+        # Открытые сессии для close(): сессия завершившегося потока закрывается и удаляется отсюда
+        self._sessions = set()
+        self._created = 0
+        self._local = threading.local()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        super().__init__(middleware)
+
+    def _acquire(self):
+        if self.size is None:
+            holder = getattr(self._local, 'holder', None)
+            if holder is None:
+                session = self._create()
+                holder = self._local.holder = _ThreadSession(session)
+                # Данные threading.local удаляются при завершении потока, вместе с ними закрывается сессия
+                weakref.finalize(holder, self._discard, session)
+            return holder.session
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        try:
+            return self._create()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _create(self):
+        session = self.factory()
+        with self._lock:
+            self._sessions.add(session)
+        return session
+
+    def _discard(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+        session.close()
+
+    def _send(self, request):
+        session = self._acquire()
+        try:
+            return session.request(request.method, request.url, params=request.params, json=request.json,
+                                   headers=request.headers, timeout=request.timeout, proxies=request.proxies)
+        finally:
+            if self.size is not None:
+                self._idle.put(session)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, set()
+            self._created = 0
+            # Старые данные потоков удаляются после снятия блокировки: finalize вызывает _discard
+            local, self._local = self._local, threading.local()
+            self._idle = queue.LifoQueue()
+        del local
+        for session in sessions:
+            session.close()
+
+
+def _transport_error(urllib3, e):
+    # Ошибки приводятся к исключениям requests, как у requests.Session
+    import requests
+
+    if isinstance(e, urllib3.exceptions.NewConnectionError):
+        return requests.exceptions.ConnectionError(e)
+    if isinstance(e, urllib3.exceptions.ConnectTimeoutError):
+        return requests.exceptions.ConnectTimeout(e)
+    if isinstance(e, urllib3.exceptions.TimeoutError):
+        return requests.exceptions.ReadTimeout(e)
+    return requests.exceptions.ConnectionError(e)
+
+
+class Urllib3Transport(Transport):
+    """
+    Транспорт на основе urllib3 без накладных расходов requests
+
+    Редиректы не выполняются, повторных попыток нет.
+
+    Parameters
+    ----------
+    maxsize : Optional[int]
+        Максимальное число соединений к одному хосту.
+        По умолчанию - 10.
+    middleware : Optional[list]
+        Middleware для всех запросов транспорта.
+    pool_kwargs
+        Прочие параметры ``urllib3.PoolManager``.
+    """
+
+    def __init__(self, maxsize=10, middleware=None, **pool_kwargs):
+        import urllib3
+
+        self._urllib3 = urllib3
+        self._pool_kwargs = dict(pool_kwargs, maxsize=maxsize)
+        self.pool = urllib3.PoolManager(**self._pool_kwargs)
+        self._proxies = {}
+        self._lock = threading.Lock()
+        super().__init__(middleware)
+
+    def _manager(self, request):
+        proxy = (request.proxies or {}).get(urlsplit(request.url).scheme)
+        if not proxy:
+            return self.pool
+        with self._lock:
+            if proxy not in self._proxies:
+                self._proxies[proxy] = self._urllib3.ProxyManager(proxy, **self._pool_kwargs)
+            return self._proxies[proxy]
+
+    def _send(self, request):
+        urllib3 = self._urllib3
+        timeout = request.timeout
+        if isinstance(timeout, tuple):
+            timeout = urllib3.Timeout(connect=timeout[0], read=timeout[1])
+        try:
+            response = self._manager(request).request(request.method, request.full_url, body=request.body,
+                                                      headers=request.headers, timeout=timeout, retries=False)
+        except urllib3.exceptions.HTTPError as e:
+            raise _transport_error(urllib3, e)
+        return Response(response.status, response.data, response.headers, response.reason, request)
+
+    def close(self):
+        self.pool.clear()
+        for manager in self._proxies.values():
+            manager.clear()
+
+
+def _dumps(value):
+    return json.dumps(value)
+
+
+class _Routes:
+    def _init_routes(self, handler):
+        self.handler = handler
+        self.routes = {}
+        self.requests = deque(maxlen=1000)
+
+    def add(self, method, path, json=None, status=200, text=None, headers=None):
+        """
+        Ответ на запрос с указанным методом и путем
+
+        Parameters
+        ----------
+        method : str
+            HTTP-метод
+        path : str
+            Путь без ведущего ``/``, например ``funding-sources/v1/accounts/current``
+        json : Optional[dict]
+            Тело ответа, сериализуемое в JSON
+        status : Optional[int]
+            HTTP-код ответа.
+            По умолчанию - 200.
+        text : Optional[str]
+            Тело ответа в виде строки, если не задан ``json``
+        headers : Optional[dict]
+            Заголовки ответа
+        """
+        if json is not None:
+            text = _dumps(json)
+        self.routes[(method.upper(), path.strip('/'))] = (status, text or '', headers or {})
+
+    def _respond(self, request):
+        self.requests.append(request)
+        route = self.routes.get((request.method, urlsplit(request.url).path.strip('/')))
+        if route is None and self.handler is not None:
+            return self.handler(request)
+        status, text, headers = route or (404, '', {})
+        return Response(status, text.encode('utf-8'), dict(headers), request=request)
+
+
+class FakeTransport(_Routes, Transport):
+    """
+    Транспорт в памяти для тестов: отвечает заранее заданными ответами без сети
+
+    Запросы без заданного ответа передаются в ``handler``, а если его нет - получают 404.
+
+    Parameters
+    ----------
+    handler : Optional[callable]
+        Функция ``handler(request)``, возвращающая :class:`Response <pyqiwi.transport.Response>`,
+        например :meth:`Simulator.handle <pyqiwi.simulator.Simulator.handle>`.
+    middleware : Optional[list]
+        Middleware для всех запросов транспорта.
+
+    Attributes
+    ----------
+    requests : collections.deque of :class:`Request <pyqiwi.transport.Request>`
+        Последние 1000 выполненных запросов
+
+    Examples
+    --------
+    >>> transport = FakeTransport()
+    >>> transport.add('get', 'funding-sources/v1/accounts/current', json={'accounts': []})
+    >>> apihelper.funding_sources(token, transport=transport)
+    {'accounts': []}
+    """
+
+    def __init__(self, handler=None, middleware=None):
+        self._init_routes(handler)
+        super().__init__(middleware)
+
+    def _send(self, request):
+        return self._respond(request)
+
+
+class AsyncFakeTransport(_Routes, AsyncTransport):
+    """
+    Асинхронный вариант :class:`FakeTransport <pyqiwi.transport.FakeTransport>`
+    """
+
+    def __init__(self, handler=None, middleware=None):
+        self._init_routes(handler)
+        super().__init__(middleware)
+
+    async def _send(self, request):
+        return self._respond(request)
+
+
+class DNSCache:
+    """
+    Кэш DNS-запросов с временем жизни записей
+
+    После :meth:`install` все вызовы ``socket.getaddrinfo`` в процессе проходят через кэш,
+    поэтому повторные соединения к edge.qiwi.com не ждут DNS.
+    Неудачные запросы не кэшируются.
+
+    Parameters
+    ----------
+    ttl : Optional[float]
+        Время жизни записи в секундах.
+        По умолчанию - 300.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._getaddrinfo = socket.getaddrinfo
+        self._installed = False
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+        result = self._getaddrinfo(host, port, family, type, proto, flags)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+        return list(result)
+
+    def resolve(self, host, port=443):
+        """
+        Заполнение кэша для хоста заранее
+
+        Returns
+        -------
+        list
+            Результат ``socket.getaddrinfo`` для TCP-соединений
+        """
+        return self.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def install(self):
+        """
+        Подмена ``socket.getaddrinfo`` кэширующей версией
+        """
+        if not self._installed:
+            self._getaddrinfo = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+            self._installed = True
+        return self
+
+    def uninstall(self):
+        if self._installed:
+            socket.getaddrinfo = self._getaddrinfo
+            self._installed = False
+
+
+class PrewarmReport:
+    """
+    Результат :meth:`Transport.prewarm <pyqiwi.transport.Transport.prewarm>`
+
+    Attributes
+    ----------
+    time_to_ready : float
+        Время от начала прогрева до готовности всех соединений, в секундах
+    dns_time : float
+        Время разрешения имени хоста, в секундах
+    connections : int
+        Число успешно открытых соединений
+    errors : list[Exception]
+        Ошибки при открытии соединений
+    """
+
+    def __init__(self, time_to_ready, dns_time, connections, errors):
+        self.time_to_ready = time_to_ready
+        self.dns_time = dns_time
+        self.connections = connections
+        self.errors = errors
+
+    def __repr__(self):
+        return '<PrewarmReport(time_to_ready={0:.3f}, connections={1}, errors={2})>'.format(
+            self.time_to_ready, self.connections, len(self.errors))
+
+
+def prewarm(transport=None, connections=4, dns_cache=None, base_url=None):
+    """
+    Прогрев пула соединений к Qiwi API, см. :meth:`Transport.prewarm <pyqiwi.transport.Transport.prewarm>`
+
+    Подходит и для транспортов, которые не наследуют :class:`Transport <pyqiwi.transport.Transport>`,
+    например ``requests.Session``.
+
+    Parameters
+    ----------
+    transport : Optional[:class:`Transport <pyqiwi.transport.Transport>`]
+        Транспорт для прогрева.
+        По умолчанию - :data:`apihelper.session <pyqiwi.apihelper.session>`.
+        Для :class:`AsyncTransport <pyqiwi.transport.AsyncTransport>` возвращается корутина.
+
+    Returns
+    -------
+    :class:`PrewarmReport <pyqiwi.transport.PrewarmReport>`
+    """
+    if transport is None:
+        transport = apihelper._default_session()
+    if isinstance(transport, Transport):
+        return transport.prewarm(connections, dns_cache, base_url)
+    return _prewarm(transport, connections, dns_cache, base_url)
+
+
+def _prewarm_target(transport, base_url):
+    settings = getattr(transport, 'settings', None)
+    if settings is None:
+        settings = apihelper.Settings()
+    return settings, (base_url or settings.api_url).format('')
+
+
+def _prewarm_dns(dns_cache, url):
+    # Кэш, заполненный без установки, не использовался бы соединениями
+    dns_cache.install()
+    parts = urlsplit(url)
+    dns_cache.resolve(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+
+
+def _prewarm(transport, connections, dns_cache, base_url):
+    settings, url = _prewarm_target(transport, base_url)
+    started = time.perf_counter()
+    if dns_cache is not None:
+        _prewarm_dns(dns_cache, url)
+    dns_time = time.perf_counter() - started
+    barrier = threading.Barrier(connections)
+
+    def connect(_):
+        try:
+            barrier.wait(settings.connect_timeout)
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            transport.request('head', url, timeout=(settings.connect_timeout, settings.connect_timeout),
+                              proxies=settings.proxy)
+        except Exception as e:
+            return e
+        return None
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        errors = [e for e in executor.map(connect, range(connections)) if e is not None]
+    return PrewarmReport(time.perf_counter() - started, dns_time, connections - len(errors), errors)
@@ -1,29 +1,198 @@
 # -*- coding: utf-8 -*-
+import contextvars
 import datetime
 import json
+import sys
+from contextlib import ExitStack
+from functools import wraps
+
+# Наблюдатели сборки объектов из ответов Qiwi API: контекстные менеджеры building(cls) и parsing_date(),
+# см. pyqiwi.tracing.Tracing и pyqiwi.profiling.Profiler
+observers = []
+_building = contextvars.ContextVar('pyqiwi_building', default=False)
+
+
+def _observed(de_json):
+    # Наблюдатели видят только внешний вызов de_json, вложенные объекты собираются внутри него
+    @wraps(de_json)
+    def wrapper(cls, json_type):
+        if not observers or _building.get():
+            return de_json(cls, json_type)
+        token = _building.set(True)
+        try:
+            with ExitStack() as stack:
+                for observer in observers:
+                    stack.enter_context(observer.building(cls))
+                return de_json(cls, json_type)
+        finally:
+            _building.reset(token)
+    return wrapper
+
+
+class Field:
+    """
+    Поле модели в :attr:`JsonDeserializable.schema`
+
+    Parameters
+    ----------
+    name : str
+        Имя атрибута.
+    key : str or tuple
+        Ключ в ответе Qiwi API или путь из нескольких ключей.
+    model : Optional[str or type]
+        Вложенная модель или ее имя в этом модуле, например ``'Payment.Transaction'``.
+    many : Optional[bool]
+        Значение - список вложенных моделей.
+    date : Optional[bool]
+        Значение - дата, см. :meth:`JsonDeserializable.decode_date`. Пустое значение дает ``None``.
+    optional : Optional[bool]
+        Ключ может отсутствовать, тогда значение - ``None``.
+    convert : Optional[callable]
+        Преобразование значения, например ``int``.
+    when : Optional[str]
+        Имя поля, объявленного раньше: значение заполняется, только если оно истинно.
+    """
+
+    def __init__(self, name, key, model=None, many=False, date=False, optional=False, convert=None, when=None):
+        self.name = name
+        self.key = key if isinstance(key, tuple) else (key,)
+        self.model = model
+        self.many = many
+        self.date = date
+        self.optional = optional
+        self.convert = convert
+        self.when = when
+
+    def __repr__(self):
+        return 'Field({0!r}, {1!r})'.format(self.name, self.key)
+
+
+def _resolve(model):
+    if isinstance(model, str):
+        value = sys.modules[__name__]
+        for part in model.split('.'):
+            value = getattr(value, part)
+        return value
+    return model
+
+
+def _generate(cls):
+    """
+    Генерация функции разбора для модели по ее схеме
+
+    Вложенные модели разбираются их функциями напрямую, без de_json и check_json.
+    """
+    namespace = {'_new': object.__new__, '_cls': cls, '_decode_date': JsonDeserializable.decode_date,
+                 '_check': JsonDeserializable.check_json}
+    lines = ['def _parse(obj):', '    self = _new(_cls)', '    self.raw = obj']
+    for index, field in enumerate(cls.schema):
+        indent = '    '
+        if field.when is not None:
+            lines.append('    if self.{0}:'.format(field.when))
+            indent = '        '
+        if field.optional:
+            lines.append('{0}v = obj.get({1!r})'.format(indent, field.key[0]))
+            for key in field.key[1:]:
+                lines.append('{0}v = v.get({1!r}) if v is not None else None'.format(indent, key))
+        else:
+            lines.append('{0}v = obj{1}'.format(indent, ''.join('[{0!r}]'.format(key) for key in field.key)))
+        if field.convert is not None:
+            namespace['_c{0}'.format(index)] = field.convert
+            guard = ' if v is not None else None' if field.optional else ''
+            lines.append('{0}v = _c{1}(v){2}'.format(indent, index, guard))
+        if field.date:
+            lines.append('{0}self.{1} = _decode_date(v) if v else None'.format(indent, field.name))
+        elif field.model is not None:
+            namespace['_p{0}'.format(index)] = _parser(_resolve(field.model))
+            # Как de_json: необязательный вложенный объект может быть пустым, обязательный - только dict
+            if field.many and field.optional:
+                lines.append('{0}self.{1} = [_p{2}(item) for item in v] if v else []'.format(indent, field.name, index))
+            elif field.many:
+                lines.append('{0}self.{1} = [_p{2}(item if type(item) is dict else _check(item)) for item in v]'
+                             .format(indent, field.name, index))
+            elif field.optional:
+                lines.append('{0}self.{1} = _p{2}(v) if v else None'.format(indent, field.name, index))
+            else:
+                lines.append('{0}self.{1} = _p{2}(v if type(v) is dict else _check(v))'
+                             .format(indent, field.name, index))
+        else:
+            lines.append('{0}self.{1} = v'.format(indent, field.name))
+        if field.when is not None:
+            lines.append('    else:')
+            lines.append('        self.{0} = None'.format(field.name))
+    lines.append('    return self')
+    exec(compile('\n'.join(lines), '<pyqiwi.types.{0}>'.format(cls.__qualname__), 'exec'), namespace)
+    cls._parse = staticmethod(namespace['_parse'])
+    return namespace['_parse']
+
+
+def _parser(model):
+    if 'schema' not in model.__dict__:
+        return model.de_json
+    parse = model._parse
+    if parse.__name__ == '_lazy':
+        parse = _generate(model)
+    return parse
 
-import dateutil.parser
-import six
+
+def _lazy_parser(cls):
+    # Функция разбора генерируется при первом использовании модели, чтобы не замедлять import pyqiwi
+    def _lazy(obj):
+        return _generate(cls)(obj)
+    return staticmethod(_lazy)
+
+
+def _de_json(cls, json_type):
+    if type(json_type) is not dict:
+        json_type = cls.check_json(json_type)
+    return cls._parse(json_type)
+
+
+def _plain(value):
+    if isinstance(value, JsonDeserializable):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError('Object of type {0} is not JSON serializable'.format(type(value).__name__))
 
 
 class JsonDeserializable:
     """
     Субклассы этого класса гарантированно могут быть созданы из json-подобного dict'а или форматированной json строки
-    Все субклассы этого класса должны перезаписывать de_json
+
+    Субкласс объявляет поля в :attr:`schema`, и de_json для него генерируется по этой схеме.
+    Субклассы с произвольным набором полей перезаписывают de_json.
 
     Attributes
     ----------
     raw : ???
         Содержит в себе исходные данные от Qiwi API
+    schema : tuple of :class:`Field <pyqiwi.types.Field>`
+        Поля модели
     """
 
     raw = None
+    schema = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'schema' in cls.__dict__:
+            cls._parse = _lazy_parser(cls)
+            cls.de_json = classmethod(_observed(_de_json))
+        elif 'de_json' in cls.__dict__:
+            cls.de_json = classmethod(_observed(cls.__dict__['de_json'].__func__))
 
     @classmethod
     def de_json(cls, json_type):
         """
         Возвращает инстанс этого класса из созданного json dict'а или строки
-        Эта функция должна быть перезаписана для каждого субкласса
+        Эта функция генерируется по схеме или перезаписывается в субклассе
 
         Returns
         -------
@@ -56,19 +225,62 @@ class JsonDeserializable:
         datetime.datetime данной строки
         """
         if isinstance(date_string, str):
-            return dateutil.parser.parse(date_string)
+            if observers:
+                with ExitStack() as stack:
+                    for observer in observers:
+                        stack.enter_context(observer.parsing_date())
+                    return _parse_date(date_string)
+            return _parse_date(date_string)
         else:
             raise TypeError('types.JsonDeserializable.decode_date only accepts date_string as str type')
 
+    def to_dict(self):
+        """
+        Атрибуты объекта в виде словаря, вложенные объекты тоже преобразуются в словари
+
+        Returns
+        -------
+        dict
+        """
+        if self.schema is not None:
+            return {field.name: _plain(getattr(self, field.name)) for field in self.schema}
+        return {name: _plain(value) for name, value in self.__dict__.items() if name != 'raw'}
+
+    def to_json(self, **kwargs):
+        """
+        :meth:`to_dict` в виде JSON-строки, даты записываются в ISO-8601
+
+        Parameters
+        ----------
+        kwargs
+            Параметры ``json.dumps``.
+
+        Returns
+        -------
+        str
+        """
+        kwargs.setdefault('ensure_ascii', False)
+        return json.dumps(self.to_dict(), default=_json_default, **kwargs)
+
     def __str__(self):
         d = {}
-        for x, y in six.iteritems(self.__dict__):
+        for x, y in self.__dict__.items():
             if hasattr(y, '__dict__'):
                 d[x] = y.__dict__
             else:
                 d[x] = y
 
-        return six.text_type(d)
+        return str(d)
+
+
+def _parse_date(date_string):
+    # Даты Qiwi API в формате datetime.isoformat разбираются без dateutil
+    try:
+        return datetime.datetime.fromisoformat(date_string)
+    except ValueError:
+        import dateutil.parser
+
+        return dateutil.parser.parse(date_string)
 
 
 class Account(JsonDeserializable):
@@ -94,31 +306,15 @@ class Account(JsonDeserializable):
         Псевдоним пользовательского баланса
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        balance = None
-        _type = None
-        alias = obj['alias']
-        fs_alias = obj.get('fsAlias')
-        title = obj.get('title')
-        has_balance = obj.get('hasBalance')
-        if has_balance:
-            balance = obj.get('balance')
-        currency = obj['currency']
-        if obj.get('type'):
-            _type = AccountType.de_json(obj['type'])
-        return cls(alias, fs_alias, title, has_balance, currency, _type, balance, obj)
-
-    def __init__(self, alias, fs_alias, title, has_balance, currency, _type, balance, obj):
-        self.raw = obj
-        self.alias = alias
-        self.fs_alias = fs_alias
-        self.title = title
-        self.has_balance = has_balance
-        self.currency = currency
-        self.type = _type
-        self.balance = balance
+    schema = (
+        Field('alias', 'alias'),
+        Field('fs_alias', 'fsAlias', optional=True),
+        Field('title', 'title', optional=True),
+        Field('has_balance', 'hasBalance', optional=True),
+        Field('currency', 'currency'),
+        Field('type', 'type', model='AccountType', optional=True),
+        Field('balance', 'balance', optional=True, when='has_balance'),
+    )
 
 
 class AccountType(JsonDeserializable):
@@ -133,15 +329,10 @@ class AccountType(JsonDeserializable):
         Название счета
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        return cls(obj['id'], obj['title'], obj)
-
-    def __init__(self, _id, title, obj):
-        self.raw = obj
-        self.id = _id
-        self.title = title
+    schema = (
+        Field('id', 'id'),
+        Field('title', 'title'),
+    )
 
 
 class Profile(JsonDeserializable):
@@ -158,19 +349,11 @@ class Profile(JsonDeserializable):
         Прочие пользовательские данные
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        auth_info = AuthInfo.de_json(obj['authInfo'])
-        contract_info = ContractInfo.de_json(obj['contractInfo'])
-        user_info = UserInfo.de_json(obj['userInfo'])
-        return cls(auth_info, contract_info, user_info, obj)
-
-    def __init__(self, auth_info, contract_info, user_info, obj):
-        self.raw = obj
-        self.auth_info = auth_info
-        self.contract_info = contract_info
-        self.user_info = user_info
+    schema = (
+        Field('auth_info', 'authInfo', model='AuthInfo'),
+        Field('contract_info', 'contractInfo', model='ContractInfo'),
+        Field('user_info', 'userInfo', model='UserInfo'),
+    )
 
 
 class AuthInfo(JsonDeserializable):
@@ -199,37 +382,16 @@ class AuthInfo(JsonDeserializable):
         (через сайт либо мобильное приложение, либо другим способом)
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        bound_email = obj['boundEmail']
-        ip = obj['ip']
-        if obj['lastLoginDate']:
-            last_login_date = cls.decode_date(obj['lastLoginDate'])
-        else:
-            last_login_date = None
-        mobile_pin_info = MobilePinInfo.de_json(obj['mobilePinInfo'])
-        pass_info = PassInfo.de_json(obj['passInfo'])
-        person_id = obj['personId']
-        pin_info = PinInfo.de_json(obj['pinInfo'])
-        if obj['registrationDate']:
-            registration_date = cls.decode_date(obj['registrationDate'])
-        else:
-            registration_date = None
-        return cls(bound_email, ip, last_login_date, mobile_pin_info,
-                   pass_info, person_id, pin_info, registration_date, obj)
-
-    def __init__(self, bound_email, ip, last_login_date, mobile_pin_info,
-                 pass_info, person_id, pin_info, registration_date, obj):
-        self.raw = obj
-        self.bound_email = bound_email
-        self.ip = ip
-        self.last_login_date = last_login_date
-        self.mobile_pin_info = mobile_pin_info
-        self.pass_info = pass_info
-        self.person_id = person_id
-        self.pin_info = pin_info
-        self.registration_date = registration_date
+    schema = (
+        Field('bound_email', 'boundEmail'),
+        Field('ip', 'ip'),
+        Field('last_login_date', 'lastLoginDate', date=True),
+        Field('mobile_pin_info', 'mobilePinInfo', model='MobilePinInfo'),
+        Field('pass_info', 'passInfo', model='PassInfo'),
+        Field('person_id', 'personId'),
+        Field('pin_info', 'pinInfo', model='PinInfo'),
+        Field('registration_date', 'registrationDate', date=True),
+    )
 
 
 class MobilePinInfo(JsonDeserializable):
@@ -247,26 +409,11 @@ class MobilePinInfo(JsonDeserializable):
         Дата/время следующего (планового) изменения PIN-кода мобильного приложения QIWI Кошелька
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        last_mobile_pin_change = None
-        next_mobile_pin_change = None
-        mobile_pin_used = obj['mobilePinUsed']
-        if mobile_pin_used:
-            last_mobile_pin_change = None
-            next_mobile_pin_change = None
-            if obj['lastMobilePinChange']:
-                last_mobile_pin_change = cls.decode_date(obj['lastMobilePinChange'])
-            if obj['nextMobilePinChange']:
-                next_mobile_pin_change = cls.decode_date(obj['nextMobilePinChange'])
-        return cls(mobile_pin_used, last_mobile_pin_change, next_mobile_pin_change, obj)
-
-    def __init__(self, mobile_pin_used, last_mobile_pin_change, next_mobile_pin_change, obj):
-        self.raw = obj
-        self.mobile_pin_used = mobile_pin_used
-        self.last_mobile_pin_change = last_mobile_pin_change
-        self.next_mobile_pin_change = next_mobile_pin_change
+    schema = (
+        Field('mobile_pin_used', 'mobilePinUsed'),
+        Field('last_mobile_pin_change', 'lastMobilePinChange', date=True, when='mobile_pin_used'),
+        Field('next_mobile_pin_change', 'nextMobilePinChange', date=True, when='mobile_pin_used'),
+    )
 
 
 class PassInfo(JsonDeserializable):
@@ -284,26 +431,11 @@ class PassInfo(JsonDeserializable):
         (фактически означает, что пользователь заходит на сайт)
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        last_pass_change = None
-        next_pass_change = None
-        password_used = obj['passwordUsed']
-        if password_used:
-            last_pass_change = None
-            next_pass_change = None
-            if obj['lastPassChange']:
-                last_pass_change = cls.decode_date(obj['lastPassChange'])
-            if obj['nextPassChange']:
-                next_pass_change = cls.decode_date(obj['nextPassChange'])
-        return cls(last_pass_change, next_pass_change, password_used, obj)
-
-    def __init__(self, last_pass_change, next_pass_change, password_used, obj):
-        self.raw = obj
-        self.last_pass_change = last_pass_change
-        self.next_pass_change = next_pass_change
-        self.password_used = password_used
+    schema = (
+        Field('password_used', 'passwordUsed'),
+        Field('last_pass_change', 'lastPassChange', date=True, when='password_used'),
+        Field('next_pass_change', 'nextPassChange', date=True, when='password_used'),
+    )
 
 
 class PinInfo(JsonDeserializable):
@@ -317,15 +449,9 @@ class PinInfo(JsonDeserializable):
         (фактически означает, что пользователь заходил в приложение)
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        pin_used = obj['pinUsed']
-        return cls(pin_used, obj)
-
-    def __init__(self, pin_used, obj):
-        self.raw = obj
-        self.pin_used = pin_used
+    schema = (
+        Field('pin_used', 'pinUsed'),
+    )
 
 
 class ContractInfo(JsonDeserializable):
@@ -347,28 +473,13 @@ class ContractInfo(JsonDeserializable):
         Данные об идентификации пользователя
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        blocked = obj['blocked']
-        contract_id = obj['contractId']
-        if obj['creationDate']:
-            creation_date = cls.decode_date(obj['creationDate'])
-        else:
-            creation_date = None
-        features = obj['features']
-        identification_info = []
-        for _id in obj['identificationInfo']:
-            identification_info.append(IdentificationInfo.de_json(_id))
-        return cls(blocked, contract_id, creation_date, features, identification_info, obj)
-
-    def __init__(self, blocked, contract_id, creation_date, features, identification_info, obj):
-        self.raw = obj
-        self.blocked = blocked
-        self.contract_id = contract_id
-        self.creation_date = creation_date
-        self.features = features
-        self.identification_info = identification_info
+    schema = (
+        Field('blocked', 'blocked'),
+        Field('contract_id', 'contractId'),
+        Field('creation_date', 'creationDate', date=True),
+        Field('features', 'features'),
+        Field('identification_info', 'identificationInfo', model='IdentificationInfo', many=True),
+    )
 
 
 class IdentificationInfo(JsonDeserializable):
@@ -388,17 +499,10 @@ class IdentificationInfo(JsonDeserializable):
         FULL - полная идентификация
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        bank_alias = obj['bankAlias']
-        identification_level = obj['identificationLevel']
-        return cls(bank_alias, identification_level, obj)
-
-    def __init__(self, bank_alias, identification_level, obj):
-        self.raw = obj
-        self.bank_alias = bank_alias
-        self.identification_level = identification_level
+    schema = (
+        Field('bank_alias', 'bankAlias'),
+        Field('identification_level', 'identificationLevel'),
+    )
 
 
 class UserInfo(JsonDeserializable):
@@ -425,31 +529,16 @@ class UserInfo(JsonDeserializable):
         Служебная информация
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        default_pay_currency = obj.get('defaultPayCurrency')
-        default_pay_source = obj.get('defaultPaySource')
-        email = obj.get('email')
-        first_txn_id = obj.get('firstTxnId')
-        language = obj.get('language')
-        operator = obj.get('operator')
-        phone_hash = obj.get('phoneHash')
-        promo_enabled = obj.get('promoEnabled')
-        return cls(default_pay_currency, default_pay_source, email, first_txn_id,
-                   language, operator, phone_hash, promo_enabled, obj)
-
-    def __init__(self, default_pay_currency, default_pay_source, email, first_txn_id,
-                 language, operator, phone_hash, promo_enabled, obj):
-        self.raw = obj
-        self.default_pay_currency = default_pay_currency
-        self.default_pay_source = default_pay_source
-        self.email = email
-        self.first_txn_id = first_txn_id
-        self.language = language
-        self.operator = operator
-        self.phone_hash = phone_hash
-        self.promo_enabled = promo_enabled
+    schema = (
+        Field('default_pay_currency', 'defaultPayCurrency', optional=True),
+        Field('default_pay_source', 'defaultPaySource', optional=True),
+        Field('email', 'email', optional=True),
+        Field('first_txn_id', 'firstTxnId', optional=True),
+        Field('language', 'language', optional=True),
+        Field('operator', 'operator', optional=True),
+        Field('phone_hash', 'phoneHash', optional=True),
+        Field('promo_enabled', 'promoEnabled', optional=True),
+    )
 
 
 class Transaction(JsonDeserializable):
@@ -504,58 +593,27 @@ class Transaction(JsonDeserializable):
         ???
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        txn_id = obj['txnId']
-        person_id = obj['personId']
-        if obj['date']:
-            date = cls.decode_date(obj['date'])
-        else:
-            date = None
-        error_code = obj['errorCode']
-        error = obj['error']
-        status = obj['status']
-        _type = obj['type']
-        status_text = obj['statusText']
-        trm_txn_id = obj['trmTxnId']
-        account = obj['account']
-        _sum = TransactionSum.de_json(obj['sum'])
-        commission = TransactionSum.de_json(obj['commission'])
-        total = TransactionSum.de_json(obj['total'])
-        provider = TransactionProvider.de_json(obj['provider'])
-        source = obj['source']
-        comment = obj['comment']
-        currency_rate = obj['currencyRate']
-        features = obj['features']
-        view = obj['view']
-        return cls(txn_id, person_id, date, error_code, error,
-                   status, _type, status_text, trm_txn_id, account, _sum, commission, total,
-                   provider, source, comment, currency_rate, features, view, obj)
-
-    def __init__(self, txn_id, person_id, date, error_code, error,
-                 status, _type, status_text, trm_txn_id, account, _sum, commission, total,
-                 provider, source, comment, currency_rate, features, view, obj):
-        self.raw = obj
-        self.txn_id = txn_id
-        self.person_id = person_id
-        self.date = date
-        self.error_code = error_code
-        self.error = error
-        self.status = status
-        self.type = _type
-        self.status_text = status_text
-        self.trm_txn_id = trm_txn_id
-        self.account = account
-        self.sum = _sum
-        self.commission = commission
-        self.total = total
-        self.provider = provider
-        self.source = source
-        self.comment = comment
-        self.currency_rate = currency_rate
-        self.features = features
-        self.view = view
+    schema = (
+        Field('txn_id', 'txnId'),
+        Field('person_id', 'personId'),
+        Field('date', 'date', date=True),
+        Field('error_code', 'errorCode'),
+        Field('error', 'error'),
+        Field('status', 'status'),
+        Field('type', 'type'),
+        Field('status_text', 'statusText'),
+        Field('trm_txn_id', 'trmTxnId'),
+        Field('account', 'account'),
+        Field('sum', 'sum', model='TransactionSum'),
+        Field('commission', 'commission', model='TransactionSum'),
+        Field('total', 'total', model='TransactionSum'),
+        Field('provider', 'provider', model='TransactionProvider'),
+        Field('source', 'source'),
+        Field('comment', 'comment'),
+        Field('currency_rate', 'currencyRate'),
+        Field('features', 'features'),
+        Field('view', 'view'),
+    )
 
 
 class TransactionSum(JsonDeserializable):
@@ -570,17 +628,10 @@ class TransactionSum(JsonDeserializable):
         Валюта
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        amount = obj['amount']
-        currency = obj['currency']
-        return cls(amount, currency, obj)
-
-    def __init__(self, amount, currency, obj):
-        self.raw = obj
-        self.amount = amount
-        self.currency = currency
+    schema = (
+        Field('amount', 'amount'),
+        Field('currency', 'currency'),
+    )
 
 
 class TransactionProvider(JsonDeserializable):
@@ -605,27 +656,15 @@ class TransactionProvider(JsonDeserializable):
         Сайт провайдера
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        _id = obj['id']
-        short_name = obj['shortName']
-        long_name = obj['longName']
-        logo_url = obj['logoUrl']
-        description = obj['description']
-        keys = obj['keys']
-        site_url = obj['siteUrl']
-        return cls(_id, short_name, long_name, logo_url, description, keys, site_url, obj)
-
-    def __init__(self, _id, short_name, long_name, logo_url, description, keys, site_url, obj):
-        self.raw = obj
-        self.id = _id
-        self.short_name = short_name
-        self.long_name = long_name
-        self.logo_url = logo_url
-        self.description = description
-        self.keys = keys
-        self.site_url = site_url
+    schema = (
+        Field('id', 'id'),
+        Field('short_name', 'shortName'),
+        Field('long_name', 'longName'),
+        Field('logo_url', 'logoUrl'),
+        Field('description', 'description'),
+        Field('keys', 'keys'),
+        Field('site_url', 'siteUrl'),
+    )
 
 
 class Statistics(JsonDeserializable):
@@ -640,21 +679,10 @@ class Statistics(JsonDeserializable):
         Данные об исходящих платежах, отдельно по каждой валюте
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        incoming_total = []
-        for currency in obj['incomingTotal']:
-            incoming_total.append(TransactionSum.de_json(currency))
-        outgoing_total = []
-        for currency in obj['outgoingTotal']:
-            outgoing_total.append(TransactionSum.de_json(currency))
-        return cls(incoming_total, outgoing_total, obj)
-
-    def __init__(self, incoming_total, outgoing_total, obj):
-        self.raw = obj
-        self.incoming_total = incoming_total
-        self.outgoing_total = outgoing_total
+    schema = (
+        Field('incoming_total', 'incomingTotal', model='TransactionSum', many=True),
+        Field('outgoing_total', 'outgoingTotal', model='TransactionSum', many=True),
+    )
 
 
 class Commission(JsonDeserializable):
@@ -667,17 +695,9 @@ class Commission(JsonDeserializable):
         Массив объектов с граничными условиями комиссий
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        ranges = []
-        for com_range in obj['content']['terms']['commission']['ranges']:
-            ranges.append(CommissionRange.de_json(com_range))
-        return cls(ranges, obj)
-
-    def __init__(self, ranges, obj):
-        self.raw = obj
-        self.ranges = ranges
+    schema = (
+        Field('ranges', ('content', 'terms', 'commission', 'ranges'), model='CommissionRange', many=True),
+    )
 
 
 class CommissionRange(JsonDeserializable):
@@ -698,23 +718,13 @@ class CommissionRange(JsonDeserializable):
         Фиксированная сумма комиссии
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        bound = obj.get('bound')
-        fixed = obj.get('fixed')
-        rate = obj.get('rate')
-        _min = obj.get('min')
-        _max = obj.get('max')
-        return cls(bound, fixed, rate, _min, _max, obj)
-
-    def __init__(self, bound, fixed, rate, _min, _max, obj):
-        self.raw = obj
-        self.bound = bound
-        self.fixed = fixed
-        self.rate = rate
-        self.min = _min
-        self.max = _max
+    schema = (
+        Field('bound', 'bound', optional=True),
+        Field('fixed', 'fixed', optional=True),
+        Field('rate', 'rate', optional=True),
+        Field('min', 'min', optional=True),
+        Field('max', 'max', optional=True),
+    )
 
 
 class OnlineCommission(JsonDeserializable):
@@ -737,27 +747,14 @@ class OnlineCommission(JsonDeserializable):
         ???
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        provider_id = obj['providerId']
-        withdraw_sum = TransactionSum.de_json(obj['withdrawSum'])
-        enrollment_sum = TransactionSum.de_json(obj['enrollmentSum'])
-        qw_commission = TransactionSum.de_json(obj['qwCommission'])
-        funding_source_commission = TransactionSum.de_json(obj['fundingSourceCommission'])
-        withdraw_to_enrollment_rate = obj['withdrawToEnrollmentRate']
-        return cls(provider_id, withdraw_sum, enrollment_sum,
-                   qw_commission, funding_source_commission, withdraw_to_enrollment_rate, obj)
-
-    def __init__(self, provider_id, withdraw_sum, enrollment_sum,
-                 qw_commission, funding_source_commission, withdraw_to_enrollment_rate, obj):
-        self.raw = obj
-        self.provider_id = provider_id
-        self.withdraw_sum = withdraw_sum
-        self.enrollment_sum = enrollment_sum
-        self.qw_commission = qw_commission
-        self.funding_source_commission = funding_source_commission
-        self.withdraw_to_enrollment_rate = withdraw_to_enrollment_rate
+    schema = (
+        Field('provider_id', 'providerId'),
+        Field('withdraw_sum', 'withdrawSum', model='TransactionSum'),
+        Field('enrollment_sum', 'enrollmentSum', model='TransactionSum'),
+        Field('qw_commission', 'qwCommission', model='TransactionSum'),
+        Field('funding_source_commission', 'fundingSourceCommission', model='TransactionSum'),
+        Field('withdraw_to_enrollment_rate', 'withdrawToEnrollmentRate'),
+    )
 
 
 class Payment(JsonDeserializable):
@@ -783,27 +780,15 @@ class Payment(JsonDeserializable):
         Данные о транзакции в процессинге
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        _id = obj['id']
-        terms = obj['terms']
-        fields = PaymentFields.de_json(obj['fields'])
-        _sum = TransactionSum.de_json(obj['sum'])
-        transaction = cls.Transaction.de_json(obj['transaction'])
-        source = obj['source']
-        comment = obj.get('comment')
-        return cls(_id, terms, fields, _sum, transaction, source, comment, obj)
-
-    def __init__(self, _id, terms, fields, _sum, transaction, source, comment, obj):
-        self.raw = obj
-        self.id = _id
-        self.terms = terms
-        self.fields = fields
-        self.sum = _sum
-        self.transaction = transaction
-        self.source = source
-        self.comment = comment
+    schema = (
+        Field('id', 'id'),
+        Field('terms', 'terms'),
+        Field('fields', 'fields', model='PaymentFields'),
+        Field('sum', 'sum', model='TransactionSum'),
+        Field('transaction', 'transaction', model='Payment.Transaction'),
+        Field('source', 'source'),
+        Field('comment', 'comment', optional=True),
+    )
 
     class Transaction(JsonDeserializable):
         """
@@ -817,17 +802,10 @@ class Payment(JsonDeserializable):
             Статус транзакции(в момент написания, только Accepted)
         """
 
-        @classmethod
-        def de_json(cls, json_type):
-            obj = cls.check_json(json_type)
-            _id = obj.get('id')
-            state = obj.get('state').get('code')
-            return cls(_id, state, obj)
-
-        def __init__(self, _id, state, obj):
-            self.raw = obj
-            self.id = _id
-            self.state = state
+        schema = (
+            Field('id', 'id', optional=True),
+            Field('state', ('state', 'code'), optional=True),
+        )
 
 
 class PaymentFields(JsonDeserializable):
@@ -894,36 +872,19 @@ class Identity(JsonDeserializable):
         (Используются варианты предлагаемые документацией Qiwi API)
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        _id = obj.get('id')
-        _type = obj.get('type')
-        birth_date = obj.get('birthDate')
-        first_name = obj.get('firstName')
-        middle_name = obj.get('middleName')
-        last_name = obj.get('lastName')
-        passport = obj.get('passport')
-        inn = obj.get('inn')
-        snils = obj.get('snils')
-        oms = obj.get('oms')
-        return cls(_id, _type, birth_date, first_name, middle_name, last_name, passport, inn, snils, oms,
-                   obj.get('base_inn'), obj)
-
-    def __init__(self, _id, _type, birth_date, first_name, middle_name, last_name, passport, inn, snils, oms, base_inn,
-                 obj):
-        self.raw = obj
-        self.id = _id
-        self.type = _type
-        self.birth_date = birth_date
-        self.first_name = first_name
-        self.middle_name = middle_name
-        self.last_name = last_name
-        self.passport = passport
-        self.inn = inn
-        self.snils = snils
-        self.oms = oms
-        self.base_inn = base_inn
+    schema = (
+        Field('id', 'id', optional=True),
+        Field('type', 'type', optional=True),
+        Field('birth_date', 'birthDate', optional=True),
+        Field('first_name', 'firstName', optional=True),
+        Field('middle_name', 'middleName', optional=True),
+        Field('last_name', 'lastName', optional=True),
+        Field('passport', 'passport', optional=True),
+        Field('inn', 'inn', optional=True),
+        Field('snils', 'snils', optional=True),
+        Field('oms', 'oms', optional=True),
+        Field('base_inn', 'base_inn', optional=True),
+    )
 
     @property
     def check(self):
@@ -944,15 +905,8 @@ class Rate(JsonDeserializable):
         Значение
     """
 
-    @classmethod
-    def de_json(cls, json_type):
-        obj = cls.check_json(json_type)
-        _from = int(obj['from'])
-        to = int(obj['to'])
-        rate = obj['rate']
-        return cls(_from, to, rate, obj)
-
-    def __init__(self, _from, to, rate, obj):
-        self._from = _from
-        self.to = to
-        self.rate = rate
+    schema = (
+        Field('_from', 'from', convert=int),
+        Field('to', 'to', convert=int),
+        Field('rate', 'rate'),
+    )
@@ -29,6 +29,9 @@ def sources_list(sources, params, name='sources'):
     return params
 
 
+MSK = datetime.timezone(datetime.timedelta(hours=3))
+
+
 def qiwi_date(date: datetime.datetime):
     return date.strftime("%Y-%m-%dT%H:%M:%S+03:00")
 
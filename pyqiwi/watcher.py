@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import threading
+from collections import OrderedDict
+
+from . import apihelper, types, util
+
+
+class SeenSet:
+    """
+    Множество с ограниченным размером, вытесняющее самые старые элементы
+
+    Parameters
+    ----------
+    maxsize : int
+        Максимальное число хранимых элементов.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        """
+        Добавление элемента
+
+        Returns
+        -------
+        bool
+            ``True``, если элемента еще не было во множестве.
+        """
+        with self._lock:
+            if item in self._items:
+                self._items.move_to_end(item)
+                return False
+            self._items[item] = None
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return True
+
+    def discard(self, item):
+        """
+        Удаление элемента, если он есть
+        """
+        with self._lock:
+            self._items.pop(item, None)
+
+
+class PaymentWatcher:
+    """
+    Отслеживание новых платежей с адаптивным интервалом опроса
+
+    После найденных платежей история опрашивается раз в ``min_interval`` секунд,
+    при отсутствии новых платежей интервал увеличивается в ``backoff`` раз до ``max_interval``.
+    Запрашиваются только страницы до последней уже известной транзакции,
+    в :class:`Transaction <pyqiwi.types.Transaction>` разбираются только новые строки.
+
+    Warning
+    -------
+    Максимальная интенсивность запросов истории платежей - не более 100 запросов в минуту
+     для одного и того же номера кошелька.
+
+    Parameters
+    ----------
+    wallet : :class:`Wallet <pyqiwi.Wallet>`
+        Кошелек с указанным номером.
+    operation : Optional[str]
+        Тип отслеживаемых операций.
+        По умолчанию - IN.
+    since : Optional[datetime.datetime or int]
+        Контрольная точка: дата/время или ID последней уже обработанной транзакции.
+        Если не указана, платежи, совершенные до первого опроса, не передаются обработчикам.
+    min_interval : Optional[float]
+        Минимальный интервал опроса в секундах.
+    max_interval : Optional[float]
+        Максимальный интервал опроса в секундах.
+    backoff : Optional[float]
+        Множитель интервала после опроса без новых платежей.
+    rows : Optional[int]
+        Число платежей в одной странице запроса.
+    seen_size : Optional[int]
+        Сколько ID транзакций хранить для удаления дубликатов.
+
+    Attributes
+    ----------
+    interval : float
+        Текущий интервал опроса
+    seen : :class:`SeenSet <pyqiwi.watcher.SeenSet>`
+        ID уже переданных транзакций
+    """
+
+    def __init__(self, wallet, operation='IN', since=None, min_interval=2, max_interval=60, backoff=2.0,
+                 rows=10, seen_size=10000):
+        self.wallet = wallet
+        self.operation = operation
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.rows = rows
+        self.interval = min_interval
+        self.seen = SeenSet(seen_size)
+        self._baseline = since is None
+        if isinstance(since, datetime.datetime) and since.tzinfo is None:
+            since = since.replace(tzinfo=util.MSK)
+        self._since = since
+        self._callbacks = []
+        self._queues = []
+        self._stop = threading.Event()
+        self._thread = None
+        # (цикл событий, asyncio.Event) работающего run_async, чтобы stop() прервал его ожидание
+        self._async_stop = None
+
+    def add_callback(self, callback):
+        """
+        Регистрация обработчика новых платежей
+
+        Parameters
+        ----------
+        callback : callable
+            Функция, принимающая :class:`Transaction <pyqiwi.types.Transaction>`.
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def add_queue(self, queue, loop=None):
+        """
+        Передача новых платежей в очередь asyncio
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Очередь для :class:`Transaction <pyqiwi.types.Transaction>`.
+        loop : Optional[asyncio.AbstractEventLoop]
+            Цикл событий очереди.
+            По умолчанию - текущий работающий цикл, если он есть.
+        """
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        self._queues.append((queue, loop))
+        return queue
+
+    def _is_old(self, row):
+        if row['txnId'] in self.seen:
+            return True
+        if isinstance(self._since, datetime.datetime):
+            return bool(row['date']) and types.JsonDeserializable.decode_date(row['date']) <= self._since
+        if self._since is not None:
+            return row['txnId'] <= self._since
+        return False
+
+    def _fetch(self):
+        rows = []
+        next_txn_date = None
+        next_txn_id = None
+        while True:
+            page = apihelper.payment_history(self.wallet.token, self.wallet.number, self.rows,
+                                             operation=self.operation, next_txn_date=next_txn_date,
+                                             next_txn_id=next_txn_id,
+                                             transport=getattr(self.wallet, 'transport', None))
+            for row in page['data']:
+                if self._is_old(row):
+                    return rows
+                rows.append(row)
+                if self._baseline:
+                    return rows
+            if not page.get('nextTxnDate') or not page.get('nextTxnId'):
+                return rows
+            next_txn_date = types.JsonDeserializable.decode_date(page['nextTxnDate'])
+            next_txn_id = page['nextTxnId']
+
+    def _dispatch(self, transaction):
+        for callback in list(self._callbacks):
+            callback(transaction)
+        for queue, loop in list(self._queues):
+            if loop is None:
+                queue.put_nowait(transaction)
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, transaction)
+
+    def poll(self):
+        """
+        Однократный опрос истории
+
+        Новые платежи передаются обработчикам от старых к новым, интервал опроса пересчитывается.
+        Платеж считается полученным только после того, как его приняли все обработчики:
+        если обработчик завершился исключением, этот платеж и более новые передаются
+        обработчикам снова при следующем опросе.
+
+        Returns
+        -------
+        list[:class:`Transaction <pyqiwi.types.Transaction>`]
+            Новые платежи
+        """
+        try:
+            rows = self._fetch()
+        except Exception:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+            raise
+        if self._baseline:
+            for row in rows:
+                self.seen.add(row['txnId'])
+            self._baseline = False
+            rows = []
+        transactions = []
+        for row in reversed(rows):
+            if row['txnId'] in self.seen:
+                continue
+            transaction = types.Transaction.de_json(row)
+            self._dispatch(transaction)
+            self.seen.add(transaction.txn_id)
+            transactions.append(transaction)
+        if transactions:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return transactions
+
+    def run(self):
+        """
+        Опрос истории до вызова :meth:`stop`
+
+        Ошибки Qiwi API логируются и увеличивают интервал опроса.
+        """
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                apihelper.logger.error('PaymentWatcher poll failed: {0}'.format(e))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """
+        Запуск :meth:`run` в отдельном потоке
+
+        Returns
+        -------
+        threading.Thread
+            Поток опроса
+        """
+        # Сброс здесь, а не в run(): stop(), вызванный сразу после start(), не теряется
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='PaymentWatcher', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """
+        Остановка опроса
+
+        Опрос снова запускается через :meth:`start` или :meth:`run_async`,
+        :meth:`run` после остановки сразу завершается.
+        """
+        self._stop.set()
+        if self._async_stop is not None:
+            loop, stopped = self._async_stop
+            try:
+                loop.call_soon_threadsafe(stopped.set)
+            except RuntimeError:
+                # Цикл событий уже закрыт
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+    async def run_async(self):
+        """
+        Опрос истории в цикле asyncio до вызова :meth:`stop`
+
+        Запросы выполняются в executor'е цикла событий и не блокируют его.
+        """
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        self._stop.clear()
+        self._async_stop = (loop, stopped)
+        try:
+            while not self._stop.is_set():
+                try:
+                    await loop.run_in_executor(None, self.poll)
+                except Exception as e:
+                    apihelper.logger.error('PaymentWatcher poll failed: {0}'.format(e))
+                try:
+                    await asyncio.wait_for(stopped.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._async_stop is not None and self._async_stop[1] is stopped:
+                self._async_stop = None
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import threading
+import uuid
+from decimal import Decimal
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from . import apihelper, exceptions, types, util
+from .watcher import SeenSet
+
+DEFAULT_SIGN_FIELDS = 'sum.currency,sum.amount,type,account,txnId'
+
+
+def _sign_value(payment, field):
+    value = payment
+    for key in field.split('.'):
+        value = value[key]
+    return str(value)
+
+
+def sign(payment, key):
+    """
+    Подпись уведомления о платеже
+
+    Parameters
+    ----------
+    payment : dict
+        Поле ``payment`` уведомления с перечнем подписываемых полей в ``signFields``.
+    key : str
+        Секретный ключ обработчика в base64 (см. :meth:`Wallet.webhook_key <pyqiwi.Wallet.webhook_key>`).
+
+    Returns
+    -------
+    str
+        HMAC-SHA256 подписываемых полей в hex.
+    """
+    fields = payment.get('signFields') or DEFAULT_SIGN_FIELDS
+    message = '|'.join(_sign_value(payment, field) for field in fields.split(','))
+    return hmac.new(base64.b64decode(key), message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def verify(notification, key):
+    """
+    Проверка подписи уведомления о платеже
+
+    Parameters
+    ----------
+    notification : dict
+        Уведомление целиком.
+    key : str
+        Секретный ключ обработчика в base64.
+
+    Raises
+    ------
+    :class:`SignatureError <pyqiwi.exceptions.SignatureError>`
+        Подпись отсутствует или не совпадает, либо в уведомлении нет подписываемого поля.
+    """
+    try:
+        expected = sign(notification['payment'], key)
+    except (KeyError, TypeError) as e:
+        raise exceptions.SignatureError('Webhook notification {0} has no signed field {1}'
+                                        .format(notification.get('messageId'), e))
+    if not hmac.compare_digest(expected, str(notification.get('hash', ''))):
+        raise exceptions.SignatureError('Webhook notification {0} has invalid signature'
+                                        .format(notification.get('messageId')))
+
+
+def _number(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _transaction_sum(value):
+    if not value:
+        return {'amount': None, 'currency': None}
+    return {'amount': _number(value.get('amount')), 'currency': value.get('currency')}
+
+
+def to_transaction(payment):
+    """
+    Преобразование поля ``payment`` уведомления в транзакцию
+
+    Уведомление содержит меньше данных, чем история платежей:
+    отсутствующие поля равны ``None``, у провайдера заполнен только ``id``.
+
+    Parameters
+    ----------
+    payment : dict
+        Поле ``payment`` уведомления.
+
+    Returns
+    -------
+    :class:`Transaction <pyqiwi.types.Transaction>`
+        Транзакция
+    """
+    provider = payment.get('provider')
+    if not isinstance(provider, dict):
+        provider = {'id': _int(provider), 'shortName': None, 'longName': None, 'logoUrl': None,
+                    'description': None, 'keys': None, 'siteUrl': None}
+    row = {'txnId': _int(payment.get('txnId')),
+           'personId': _int(payment.get('personId')),
+           'date': payment.get('date'),
+           'errorCode': _int(payment.get('errorCode')),
+           'error': payment.get('error'),
+           'status': payment.get('status'),
+           'type': payment.get('type'),
+           'statusText': payment.get('statusText'),
+           'trmTxnId': payment.get('trmTxnId'),
+           'account': payment.get('account'),
+           'sum': _transaction_sum(payment.get('sum')),
+           'commission': _transaction_sum(payment.get('commission')),
+           'total': _transaction_sum(payment.get('total')),
+           'provider': provider,
+           'source': payment.get('source'),
+           'comment': payment.get('comment'),
+           'currencyRate': _number(payment.get('currencyRate')),
+           'features': payment.get('features'),
+           'view': payment.get('view')}
+    return types.Transaction.de_json(row)
+
+
+class WebhookReceiver:
+    """
+    Приемник уведомлений Qiwi о платежах (webhook)
+
+    Приемник является WSGI-приложением, ASGI-приложение доступно в :meth:`asgi`,
+    а :meth:`serve` запускает его как отдельный HTTP-сервер.
+    Уведомления с неверной подписью отклоняются, повторные уведомления о той же транзакции
+    не передаются обработчикам повторно. Если обработчик завершился исключением, Qiwi получает
+    ответ 500, и повторное уведомление о транзакции снова передается всем обработчикам.
+
+    Parameters
+    ----------
+    key : str
+        Секретный ключ обработчика в base64 (см. :meth:`Wallet.webhook_key <pyqiwi.Wallet.webhook_key>`).
+    wallet : Optional[:class:`Wallet <pyqiwi.Wallet>`]
+        Кошелек для дозагрузки пропущенных платежей из истории.
+    since : Optional[datetime.datetime]
+        Дата последнего обработанного платежа до запуска приемника.
+        Если указана вместе с ``wallet``, при запуске платежи после нее загружаются из истории.
+    operation : Optional[str]
+        Тип операций для дозагрузки из истории.
+        По умолчанию - IN.
+    accept_test : Optional[bool]
+        Передавать ли обработчикам тестовые уведомления Qiwi.
+        По умолчанию - ``False``.
+    seen_size : Optional[int]
+        Сколько ID транзакций хранить для удаления дубликатов.
+
+    Attributes
+    ----------
+    last_date : Optional[datetime.datetime]
+        Дата последнего полученного платежа, для сохранения между запусками.
+    """
+
+    def __init__(self, key, wallet=None, since=None, operation='IN', accept_test=False, seen_size=10000):
+        self.key = key
+        self.wallet = wallet
+        self.operation = operation
+        self.accept_test = accept_test
+        self.seen = SeenSet(seen_size)
+        if isinstance(since, datetime.datetime) and since.tzinfo is None:
+            since = since.replace(tzinfo=util.MSK)
+        self.last_date = since
+        self._handlers = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def add_handler(self, handler):
+        """
+        Регистрация обработчика платежей
+
+        Parameters
+        ----------
+        handler : callable
+            Функция, принимающая :class:`Transaction <pyqiwi.types.Transaction>`.
+        """
+        self._handlers.append(handler)
+        return handler
+
+    def _dispatch(self, transaction):
+        if not self.seen.add(transaction.txn_id):
+            return False
+        try:
+            for handler in list(self._handlers):
+                handler(transaction)
+        except Exception:
+            # Транзакция не обработана: повторное уведомление или gap_fill передадут ее снова
+            self.seen.discard(transaction.txn_id)
+            raise
+        with self._lock:
+            if transaction.date is not None and (self.last_date is None or transaction.date > self.last_date):
+                self.last_date = transaction.date
+        return True
+
+    def handle(self, body):
+        """
+        Обработка тела уведомления
+
+        Parameters
+        ----------
+        body : bytes or str
+            Тело HTTP-запроса от Qiwi.
+
+        Returns
+        -------
+        Optional[:class:`Transaction <pyqiwi.types.Transaction>`]
+            Транзакция из уведомления,
+            ``None`` для тестовых уведомлений и уже полученных транзакций.
+
+        Raises
+        ------
+        :class:`SignatureError <pyqiwi.exceptions.SignatureError>`
+            Подпись уведомления не совпадает.
+        ValueError
+            Тело запроса не является уведомлением о платеже.
+        """
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        notification = json.loads(body, parse_float=Decimal)
+        if not isinstance(notification, dict) or not isinstance(notification.get('payment'), dict):
+            raise ValueError('Webhook notification has no payment')
+        verify(notification, self.key)
+        if notification.get('test') and not self.accept_test:
+            return None
+        transaction = to_transaction(notification['payment'])
+        if self._dispatch(transaction):
+            return transaction
+        return None
+
+    def gap_fill(self):
+        """
+        Дозагрузка платежей из истории, совершенных после :attr:`last_date`
+
+        Используется после простоя приемника, когда уведомления могли быть потеряны.
+
+        Returns
+        -------
+        list[:class:`Transaction <pyqiwi.types.Transaction>`]
+            Платежи, переданные обработчикам
+        """
+        if self.wallet is None or self.last_date is None:
+            return []
+        missed = self.wallet.history_since(self.last_date, operation=self.operation)
+        return [transaction for transaction in reversed(missed) if self._dispatch(transaction)]
+
+    def _respond(self, body):
+        try:
+            self.handle(body)
+        except exceptions.SignatureError:
+            return 403, b'Forbidden'
+        except ValueError:
+            return 400, b'Bad Request'
+        except Exception as e:
+            apihelper.logger.error('Webhook handler failed: {0}'.format(e))
+            return 500, b'Internal Server Error'
+        return 200, b'OK'
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') != 'POST':
+            start_response('405 Method Not Allowed', [('Content-Type', 'text/plain')])
+            return [b'Method Not Allowed']
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        status, text = self._respond(environ['wsgi.input'].read(length))
+        reason = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 500: 'Internal Server Error'}[status]
+        start_response('{0} {1}'.format(status, reason), [('Content-Type', 'text/plain')])
+        return [text]
+
+    async def asgi(self, scope, receive, send):
+        """
+        ASGI-приложение приемника
+
+        Обработчики вызываются прямо в цикле событий, поэтому они не должны блокировать его надолго.
+        """
+        if scope['type'] != 'http':
+            return
+        if scope['method'] != 'POST':
+            status, text = 405, b'Method Not Allowed'
+        else:
+            body = b''
+            more_body = True
+            while more_body:
+                message = await receive()
+                body += message.get('body', b'')
+                more_body = message.get('more_body', False)
+            status, text = self._respond(body)
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': text})
+
+    def serve(self, host='0.0.0.0', port=8080, background=False):
+        """
+        Запуск приемника как отдельного HTTP-сервера
+
+        Перед приемом уведомлений выполняется :meth:`gap_fill`.
+
+        Parameters
+        ----------
+        host : str
+            Адрес для прослушивания.
+        port : int
+            Порт для прослушивания (0 - любой свободный).
+        background : bool
+            Запустить сервер в отдельном потоке и сразу вернуть управление.
+
+        Returns
+        -------
+        wsgiref.simple_server.WSGIServer
+            Сервер, адрес в ``server_address``.
+        """
+        self._server = make_server(host, port, self, handler_class=_QuietHandler)
+        self.gap_fill()
+        if background:
+            threading.Thread(target=self._server.serve_forever, name='WebhookReceiver', daemon=True).start()
+        else:
+            self._server.serve_forever()
+        return self._server
+
+    def shutdown(self):
+        """
+        Остановка сервера, запущенного :meth:`serve`
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        apihelper.logger.debug(format % args)
+
+
+def make_notification(payment, key, hook_id=None, test=False):
+    """
+    Создание подписанного уведомления, как его отправляет Qiwi
+
+    Parameters
+    ----------
+    payment : dict
+        Поле ``payment`` уведомления (например, строка истории платежей).
+    key : str
+        Секретный ключ обработчика в base64.
+    hook_id : Optional[str]
+        ID обработчика.
+    test : bool
+        Признак тестового уведомления.
+
+    Returns
+    -------
+    dict
+        Уведомление
+    """
+    payment = dict(payment)
+    payment.setdefault('signFields', DEFAULT_SIGN_FIELDS)
+    return {'messageId': str(uuid.uuid4()),
+            'hookId': hook_id or str(uuid.uuid4()),
+            'payment': payment,
+            'hash': sign(payment, key),
+            'version': '1.0.0',
+            'test': test}
+
+
+def send_notification(url, payment, key, **kwargs):
+    """
+    Отправка подписанного уведомления на адрес приемника
+
+    Заменяет Qiwi при локальной проверке приемника.
+
+    Parameters
+    ----------
+    url : str
+        Адрес приемника.
+    payment : dict
+        Поле ``payment`` уведомления.
+    key : str
+        Секретный ключ обработчика в base64.
+    kwargs
+        Параметры :func:`make_notification`.
+
+    Returns
+    -------
+    int
+        HTTP-код ответа приемника.
+    """
+    notification = make_notification(payment, key, **kwargs)
+    response = apihelper._default_session().post(url, data=json.dumps(notification),
+                                                 headers={'Content-Type': 'application/json'})
+    return response.status_code
@@ -19,11 +19,11 @@ except FileNotFoundError:
     # thats fine, we are building on Travis
     history = ''
 
-requirements = ['six', 'requests>=2.15,<3', 'parse>=1.8,<2', 'python-dateutil>=2.7,<3']
+requirements = ['requests>=2.15,<3', 'parse>=1.8,<2', 'python-dateutil>=2.7,<3']
 
-setup_requirements = ['pytest-runner', 'six', 'requests>=2.15,<3', 'parse>=1.8,<2', 'python-dateutil>=2.7,<3']
+setup_requirements = ['pytest-runner', 'requests>=2.15,<3', 'parse>=1.8,<2', 'python-dateutil>=2.7,<3']
 
-test_requirements = ['pytest', 'six', 'requests>=2.15,<3', 'parse>=1.8,<2', 'python-dateutil>=2.7,<3']
+test_requirements = ['pytest', 'requests>=2.15,<3', 'parse>=1.8,<2', 'python-dateutil>=2.7,<3']
 
 setup(
     author="Levent Duivel",
@@ -34,11 +34,18 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
     description="Python Qiwi API Wrapper",
     install_requires=requirements,
+    python_requires='>=3.7',
+    extras_require={'http2': ['httpx[http2]>=0.23'], 'tracing': ['opentelemetry-api>=1.0'],
+                    'parquet': ['pyarrow>=7']},
     license="MIT",
     long_description=readme + '\n\n' + history,
     long_description_content_type="text/plain",
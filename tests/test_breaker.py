@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+import requests
+
+from pyqiwi import apihelper, exceptions
+from pyqiwi.breaker import CircuitBreaker
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import FakeTransport
+
+
+def test_breaker_opens_per_family_and_recovers():
+    sim = Simulator(transactions=5)
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, open_time=0.1)
+    transport = FakeTransport(sim.handle, middleware=[breaker])
+    sim.inject(503, endpoint='payment-history')
+    for _ in range(4):
+        with pytest.raises(exceptions.APIError):
+            apihelper.payment_history(sim.token, sim.number, 5, transport=transport)
+    assert breaker.state('payment-history') == 'open'
+    requests_before = sim.requests
+    with pytest.raises(exceptions.CircuitOpenError) as e:
+        apihelper.payment_history(sim.token, sim.number, 5, transport=transport)
+    assert e.value.method_name == 'payment-history' and 0 < e.value.retry_after <= 0.1
+    assert e.value.response is None
+    assert sim.requests == requests_before
+    assert apihelper.funding_sources(sim.token, transport=transport)['accounts']
+    assert breaker.state('funding-sources') == 'closed'
+
+    time.sleep(0.1)
+    assert breaker.state('payment-history') == 'half-open'
+    with pytest.raises(exceptions.APIError) as e:
+        apihelper.payment_history(sim.token, sim.number, 5, transport=transport)
+    assert not isinstance(e.value, exceptions.CircuitOpenError)
+    assert breaker.state('payment-history') == 'open'
+
+    sim.clear_faults()
+    time.sleep(0.1)
+    assert len(apihelper.payment_history(sim.token, sim.number, 5, transport=transport)['data']) == 5
+    assert breaker.state('payment-history') == 'closed'
+
+
+def test_breaker_counts_transport_errors_and_ignores_client_errors():
+    def handler(request):
+        if request.family == 'crossRates':
+            raise requests.exceptions.ConnectTimeout('timeout')
+        return sim.handle(request)
+
+    sim = Simulator(transactions=1)
+    breaker = CircuitBreaker(min_calls=2)
+    transport = FakeTransport(handler, middleware=[breaker])
+    for _ in range(3):
+        with pytest.raises(exceptions.APIError):
+            apihelper.funding_sources('unknown', transport=transport)
+    assert breaker.state('funding-sources') == 'closed'
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.Timeout):
+            apihelper.cross_rates(sim.token, transport=transport)
+    with pytest.raises(exceptions.CircuitOpenError):
+        apihelper.cross_rates(sim.token, transport=transport)
+    breaker.reset('crossRates')
+    assert breaker.state('crossRates') == 'closed'
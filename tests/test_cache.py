@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+import time
+
+import pytest
+
+from pyqiwi import Wallet, apihelper, exceptions
+from pyqiwi.cache import CacheMiddleware, MemoryCache, SQLiteCache, dumps, loads
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import FakeTransport
+
+
+def test_serialization():
+    body = b'{"result": []}'
+    assert loads(dumps(200, 'application/json', body)) == (200, 'application/json', body)
+    large = b'[' + b'1,' * 1000 + b'1]'
+    value = dumps(200, None, large)
+    assert len(value) < len(large) and loads(value) == (200, None, large)
+
+
+def test_backends_expire(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    for backend in (MemoryCache(), SQLiteCache(str(tmp_path / 'cache.db'))):
+        backend.set('key', b'value', 10)
+        assert backend.get('key') == b'value'
+        now[0] += 11
+        assert backend.get('key') is None
+        backend.set('key', b'value', 10)
+        backend.delete('key')
+        assert backend.get('key') is None
+
+
+def test_sqlite_cache_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    SQLiteCache(path).set('rates', b'shared', 60)
+    code = 'from pyqiwi.cache import SQLiteCache; print(SQLiteCache({0!r}).get("rates").decode())'.format(path)
+    output = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+                            check=True).stdout
+    assert output.strip() == 'shared'
+
+
+def test_cache_middleware(tmp_path):
+    sim = Simulator(transactions=1)
+    sim.add_wallet('second')
+    path = str(tmp_path / 'cache.db')
+    # Два "воркера" со своими транспортами и соединениями к одному файлу
+    workers = [CacheMiddleware(SQLiteCache(path)) for _ in range(2)]
+    transports = [FakeTransport(sim.handle, middleware=[cache]) for cache in workers]
+    for transport in transports:
+        assert apihelper.cross_rates(sim.token, transport=transport)['result']
+        assert apihelper.cross_rates('second', transport=transport)['result']
+        assert Wallet(sim.token, transport=transport).get_commission(99).ranges
+    # Курсы, профиль и форма провайдера запрошены по сети один раз на оба процесса
+    assert sum(len(t.requests) for t in transports) == 3
+    assert workers[0].misses == 3 and workers[1].hits == 4
+    profiles = [apihelper.person_profile(token, True, True, True, transport=transports[1])
+                for token in (sim.token, 'second')]
+    assert profiles[0]['contractInfo']['contractId'] != profiles[1]['contractInfo']['contractId']
+    sim.inject(500, endpoint='sinap/providers')
+    cache = CacheMiddleware(MemoryCache())
+    transport = FakeTransport(sim.handle, middleware=[cache])
+    for _ in range(2):
+        with pytest.raises(exceptions.APIError):
+            apihelper.local_commission(sim.token, 1, transport=transport)
+    assert cache.misses == 2 and cache.hit_ratio == 0
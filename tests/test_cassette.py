@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import gzip
+import time
+
+import pytest
+
+from pyqiwi import Wallet, apihelper, exceptions
+from pyqiwi.cassette import Cassette
+from pyqiwi.simulator import Simulator
+
+
+def test_record_and_replay(tmpdir):
+    path = str(tmpdir.join('session.jsonl.gz'))
+    with Simulator(transactions=80, latency=0.02) as sim:
+        token = sim.token
+        with Cassette(path, mode='record'):
+            wallet = Wallet(token)
+            recorded = [t.txn_id for t in wallet.history_since(0)]
+            balance = wallet.balance()
+            sim.inject(404, endpoint='payment-history/v2/transactions')
+            with pytest.raises(exceptions.APIError):
+                wallet.transaction(1, 'IN')
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        content = f.read()
+    assert 'Bearer {0}'.format(token) not in content
+    assert 'Bearer <redacted>' in content
+
+    session = apihelper._default_session()
+    with Cassette(path):
+        started = time.monotonic()
+        wallet = Wallet(token)
+        assert [t.txn_id for t in wallet.history_since(0)] == recorded
+        assert wallet.balance() == balance
+        assert time.monotonic() - started < 0.02 * 3
+        with pytest.raises(exceptions.APIError) as e:
+            wallet.transaction(1, 'IN')
+        assert e.value.request.status_code == 404
+        with pytest.raises(exceptions.CassetteError):
+            wallet.transaction(2, 'IN')
+    assert apihelper._default_session() is session
+
+
+def test_realtime_replay(tmpdir):
+    path = str(tmpdir.join('session.jsonl'))
+    with Simulator(transactions=1, latency=0.05) as sim:
+        with Cassette(path, mode='record'):
+            apihelper.funding_sources(sim.token)
+        token = sim.token
+    with Cassette(path, realtime=True):
+        started = time.monotonic()
+        apihelper.funding_sources(token)
+        assert time.monotonic() - started >= 0.05
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+import requests
+
+from pyqiwi import Wallet, apihelper, exceptions
+from pyqiwi.deadline import Deadline
+from pyqiwi.pool import WalletPool
+from pyqiwi.retry import Retry
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import FakeTransport
+
+
+def test_deadline_limits_timeouts_and_fails_fast():
+    sim = Simulator(transactions=1)
+    transport = FakeTransport(sim.handle)
+    with Deadline(2):
+        with Deadline(10) as inner:
+            apihelper.funding_sources(sim.token, transport=transport)
+            assert inner.remaining() <= 2
+    assert transport.requests[-1].timeout[0] <= 2 and transport.requests[-1].timeout[1] <= 2
+    with Deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(exceptions.DeadlineExceeded) as e:
+            apihelper.funding_sources(sim.token, transport=transport)
+    assert isinstance(e.value, TimeoutError) and e.value.method_name == 'funding-sources'
+    assert len(transport.requests) == 1
+
+
+def test_hung_read_raises_deadline_exceeded():
+    with Simulator(transactions=1, latency=1.0) as sim:
+        started = time.monotonic()
+        with pytest.raises(exceptions.DeadlineExceeded) as e:
+            with Deadline(0.2):
+                apihelper.funding_sources(sim.token)
+        assert time.monotonic() - started < 0.6
+        assert isinstance(e.value.__cause__, requests.exceptions.Timeout)
+
+
+def test_retry_within_deadline():
+    sim = Simulator(transactions=1)
+    failures = [requests.exceptions.ConnectionError('reset')]
+
+    def flaky(request):
+        if failures:
+            raise failures.pop()
+        return sim.handle(request)
+
+    retry = Retry(backoff=0.01)
+    assert apihelper.funding_sources(sim.token, transport=FakeTransport(flaky, middleware=[retry]))
+    assert retry.retries == 1
+
+    sim.inject(503, endpoint='funding-sources')
+    retry = Retry(attempts=100, backoff=0.02, max_backoff=0.02)
+    started = time.monotonic()
+    with pytest.raises(exceptions.APIError) as e:
+        with Deadline(0.2):
+            apihelper.funding_sources(sim.token, transport=FakeTransport(sim.handle, middleware=[retry]))
+    assert e.value.request.status_code == 503
+    assert time.monotonic() - started < 0.4 and 3 < retry.retries < 20
+
+
+def test_wallet_timeout_covers_pagination_and_pool():
+    sim = Simulator(transactions=50, latency=0.03)
+    wallet = Wallet(sim.token, transport=sim.transport(), timeout=0.1)
+    with pytest.raises(exceptions.DeadlineExceeded):
+        wallet.history_since(0, rows=5)
+    assert wallet.history(rows=5)['transactions']
+
+    wallets = [Wallet(sim.token, transport=sim.transport()) for _ in range(4)]
+    with WalletPool(wallets, max_workers=4) as pool, Deadline(0.05):
+        results = list(pool.map(lambda w: w.history_since(0, rows=5)))
+    assert all(isinstance(r.error, exceptions.DeadlineExceeded) for r in results)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import io
+import json
+import sys
+
+import pytest
+
+from pyqiwi import Wallet
+from pyqiwi.export import COLUMNS, export_history, flatten
+from pyqiwi.simulator import Simulator
+
+
+@pytest.fixture
+def wallet():
+    sim = Simulator(transactions=120)
+    return Wallet(sim.token, sim.number, transport=sim.transport())
+
+
+def test_ndjson_gzip(wallet, tmp_path):
+    path = tmp_path / 'history.ndjson.gz'
+    assert export_history(wallet, path) == 120
+    with gzip.open(str(path), 'rt', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 120
+    assert list(records[0]) == list(COLUMNS)
+    txn_ids = [record['txn_id'] for record in records]
+    assert txn_ids == sorted(set(txn_ids), reverse=True)
+    transaction = wallet.transaction(records[0]['txn_id'], records[0]['type'])
+    assert records[0]['sum_amount'] == transaction.sum.amount
+    assert records[0]['provider_id'] == transaction.provider.id
+
+
+def test_csv_stream(wallet):
+    output = io.StringIO()
+    assert export_history(wallet, output, format='csv', operation='IN', rows=20) > 0
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert rows and all(row['type'] == 'IN' for row in rows)
+    assert tuple(rows[0]) == COLUMNS
+
+
+def test_stdout_bz2(wallet, monkeypatch):
+    import bz2
+
+    buffer = io.BytesIO()
+    monkeypatch.setattr(sys, 'stdout', io.TextIOWrapper(buffer))
+    assert export_history(wallet, '-', compression='bz2') == 120
+    assert len(bz2.decompress(buffer.getvalue()).splitlines()) == 120
+
+
+def test_flatten_missing_parts():
+    record = flatten({'txnId': 1, 'sum': {'amount': 10, 'currency': 643}, 'provider': None, 'source': ['QW_RUB']})
+    assert record['sum_amount'] == 10
+    assert record['provider_id'] is None
+    assert record['source'] == 'QW_RUB'
+
+
+def test_unknown_format(wallet):
+    with pytest.raises(ValueError):
+        export_history(wallet, io.StringIO(), format='xml')
+
+
+def test_parquet(wallet, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'history.parquet'
+    assert export_history(wallet, path, format='parquet') == 120
+    assert pq.read_table(str(path)).num_rows == 120
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import itertools
+import threading
+import time
+
+import requests
+
+from pyqiwi import apihelper
+from pyqiwi.hedge import Hedging
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import FakeTransport
+
+
+def stalling(sim, stall=0.5, first_only=True):
+    # Как транспорт по сети: зависший сервер обрывается таймаутом чтения
+    calls = itertools.count()
+    lock = threading.Lock()
+    threads = []
+
+    def handler(request):
+        with lock:
+            n = next(calls)
+            threads.append(threading.current_thread())
+        if n == 0 or not first_only:
+            read_timeout = request.timeout[1]
+            if read_timeout is not None and read_timeout < stall:
+                time.sleep(read_timeout)
+                raise requests.exceptions.ReadTimeout()
+            time.sleep(stall)
+        return sim.handle(request)
+    handler.threads = threads
+    return handler
+
+
+def test_hedge_replaces_stalled_request():
+    sim = Simulator(transactions=1)
+    hedging = Hedging(delay=0.05, budget=1.0)
+    handler = stalling(sim)
+    transport = FakeTransport(handler, middleware=[hedging])
+    started = time.perf_counter()
+    assert apihelper.funding_sources(sim.token, transport=transport)['accounts']
+    assert time.perf_counter() - started < 0.4
+    assert hedging.hedges == 1 and hedging.wins == 1 and hedging.hedge_rate == 1.0
+    # Исходный запрос и копия выполняются в потоке вызывающего, копия - с исходным таймаутом
+    assert handler.threads == [threading.current_thread()] * 2
+    assert [request.timeout[1] for request in transport.requests] == [0.05, apihelper.READ_TIMEOUT]
+    # Замер есть и у зависшего запроса, и у копии
+    assert len(hedging._latencies['funding-sources'].samples) == 2
+    # POST и другие семейства методов не дублируются
+    assert apihelper.cross_rates(sim.token, transport=transport)
+    assert hedging.requests == 1
+
+
+def test_hedge_budget_and_adaptive_delay():
+    sim = Simulator(transactions=1)
+    hedging = Hedging(min_samples=5)
+    transport = FakeTransport(sim.handle, middleware=[hedging])
+    assert hedging.delay('funding-sources') == 1.0
+    for _ in range(5):
+        apihelper.funding_sources(sim.token, transport=transport)
+    assert hedging.hedges == 0
+    assert hedging.delay('funding-sources') < 0.1
+
+    # Все ответы медленные, но бюджет позволяет копию только для каждого второго запроса
+    hedging = Hedging(delay=0.01, budget=0.5)
+    transport = FakeTransport(stalling(sim, stall=0.03, first_only=False), middleware=[hedging])
+    for _ in range(4):
+        apihelper.funding_sources(sim.token, transport=transport)
+    assert hedging.hedges == 2 and hedging.requests == 4
+    # Неизрасходованный токен возвращается, если запрос ответил вовремя
+    hedging = Hedging(delay=1.0, budget=1.0)
+    transport = FakeTransport(sim.handle, middleware=[hedging])
+    for _ in range(3):
+        apihelper.funding_sources(sim.token, transport=transport)
+    assert hedging.hedges == 0 and hedging._tokens == 3.0
+
+    # Нулевой бюджет отключает дублирование
+    hedging = Hedging(delay=0.01, budget=0.0)
+    transport = FakeTransport(stalling(sim, stall=0.03, first_only=False), middleware=[hedging])
+    for _ in range(3):
+        apihelper.funding_sources(sim.token, transport=transport)
+    assert hedging.hedges == 0 and hedging.requests == 3
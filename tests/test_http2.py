@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyqiwi import Wallet, apihelper, exceptions
+from pyqiwi.simulator import Simulator
+
+pytest.importorskip('httpx')
+from pyqiwi import http2  # noqa: E402
+from pyqiwi.http2 import AsyncHTTP2Session, HTTP2Session  # noqa: E402
+
+
+def test_wallet_over_http2_session():
+    with Simulator(transactions=30) as sim, HTTP2Session(max_connections=4) as transport:
+        wallet = Wallet(sim.token, transport=transport)
+        with ThreadPoolExecutor(16) as executor:
+            pages = list(executor.map(lambda i: wallet.history(rows=10), range(32)))
+        assert all(len(page['transactions']) == 10 for page in pages)
+        assert transport.connections <= 4
+        assert wallet.get_commission('99').ranges
+        sim.inject(404, endpoint='payment-history/v2/transactions')
+        with pytest.raises(exceptions.APIError) as e:
+            wallet.transaction(1, 'IN')
+        assert e.value.method.startswith('/payment-history/v2/transactions/1')
+        assert sim.requests == 35
+
+
+def test_async_http2_session():
+    async def main(sim):
+        async with AsyncHTTP2Session(max_connections=2) as transport:
+            pages = await asyncio.gather(*[apihelper.payment_history(sim.token, sim.number, 10, transport=transport)
+                                           for _ in range(8)])
+            assert all(len(page['data']) == 10 for page in pages)
+
+    with Simulator(transactions=30) as sim:
+        asyncio.run(main(sim))
+        assert sim.requests == 8
+
+
+def test_proxy_argument_follows_httpx_version():
+    class Client:
+        def __init__(self, proxy=None):
+            pass
+
+    class OldClient:
+        def __init__(self, proxies=None):
+            pass
+
+    assert http2._proxy_kwargs(types.SimpleNamespace(Client=Client), 'http://proxy') == {'proxy': 'http://proxy'}
+    assert http2._proxy_kwargs(types.SimpleNamespace(Client=OldClient), 'http://proxy') == {'proxies': 'http://proxy'}
+    assert http2._proxy_kwargs(types.SimpleNamespace(Client=OldClient), None) == {}
+
+    with HTTP2Session() as transport:
+        client, transport.client = transport.client, types.SimpleNamespace()
+        assert transport.connections is None
+        transport.client = client
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+
+import pyqiwi
+from pyqiwi import apihelper
+
+
+def run_python(code):
+    return subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+                          check=True).stdout.split()
+
+
+def test_import_does_not_load_heavy_dependencies():
+    loaded = run_python('import sys, pyqiwi; print(*[m for m in ("requests", "urllib3", "dateutil", "six") '
+                        'if m in sys.modules])')
+    assert loaded == []
+
+
+def test_session_is_created_on_first_use():
+    loaded = run_python('import sys\n'
+                        'from pyqiwi import apihelper\n'
+                        'print("session" in vars(apihelper), "requests" in sys.modules)\n'
+                        'apihelper._default_session()\n'
+                        'print("session" in vars(apihelper), "requests" in sys.modules)')
+    assert loaded == ['False', 'False', 'True', 'True']
+
+
+def test_session_can_be_replaced(monkeypatch):
+    replacement = object()
+    monkeypatch.setattr(apihelper, 'session', replacement)
+    assert apihelper.session is replacement
+    assert apihelper._default_session() is replacement
+
+
+def test_decode_date():
+    date = pyqiwi.types.JsonDeserializable.decode_date('2018-04-16T11:05:13+03:00')
+    assert date.utcoffset().total_seconds() == 3 * 3600
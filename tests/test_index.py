@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from pyqiwi import Wallet, types, util
+from pyqiwi.index import TransactionIndex
+from pyqiwi.simulator import Simulator
+
+NOW = datetime.datetime.now(util.MSK).replace(microsecond=0)
+
+
+def transaction(txn_id, minutes_ago, amount, comment=None, account='+79000000001', _type='IN'):
+    return types.Transaction.de_json({
+        'txnId': txn_id, 'personId': 79000000000, 'date': (NOW - datetime.timedelta(minutes=minutes_ago)).isoformat(),
+        'errorCode': 0, 'error': None, 'status': 'SUCCESS', 'type': _type, 'statusText': 'Success',
+        'trmTxnId': str(txn_id), 'account': account, 'sum': {'amount': amount, 'currency': 643},
+        'commission': {'amount': 0, 'currency': 643}, 'total': {'amount': amount, 'currency': 643},
+        'provider': {'id': 99, 'shortName': 'QIWI', 'longName': 'QIWI', 'logoUrl': None, 'description': None,
+                     'keys': None, 'siteUrl': None},
+        'source': ['QW_RUB'], 'comment': comment, 'currencyRate': 1, 'features': {}, 'view': {}})
+
+
+def test_lookups():
+    index = TransactionIndex()
+    assert index.update([transaction(1, 30, 100, 'order-1'), transaction(2, 20, 250, 'order-2', '+79000000002'),
+                         transaction(3, 10, 100, 'order-1', _type='OUT'), transaction(1, 30, 100, 'order-1')]) == 3
+    assert len(index) == 3 and 2 in index
+    assert index.get(2).comment == 'order-2'
+    assert [t.txn_id for t in index.by_comment('order-1')] == [1, 3]
+    assert [t.txn_id for t in index.by_account('+79000000002')] == [2]
+    assert [t.txn_id for t in index.by_amount(100, 200)] == [1, 3]
+    assert [t.txn_id for t in index.between(NOW - datetime.timedelta(minutes=25), NOW)] == [2, 3]
+    assert [t.txn_id for t in index.between(end=(NOW - datetime.timedelta(minutes=25)).replace(tzinfo=None))] == [1]
+    assert [t.txn_id for t in index] == [1, 2, 3]
+
+    assert [t.txn_id for t in index.find(comment='order-1', type='IN')] == [1]
+    assert [t.txn_id for t in index.find(amount=100, start=NOW - datetime.timedelta(minutes=15))] == [3]
+    assert [t.txn_id for t in index.find(amount=(200, 300), currency=643)] == [2]
+    assert index.find(comment='order-2', amount=100) == []
+    assert index.find(account='+79000000001', status='ERROR') == []
+
+    assert index.remove(1) and not index.remove(1)
+    assert [t.txn_id for t in index.by_comment('order-1')] == [3]
+    assert [t.txn_id for t in index.by_amount(100, 100)] == [3]
+
+
+def test_eviction():
+    index = TransactionIndex(retention=3600, max_size=50)
+    assert not index.add(transaction(1, 120, 10))
+    index.update(transaction(txn_id, 61 - txn_id, txn_id, 'order-{0}'.format(txn_id)) for txn_id in range(2, 62))
+    assert len(index) == 50
+    assert min(t.txn_id for t in index) == 12
+    assert index.by_comment('order-2') == [] and index.by_amount(0, 11) == []
+
+    later = NOW + datetime.timedelta(minutes=30)
+    assert index.evict(later.timestamp()) == 19
+    assert len(index) == 31 and len(index.by_amount()) == 31
+    index.clear()
+    assert len(index) == 0 and index.find() == []
+
+
+def test_fed_from_history():
+    sim = Simulator(transactions=30)
+    wallet = Wallet(sim.token, sim.number, transport=sim.transport())
+    index = TransactionIndex()
+    index.update(wallet.history(rows=30)['transactions'])
+    incoming = [t for t in index if t.type == 'IN' and t.comment]
+    assert incoming
+    target = incoming[0]
+    assert index.find(comment=target.comment, amount=target.sum.amount) == [target]
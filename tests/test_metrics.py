@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import pytest
+import requests
+
+from pyqiwi import apihelper, exceptions
+from pyqiwi.cache import CacheMiddleware
+from pyqiwi.metrics import Metrics, MetricsSink, PrometheusSink
+from pyqiwi.retry import Retry
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import FakeTransport
+
+
+class ListSink(MetricsSink):
+    def __init__(self):
+        self.events = []
+
+    def request(self, family, method, status, elapsed, bytes_out, bytes_in):
+        self.events.append((family, method, status, bytes_out > 0, bytes_in > 0))
+
+    def in_flight(self, family, delta):
+        pass
+
+    def count(self, name, family):
+        self.events.append((name, family))
+
+
+def test_metrics_disabled_by_default():
+    assert apihelper.metrics is None
+
+
+def test_prometheus_exposition():
+    sim = Simulator(transactions=10)
+    failures = [requests.exceptions.ConnectionError('reset')] * 2
+
+    def handler(request):
+        if request.family == 'payment-history' and failures:
+            raise failures.pop()
+        return sim.handle(request)
+
+    transport = FakeTransport(handler, middleware=[Retry(backoff=0.001), CacheMiddleware()])
+    prometheus, events = PrometheusSink(), ListSink()
+    with Metrics([prometheus, events]) as metrics:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            apihelper.payment_history(sim.token, sim.number, 5, transport=FakeTransport(handler))
+        assert apihelper.metrics is metrics
+        apihelper.payment_history(sim.token, sim.number, 5, transport=transport)
+        for _ in range(3):
+            apihelper.cross_rates(sim.token, transport=transport)
+        apihelper.payments(sim.token, 99, 1.0, '79000000001', transport=transport)
+        with pytest.raises(exceptions.APIError):
+            apihelper.funding_sources('unknown', transport=transport)
+    assert apihelper.metrics is None
+    assert ('payment-history', 'GET', '200', False, True) in events.events
+    assert ('payments', 'POST', '200', True, True) in events.events
+    # Повтор внутри транспорта учитывается отдельно от вызова apihelper
+    assert events.events[0] == ('payment-history', 'GET', 'ConnectionError', False, False)
+    assert events.events[1:3] == [('retries', 'payment-history'), ('payment-history', 'GET', '200', False, True)]
+
+    text = prometheus.render()
+    assert 'pyqiwi_requests_total{family="crossRates",method="GET",status="200"} 3' in text
+    assert 'pyqiwi_requests_total{family="funding-sources",method="GET",status="401"} 1' in text
+    assert 'pyqiwi_request_duration_seconds_count{family="payment-history"} 2' in text
+    assert 'pyqiwi_request_duration_seconds_bucket{family="crossRates",le="+Inf"} 3' in text
+    assert 'pyqiwi_requests_in_flight{family="crossRates"} 0' in text
+    assert 'pyqiwi_retries_total{family="payment-history"} 1' in text
+    assert 'pyqiwi_cache_hits_total{family="crossRates"} 2' in text
+    assert 'pyqiwi_cache_hit_ratio 0.6666666666666666' in text
+    assert '# TYPE pyqiwi_request_duration_seconds histogram' in text
+
+
+def test_prometheus_sink_wsgi():
+    sink = PrometheusSink()
+    sink.request('a"b', 'GET', '200', 0.01, 0, 10)
+    # Доля попаданий в кэш без запросов к кэшу не создает пустых счетчиков
+    assert sink.cache_hit_ratio() == 0.0
+    assert 'pyqiwi_cache' not in sink.render()
+    status = []
+    body = b''.join(sink({}, lambda s, headers: status.append(s)))
+    assert status == ['200 OK']
+    assert b'pyqiwi_response_bytes_total{family="a\\"b"} 10' in body
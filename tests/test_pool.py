@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from pyqiwi import Wallet, apihelper
+from pyqiwi.pool import WalletPool
+
+
+def make_wallet(token, number):
+    return Wallet(token, number=number, contract_info=False)
+
+
+def test_balances_run_in_parallel(monkeypatch):
+    def funding_sources(token, **kwargs):
+        time.sleep(0.2)
+        if token == 'bad':
+            raise ValueError(token)
+        return {'accounts': [{'alias': 'qw_wallet_rub', 'currency': 643, 'hasBalance': True,
+                              'balance': {'amount': float(len(token)), 'currency': 643}}]}
+
+    monkeypatch.setattr(apihelper, 'funding_sources', funding_sources)
+    wallets = [make_wallet('t' * i, str(79000000000 + i)) for i in range(1, 21)]
+    wallets.append(make_wallet('bad', '79000000999'))
+    with WalletPool(wallets, max_workers=32) as pool:
+        started = time.monotonic()
+        results = list(pool.balances())
+        elapsed = time.monotonic() - started
+    assert elapsed < 1
+    assert len(results) == 21
+    failed = [r for r in results if not r.ok]
+    assert len(failed) == 1 and isinstance(failed[0].error, ValueError)
+    assert sorted(r.result for r in results if r.ok) == [float(i) for i in range(1, 21)]
+
+
+def test_per_wallet_limit(monkeypatch):
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def funding_sources(token, **kwargs):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.05)
+        with lock:
+            active['now'] -= 1
+        return {'accounts': [{'alias': 'qw_wallet_rub', 'currency': 643, 'hasBalance': True,
+                              'balance': {'amount': 1.0, 'currency': 643}}]}
+
+    monkeypatch.setattr(apihelper, 'funding_sources', funding_sources)
+    wallets = [make_wallet('same', '7900000000{0}'.format(i)) for i in range(5)]
+    with WalletPool(wallets, max_workers=8, per_wallet=1) as pool:
+        assert all(r.ok for r in pool.balances())
+    assert active['max'] == 1
+
+
+def test_busy_token_does_not_hold_workers(monkeypatch):
+    def funding_sources(token, **kwargs):
+        time.sleep(0.1 if token == 'busy' else 0)
+        return {'accounts': [{'alias': 'qw_wallet_rub', 'currency': 643, 'hasBalance': True,
+                              'balance': {'amount': 1.0, 'currency': 643}}]}
+
+    monkeypatch.setattr(apihelper, 'funding_sources', funding_sources)
+    wallets = [make_wallet('busy', '7900000000{0}'.format(i)) for i in range(3)]
+    wallets.append(make_wallet('idle', '79000000009'))
+    with WalletPool(wallets, max_workers=2, per_wallet=1) as pool:
+        results = list(pool.balances())
+    # Ожидающие запросы токена busy не занимают второй поток, запрос idle завершается первым
+    assert results[0].wallet.token == 'idle'
+    assert len(results) == 4 and all(r.ok for r in results)
+
+
+def test_pool_has_its_own_session():
+    adapter = apihelper._default_session().get_adapter('https://')
+    own = Wallet('token', number='79000000000', contract_info=False, transport=object())
+    shared = make_wallet('t1', '79000000001')
+    with WalletPool([own, shared], max_workers=16) as pool:
+        assert own.transport is not pool.transport and shared.transport is pool.transport
+        assert pool.transport is not apihelper._default_session()
+        assert pool.transport.get_adapter('https://')._pool_maxsize == 16
+    # Адаптеры общей сессии не заменяются
+    assert apihelper._default_session().get_adapter('https://') is adapter
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import http.client
+import io
+import os
+import signal
+
+import pytest
+import urllib3.connection
+
+from pyqiwi import Wallet, apihelper, types
+from pyqiwi.profiling import PHASES, Profiler
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import RequestsTransport
+
+
+def test_phases_over_http():
+    begin = http.client.HTTPResponse.begin
+    with Simulator(transactions=20, latency=0.01) as sim, RequestsTransport() as transport:
+        wallet = Wallet(sim.token, sim.number, transport=transport)
+        with Profiler() as profiler:
+            assert apihelper.profiler is profiler
+            wallet.history(rows=20)
+            wallet.history(rows=20)
+            apihelper.cross_rates(sim.token, transport=transport)
+        wallet.history(rows=20)
+    assert apihelper.profiler is None
+    assert types.observers == []
+    assert http.client.HTTPResponse.begin is begin
+    assert 'connect' in urllib3.connection.HTTPConnection.__dict__
+
+    stats = profiler.stats.as_dict()
+    assert set(stats) == {'Wallet.history', 'crossRates'}
+    history = stats['Wallet.history']
+    assert history['calls'] == 2
+    phases = history['phases']
+    # Соединение уже открыто при создании кошелька, задержка симулятора видна как ожидание первого байта
+    assert phases['connect'] == 0
+    assert phases['ttfb'] >= 0.02
+    for phase in ('prepare', 'body', 'decode', 'build', 'date'):
+        assert phases[phase] > 0, phase
+    assert sum(phases.values()) == pytest.approx(history['total'])
+
+    text = profiler.stats.format()
+    assert text.splitlines()[0].split()[4:] == list(PHASES) + ['other']
+    assert 'Wallet.history' in text
+
+
+def test_connect_and_nesting():
+    with Simulator(transactions=5) as sim, Profiler() as profiler:
+        with RequestsTransport() as transport:
+            Wallet(sim.token, sim.number, transport=transport)
+        with profiler.operation('batch'), RequestsTransport() as transport:
+            Wallet(sim.token, sim.number, transport=transport).history(rows=5)
+    stats = profiler.stats.as_dict()
+    assert set(stats) == {'Wallet.profile', 'batch'}
+    assert stats['Wallet.profile']['phases']['connect'] > 0
+    assert stats['batch']['calls'] == 1
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR1'), reason='SIGUSR1 is not available')
+def test_dump_on_signal():
+    output = io.StringIO()
+    previous = signal.getsignal(signal.SIGUSR1)
+    sim = Simulator()
+    try:
+        with Profiler() as profiler:
+            profiler.dump_on_signal(signal.SIGUSR1, output)
+            apihelper.cross_rates(sim.token, transport=sim.transport())
+            os.kill(os.getpid(), signal.SIGUSR1)
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+    assert 'crossRates' in output.getvalue()
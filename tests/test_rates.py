@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from pyqiwi import Wallet, types
+from pyqiwi.rates import RateTable
+from pyqiwi.simulator import RATES, Simulator
+
+
+def rates(quotes):
+    return [types.Rate.de_json({'from': str(src), 'to': str(dst), 'rate': rate}) for (src, dst), rate in quotes.items()]
+
+
+def test_matrix_and_triangulation():
+    table = RateTable(rates(RATES))
+    assert table.currencies == (398, 643, 840, 978)
+    assert table.matrix[1][1] == 1.0
+    assert table.rate(840, 643) == 64.1
+    assert table.quoted(840, 643) and not table.quoted(398, 840)
+    assert table.rate(398, 840) == pytest.approx(0.173 * 0.0156)
+    assert table.rate(840, 398) == pytest.approx(64.1 * 5.78)
+    assert 124 not in table
+    with pytest.raises(ValueError):
+        table.rate(124, 643)
+
+    table = RateTable(rates({(643, 840): 0.0156, (978, 840): 1.165, (36, 392): 80}))
+    assert table.rate(840, 643) == pytest.approx(1 / 0.0156)
+    assert table.rate(978, 643) == pytest.approx(1.165 / 0.0156)
+    with pytest.raises(ValueError):
+        table.rate(36, 643)
+
+
+def test_convert_many():
+    table = RateTable(rates(RATES))
+    assert table.convert(100, 840, 643) == pytest.approx(6410)
+    assert table.convert_many([10, 20, 50], 978, 643) == pytest.approx([747, 1494, 3735])
+    assert table.convert_many([1, 2, 3], [643, 840, 978], 643) == pytest.approx([1, 128.2, 224.1])
+    with pytest.raises(ValueError):
+        table.convert_many([1], [124], 643)
+
+
+def test_refresh_from_wallet():
+    sim = Simulator()
+    table = RateTable(wallet=Wallet(sim.token, sim.number, transport=sim.transport()))
+    assert table.rate(643, 840) == 0.0156
+    table.refresh(rates({(643, 840): 0.02}))
+    assert table.currencies == (643, 840) and table.rate(840, 643) == 50
+    with pytest.raises(ValueError):
+        RateTable().refresh()
+
+
+def test_background_refresh():
+    sim = Simulator()
+    table = RateTable(rates({(643, 840): 0.02}), wallet=Wallet(sim.token, sim.number, transport=sim.transport()))
+    refreshed = threading.Event()
+    table.refresh = lambda refresh=table.refresh: (refresh(), refreshed.set())
+    thread = table.start(interval=0.01)
+    assert table.start() is thread
+    assert refreshed.wait(5)
+    table.stop()
+    assert not thread.is_alive()
+    assert table.rate(643, 840) == 0.0156
+
+    thread = table.start(interval=60)
+    table.stop()
+    assert not thread.is_alive()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from pyqiwi import Wallet, types, util
+from pyqiwi.reconcile import Reconciler
+from pyqiwi.simulator import Simulator
+
+NOW = datetime.datetime.now(util.MSK).replace(microsecond=0)
+
+
+def transaction(txn_id, amount, comment=None, currency=643, minutes_ago=0, _type='IN', status='SUCCESS'):
+    return types.Transaction.de_json({
+        'txnId': txn_id, 'personId': 79000000000, 'date': (NOW - datetime.timedelta(minutes=minutes_ago)).isoformat(),
+        'errorCode': 0, 'error': None, 'status': status, 'type': _type, 'statusText': 'Success',
+        'trmTxnId': str(txn_id), 'account': '+79000000001', 'sum': {'amount': amount, 'currency': currency},
+        'commission': {'amount': 0, 'currency': currency}, 'total': {'amount': amount, 'currency': currency},
+        'provider': {'id': 99, 'shortName': 'QIWI', 'longName': 'QIWI', 'logoUrl': None, 'description': None,
+                     'keys': None, 'siteUrl': None},
+        'source': ['QW_RUB'], 'comment': comment, 'currencyRate': 1, 'features': {}, 'view': {}})
+
+
+def test_events():
+    reconciler = Reconciler()
+    events = []
+    reconciler.add_callback(events.append)
+    reconciler.expect('order-1', 100.1)
+    reconciler.expect('order-2', 50)
+    reconciler.expect('order-3', 10, currency=840)
+    with pytest.raises(ValueError):
+        reconciler.expect('order-1', 1)
+
+    assert reconciler.feed(transaction(1, 60.05, 'order-1')).kind == 'partial'
+    assert reconciler.invoice('order-1').remaining == 40.05
+    assert reconciler.feed(transaction(1, 60.05, 'order-1')) is None
+    assert reconciler.feed(transaction(2, 40.05, ' order-1 ')).kind == 'matched'
+    assert 'order-1' not in reconciler
+    assert reconciler.feed(transaction(3, 10, 'order-1')).kind == 'unmatched'
+
+    event = reconciler.feed(transaction(4, 75, 'order-2'))
+    assert event.kind == 'overpaid' and event.invoice.remaining == -25
+    event = reconciler.feed(transaction(5, 10, 'order-3'))
+    assert event.kind == 'unmatched' and event.invoice.order_id == 'order-3'
+    assert reconciler.feed(transaction(6, 10, 'order-3', _type='OUT')) is None
+    assert reconciler.feed(transaction(7, 10, 'order-3', status='ERROR')) is None
+
+    assert [e.kind for e in events] == ['partial', 'matched', 'unmatched', 'overpaid', 'unmatched']
+    assert len(reconciler) == 1
+
+
+def test_expiry():
+    reconciler = Reconciler()
+    reconciler.expect('late', 10, expires=NOW - datetime.timedelta(minutes=10))
+    reconciler.expect('soon', 10, expires=(NOW + datetime.timedelta(minutes=10)).replace(tzinfo=None))
+    reconciler.expect('never', 10)
+
+    events = reconciler.update([transaction(1, 10, 'late', minutes_ago=5), transaction(2, 10, 'never')])
+    assert [(e.kind, e.invoice and e.invoice.order_id) for e in events] == [('unmatched', None), ('matched', 'never')]
+    assert 'late' not in reconciler
+
+    assert reconciler.expire(NOW) == []
+    events = reconciler.expire(NOW + datetime.timedelta(minutes=10))
+    assert [(e.kind, e.invoice.order_id) for e in events] == [('expired', 'soon')]
+    assert len(reconciler) == 0
+
+
+def test_pattern_and_amount():
+    reconciler = Reconciler(pattern=r'#(\d+)', match_amount=True)
+    reconciler.expect('1001', 123.45)
+    reconciler.expect('1002', 500)
+    reconciler.expect('1003', 500)
+    assert reconciler.feed(transaction(1, 123.45, 'Оплата заказа #1001')).invoice.order_id == '1001'
+    assert reconciler.feed(transaction(2, 500)).kind == 'unmatched'
+    assert reconciler.feed(transaction(3, 500, 'заказ #1003')).kind == 'matched'
+    event = reconciler.feed(transaction(4, 500, 'без номера'))
+    assert event.kind == 'matched' and event.invoice.order_id == '1002'
+    assert reconciler.cancel('1002') is None
+
+
+def test_fed_from_history():
+    sim = Simulator(transactions=30)
+    wallet = Wallet(sim.token, sim.number, transport=sim.transport())
+    transactions = wallet.history(rows=30)['transactions']
+    incoming = [t for t in transactions if t.type == 'IN' and t.status == 'SUCCESS' and t.comment]
+    assert incoming
+    reconciler = Reconciler()
+    target = incoming[0]
+    reconciler.expect(target.comment.strip(), target.sum.amount, target.sum.currency)
+    events = reconciler.update(transactions)
+    assert [e.kind for e in events if e.invoice is not None] == ['matched']
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from pyqiwi import Wallet, apihelper, exceptions
+from pyqiwi.refresh import RefreshMiddleware
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import FakeTransport
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def sim():
+    return Simulator()
+
+
+def test_refresh_ahead(sim):
+    refresher = RefreshMiddleware(rules=[(r'sinap/crossRates', 0.3, True)], refresh_ahead=0.5, jitter=0.1)
+    transport = FakeTransport(sim.handle, middleware=[refresher])
+    try:
+        end = time.monotonic() + 1
+        while time.monotonic() < end:
+            assert apihelper.cross_rates(sim.token, transport=transport)['result']
+            time.sleep(0.02)
+        # Вызывающий поток запросил курсы по сети один раз, дальше их обновлял фоновый поток
+        assert refresher.misses == 1 and refresher.refreshes >= 3
+        assert len(transport.requests) == 1 + refresher.refreshes
+    finally:
+        refresher.close()
+
+
+def test_commission_is_shared_between_tokens(sim):
+    sim.add_wallet('second')
+    refresher = RefreshMiddleware()
+    transport = FakeTransport(sim.handle, middleware=[refresher])
+    try:
+        assert Wallet(sim.token, transport=transport).get_commission(99).ranges
+        assert apihelper.local_commission('second', 99, transport=transport)
+        assert refresher.misses == 1 and refresher.hits == 1 and len(refresher) == 1
+    finally:
+        refresher.close()
+
+
+def test_stale_if_error(sim):
+    refresher = RefreshMiddleware(rules=[(r'sinap/crossRates', 0.1, True)], refresh_ahead=0.5, stale_if_error=0.5)
+    transport = FakeTransport(sim.handle, middleware=[refresher])
+    try:
+        rates = apihelper.cross_rates(sim.token, transport=transport)
+        sim.inject(503, endpoint='sinap/crossRates')
+        time.sleep(0.15)
+        # Фоновое обновление не удалось, ответ истек, но отдается последний успешный
+        assert apihelper.cross_rates(sim.token, transport=transport) == rates
+        assert refresher.stale_hits == 1
+        sent = len(transport.requests)
+        assert apihelper.cross_rates(sim.token, transport=transport) == rates
+        assert len(transport.requests) == sent
+        # После окна stale_if_error ошибка Qiwi API доходит до вызова
+        wait_for(lambda: len(refresher) == 0)
+        with pytest.raises(exceptions.APIError):
+            apihelper.cross_rates(sim.token, transport=transport)
+        sim.clear_faults()
+        assert apihelper.cross_rates(sim.token, transport=transport) == rates
+    finally:
+        refresher.close()
+
+
+def test_unused_responses_are_dropped(sim):
+    refresher = RefreshMiddleware(rules=[(r'sinap/crossRates', 0.05, True)], stale_if_error=0.05)
+    transport = FakeTransport(sim.handle, middleware=[refresher])
+    try:
+        apihelper.cross_rates(sim.token, transport=transport)
+        assert len(refresher) == 1
+        wait_for(lambda: len(refresher) == 0)
+        assert refresher.refreshes == 0 and len(transport.requests) == 1
+    finally:
+        refresher.close()
+    assert refresher._thread is None
+
+
+def test_client_error_drops_entry(sim):
+    refresher = RefreshMiddleware(rules=[(r'sinap/crossRates', 0.1, True)], refresh_ahead=0.5, stale_if_error=5)
+    transport = FakeTransport(sim.handle, middleware=[refresher])
+    try:
+        apihelper.cross_rates(sim.token, transport=transport)
+        assert apihelper.cross_rates(sim.token, transport=transport)
+        sim.inject(401, endpoint='sinap/crossRates')
+        # 401 не считается отказом сервиса: ответ удаляется, а не обновляется повторно до конца окна
+        wait_for(lambda: len(refresher) == 0)
+        sent = len(transport.requests)
+        time.sleep(0.2)
+        assert len(transport.requests) == sent
+        with pytest.raises(exceptions.APIError):
+            apihelper.cross_rates(sim.token, transport=transport)
+        assert refresher.stale_hits == 0
+    finally:
+        refresher.close()
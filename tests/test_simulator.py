@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from pyqiwi import Wallet, exceptions
+from pyqiwi.simulator import Simulator
+
+
+def test_history_pagination():
+    with Simulator(transactions=120) as sim:
+        wallet = Wallet(sim.token)
+        seen = []
+        page = wallet.history(rows=50)
+        while True:
+            seen.extend(t.txn_id for t in page['transactions'])
+            if not page['next_txn_id']:
+                break
+            page = wallet.history(rows=50, next_txn_date=page['next_txn_date'], next_txn_id=page['next_txn_id'])
+        assert len(seen) == 120
+        assert seen == sorted(seen, reverse=True)
+
+
+def test_payment_reaches_history():
+    with Simulator(transactions=5) as sim:
+        wallet = Wallet(sim.token)
+        balance = wallet.balance()
+        payment = wallet.qiwi_transfer('79000000001', 100, comment='hello')
+        assert payment.transaction.state == 'Accepted'
+        assert wallet.balance() == pytest.approx(balance - 102)
+        latest = wallet.history(rows=1)['transactions'][0]
+        assert str(latest.txn_id) == payment.transaction.id
+        assert latest.comment == 'hello'
+
+
+@pytest.mark.parametrize('status', [401, 404, 423, 503])
+def test_error_injection(status):
+    with Simulator(transactions=5) as sim:
+        wallet = Wallet(sim.token, contract_info=False)
+        wallet.number = sim.number
+        sim.inject(status, endpoint='payment-history', count=1)
+        with pytest.raises(exceptions.APIError) as e:
+            wallet.history()
+        assert e.value.request.status_code == status
+        assert wallet.history()['transactions']
+
+
+def test_unknown_token_and_latency():
+    with Simulator(transactions=5, latency=0.05) as sim:
+        with pytest.raises(exceptions.APIError) as e:
+            Wallet('wrong-token')
+        assert 'Invalid or expired token' in e.value.msg
+        started = time.monotonic()
+        Wallet(sim.token, contract_info=False).accounts
+        assert time.monotonic() - started >= 0.05
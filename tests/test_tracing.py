@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pytest
+
+from pyqiwi import Wallet, apihelper, exceptions, types
+from pyqiwi.retry import Retry
+from pyqiwi.simulator import Simulator
+from pyqiwi.tracing import Tracing
+from pyqiwi.transport import FakeTransport
+
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class ListTracer:
+    # Минимальный tracer с интерфейсом OpenTelemetry
+    def __init__(self):
+        self.spans = []
+        self._current = contextvars.ContextVar('current', default=None)
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = Span(name, self._current.get(), attributes)
+        self.spans.append(span)
+        token = self._current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = e
+            raise
+        finally:
+            self._current.reset(token)
+
+    def named(self, name):
+        return [span for span in self.spans if span.name == name]
+
+
+def test_tracing_disabled_by_default():
+    assert apihelper.tracer is None
+    assert types.observers == []
+
+
+def test_request_spans():
+    sim = Simulator(transactions=10)
+    failures = [ConnectionError('reset')]
+
+    def handler(request):
+        if request.family == 'payment-history' and failures:
+            raise failures.pop()
+        return sim.handle(request)
+
+    tracer = ListTracer()
+    transport = FakeTransport(handler, middleware=[Retry(backoff=0.001)])
+    with Tracing(tracer):
+        with tracer.start_as_current_span('report') as root:
+            wallet = Wallet(sim.token, sim.number, transport=transport)
+            history = wallet.history(rows=5)
+        with pytest.raises(exceptions.APIError):
+            apihelper.funding_sources('unknown', transport=transport)
+    assert apihelper.tracer is None
+    assert types.observers == []
+    assert len(history['transactions']) == 5
+
+    request = tracer.named('qiwi payment-history')[0]
+    assert request.parent is root
+    assert request.attributes['qiwi.family'] == 'payment-history'
+    assert request.attributes['http.request.method'] == 'GET'
+    assert request.attributes['http.response.status_code'] == 200
+    assert request.attributes['http.response.body.size'] > 0
+    assert request.attributes['qiwi.retries'] == 1
+    assert [span.parent for span in tracer.named('qiwi.decode')][1] is request
+
+    # Вложенные объекты собираются внутри span'а внешнего
+    transactions = [span for span in tracer.named('qiwi.build')
+                    if span.attributes['qiwi.type'] == 'Transaction']
+    assert len(transactions) == 5
+    assert all(span.parent is root for span in transactions)
+    assert {span.attributes['qiwi.type'] for span in tracer.named('qiwi.build')} == {'Profile', 'Transaction'}
+
+    failed = tracer.named('qiwi funding-sources')[-1]
+    assert failed.attributes['http.response.status_code'] == 401
+    assert isinstance(failed.error, exceptions.APIError)
+
+
+def test_context_propagates_to_threads():
+    sim = Simulator()
+    tracer = ListTracer()
+    transport = sim.transport()
+    with Tracing(tracer), ThreadPoolExecutor(2) as executor:
+        with tracer.start_as_current_span('batch') as root:
+            context = contextvars.copy_context()
+            executor.submit(context.run, apihelper.cross_rates, sim.token, transport=transport).result()
+    assert tracer.named('qiwi crossRates')[0].parent is root
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from pyqiwi import Wallet, apihelper, exceptions
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import (AsyncFakeTransport, DNSCache, FakeTransport, RequestsTransport, Response,
+                              SessionPool, Urllib3Transport, prewarm)
+
+
+def test_dns_cache(monkeypatch):
+    calls = []
+
+    def getaddrinfo(*args):
+        calls.append(args)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', args[1]))]
+
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    cache = DNSCache(ttl=60).install()
+    try:
+        for _ in range(3):
+            assert socket.getaddrinfo('edge.qiwi.com', 443)[0][4] == ('127.0.0.1', 443)
+    finally:
+        cache.uninstall()
+    assert socket.getaddrinfo is getaddrinfo
+    assert len(calls) == 1 and cache.hits == 2
+    cache.ttl = -1
+    cache.resolve('edge.qiwi.com')
+    cache.resolve('edge.qiwi.com')
+    assert len(calls) == 3
+
+
+def test_prewarm_opens_pooled_connections():
+    session = requests.session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=8)
+    session.mount('http://', adapter)
+    cache = DNSCache()
+    with Simulator(transactions=1, latency=0.01) as sim:
+        try:
+            report = prewarm(session, connections=6, dns_cache=cache)
+            # Заполненный кэш устанавливается, иначе соединения его не используют
+            assert socket.getaddrinfo == cache.getaddrinfo and cache.misses == 1 and cache.hits >= 6
+        finally:
+            cache.uninstall()
+        assert report.connections == 6 and not report.errors
+        pools = [adapter.poolmanager.pools[key] for key in adapter.poolmanager.pools.keys()]
+        assert len(pools) == 1
+        pool = pools[0]
+        assert pool.num_connections == 6
+        requests_before = sim.requests
+        for _ in range(3):
+            apihelper.funding_sources(sim.token, transport=session)
+        assert pool.num_connections == 6
+        assert sim.requests == requests_before + 3
+
+
+def test_prewarm_async_transport():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) == 3:
+            raise requests.exceptions.ConnectionError()
+        return Response(200)
+
+    transport = AsyncFakeTransport(handler)
+    report = asyncio.run(prewarm(transport, connections=3, base_url='https://edge.qiwi.com/{0}'))
+    assert calls == ['HEAD'] * 3
+    assert report.connections == 2 and len(report.errors) == 1
+
+
+def test_fake_transport_and_middleware():
+    calls = []
+
+    def outer(request, send):
+        calls.append('outer')
+        request.headers['X-Trace'] = '1'
+        return send(request)
+
+    def cached(request, send):
+        calls.append('cached')
+        if request.params.get('cached'):
+            return Response(200, b'{"cached": true}', request=request)
+        return send(request)
+
+    transport = FakeTransport(middleware=[outer, cached])
+    transport.add('get', 'funding-sources/v1/accounts/current', json={'accounts': []})
+    assert apihelper.funding_sources('token', transport=transport) == {'accounts': []}
+    assert apihelper.funding_sources('token', transport=transport, params={'cached': 1}) == {'cached': True}
+    assert calls == ['outer', 'cached'] * 2
+    assert len(transport.requests) == 1
+    request = transport.requests[0]
+    assert request.headers['X-Trace'] == '1' and request.headers['Authorization'] == 'Bearer token'
+    with pytest.raises(exceptions.APIError) as e:
+        apihelper.person_profile('token', True, True, True, transport=transport)
+    assert e.value.params == {'authInfoEnabled': 'true', 'contractInfoEnabled': 'true',
+                              'userInfoEnabled': 'true'}
+    assert e.value.method.startswith('/person-profile/v1/profile/current?authInfoEnabled=true')
+
+
+def test_simulator_transport_in_memory():
+    sim = Simulator(transactions=30)
+    wallet = Wallet(sim.token, transport=sim.transport())
+    assert wallet.number == sim.number
+    assert len(wallet.history(rows=20)['transactions']) == 20
+    assert sim.requests == 2
+
+
+@pytest.mark.parametrize('factory', [RequestsTransport, Urllib3Transport])
+def test_network_transports(factory):
+    with Simulator(transactions=30) as sim, factory() as transport:
+        wallet = Wallet(sim.token, transport=transport)
+        assert len(wallet.history(rows=10)['transactions']) == 10
+        assert wallet.get_commission('99').ranges
+        sim.inject(404, endpoint='payment-history/v2/transactions')
+        with pytest.raises(exceptions.APIError) as e:
+            wallet.transaction(1, 'IN')
+        assert e.value.method == '/payment-history/v2/transactions/1?type=IN'
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.request('get', 'http://127.0.0.1:1/', timeout=(1, 1))
+
+
+def test_async_transport():
+    async def middleware(request, send):
+        response = await send(request)
+        seen.append(response.status_code)
+        return response
+
+    seen = []
+    sim = Simulator(transactions=5)
+
+    async def main():
+        async with AsyncFakeTransport(sim.handle, middleware=[middleware]) as transport:
+            result = await apihelper.payment_history(sim.token, sim.number, 5, transport=transport)
+            assert len(result['data']) == 5
+            with pytest.raises(exceptions.APIError):
+                await apihelper.payment_history('unknown', sim.number, 5, transport=transport)
+
+    asyncio.run(main())
+    assert seen == [200, 401]
+
+
+def test_settings():
+    settings = apihelper.Settings(read_timeout=30, proxy={'https': 'http://127.0.0.1:3128'})
+    assert settings.api_url == apihelper.API_URL and settings.connect_timeout == apihelper.CONNECT_TIMEOUT
+    with pytest.raises(AttributeError):
+        settings.read_timeout = 1
+    changed = settings.replace(ad=False, proxy=None)
+    assert changed.ad is False and changed.proxy is None and changed.read_timeout == 30
+    transport = FakeTransport(Simulator().handle)
+    transport.settings = apihelper.Settings(connect_timeout=1, read_timeout=2, ad=False)
+    apihelper.payments('token-0', 99, 1, '79000000001', transport=transport)
+    request = transport.requests[-1]
+    assert request.timeout == (1, 2) and 'comment' not in request.json
+
+
+@pytest.mark.parametrize('size', [None, 4])
+@pytest.mark.parametrize('threads', [1, 8, 32, 128])
+def test_session_pool_stress(threads, size, monkeypatch):
+    with Simulator(wallets=8, transactions=5) as sim:
+        transport = SessionPool(size=size)
+        # Глобальные переменные, которые сломали бы запросы, если бы транспорт их читал
+        monkeypatch.setattr(apihelper, 'API_URL', 'http://127.0.0.1:1/{0}')
+        monkeypatch.setattr(apihelper, 'proxy', {'http': 'http://127.0.0.1:1'})
+        monkeypatch.setattr(apihelper, 'READ_TIMEOUT', 1e-6)
+        tokens = list(sim.wallets)
+
+        def work(i):
+            token = tokens[i % len(tokens)]
+            wallet = Wallet(token, transport=transport)
+            assert wallet.number == str(sim.wallets[token].number)
+            assert wallet.balance() == sim.wallets[token].balance
+            return len(wallet.history(rows=5)['transactions'])
+
+        with transport, ThreadPoolExecutor(max_workers=threads) as executor:
+            assert list(executor.map(work, range(threads * 2))) == [5] * threads * 2
+            assert 1 <= len(transport._sessions) <= (size or threads)
+        assert sim.requests == threads * 2 * 3
+
+
+def test_session_pool_closes_sessions_of_finished_threads():
+    class Session:
+        closed = False
+
+        def request(self, method, url, **kwargs):
+            return Response(200, b'{}', {}, 'OK')
+
+        def close(self):
+            self.closed = True
+
+    sessions = []
+    transport = SessionPool(factory=lambda: sessions.append(Session()) or sessions[-1])
+    for _ in range(3):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: apihelper.cross_rates('token', transport=transport), range(16)))
+    assert len(sessions) <= 12 and all(session.closed for session in sessions)
+    assert len(transport._sessions) == 0
+    apihelper.cross_rates('token', transport=transport)
+    assert len(transport._sessions) == 1
+    transport.close()
+    assert sessions[-1].closed and len(transport._sessions) == 0
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+
+import pytest
+
+from pyqiwi import apihelper, types
+from pyqiwi.simulator import Simulator
+
+
+def test_transaction_from_schema():
+    sim = Simulator(transactions=1)
+    row = apihelper.payment_history(sim.token, sim.number, 1, transport=sim.transport())['data'][0]
+    transaction = types.Transaction.de_json(row)
+    assert transaction.raw is row
+    assert transaction.txn_id == row['txnId']
+    assert transaction.date.isoformat() == row['date']
+    assert transaction.date.utcoffset() == datetime.timedelta(hours=3)
+    assert isinstance(transaction.sum, types.TransactionSum)
+    assert transaction.sum.amount == row['sum']['amount']
+    assert transaction.provider.short_name == row['provider']['shortName']
+    assert types.Transaction.de_json(json.dumps(row)).txn_id == row['txnId']
+
+
+def test_optional_and_conditional_fields():
+    account = types.Account.de_json({'alias': 'qw_wallet_rub', 'currency': 643, 'hasBalance': False, 'balance': 1})
+    assert account.balance is None and account.type is None and account.title is None
+    account = types.Account.de_json({'alias': 'qw_wallet_rub', 'currency': 643, 'hasBalance': True,
+                                     'balance': {'amount': 10, 'currency': 643},
+                                     'type': {'id': 'WALLET', 'title': 'QIWI Wallet'}})
+    assert account.balance == {'amount': 10, 'currency': 643}
+    assert account.type.id == 'WALLET'
+
+    ranges = [{'bound': 0, 'rate': 0.02}]
+    commission = types.Commission.de_json({'content': {'terms': {'commission': {'ranges': ranges}}}})
+    assert commission.ranges[0].rate == 0.02 and commission.ranges[0].fixed is None
+
+    payment = types.Payment.de_json({'id': '1', 'terms': '99', 'fields': {'account': '79000000001'},
+                                     'sum': {'amount': 1, 'currency': '643'}, 'source': 'account_643',
+                                     'transaction': {'id': '2', 'state': {'code': 'Accepted'}}})
+    assert payment.transaction.state == 'Accepted'
+    assert payment.fields.account == '79000000001'
+    assert payment.comment is None
+
+    rate = types.Rate.de_json({'from': '643', 'to': '840', 'rate': 0.016})
+    assert (rate._from, rate.to) == (643, 840)
+
+
+def test_nested_objects_match_de_json():
+    # Пустой необязательный объект - None, как у разбора вручную до генерации по схеме
+    account = types.Account.de_json({'alias': 'qw_wallet_rub', 'currency': 643, 'type': {}})
+    assert account.type is None
+    row = {'amount': 1, 'currency': 643}
+    online = {'providerId': 99, 'withdrawToEnrollmentRate': 1, 'withdrawSum': row, 'enrollmentSum': row,
+              'qwCommission': row, 'fundingSourceCommission': None}
+    with pytest.raises(ValueError):
+        types.OnlineCommission.de_json(online)
+    with pytest.raises(KeyError):
+        types.OnlineCommission.de_json({'providerId': 99, 'withdrawSum': row})
+    with pytest.raises(TypeError):
+        types.Statistics.de_json({'incomingTotal': None, 'outgoingTotal': []})
+
+
+def test_to_dict_and_to_json():
+    sim = Simulator()
+    profile = types.Profile.de_json(apihelper.person_profile(sim.token, True, True, True, transport=sim.transport()))
+    data = profile.to_dict()
+    assert set(data) == {'auth_info', 'contract_info', 'user_info'}
+    assert isinstance(data['auth_info']['pin_info'], dict)
+    assert isinstance(data['contract_info']['identification_info'], list)
+    decoded = json.loads(profile.to_json())
+    assert decoded['auth_info']['person_id'] == profile.auth_info.person_id
+    assert decoded['contract_info']['creation_date'] == profile.contract_info.creation_date.isoformat()
+
+    fields = types.PaymentFields.de_json({'account': '79000000001', 'comment': 'hi'})
+    assert fields.to_dict() == {'account': '79000000001', 'comment': 'hi'}
+
+
+def test_date_fallback():
+    assert types.JsonDeserializable.decode_date('2018-05-01T12:00:00.123+0300').microsecond == 123000
+    assert types.JsonDeserializable.decode_date('1 May 2018').day == 1
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+import pyqiwi
+from pyqiwi import Wallet, apihelper
+from pyqiwi.simulator import Simulator
+from pyqiwi.transport import FakeTransport
+
+# Те же проверки, что и в test_wallet.TestWallet, но без настоящего кошелька - на симуляторе Qiwi API
+
+
+@pytest.fixture(scope='module')
+def sim():
+    with Simulator(transactions=60) as sim:
+        yield sim
+
+
+@pytest.fixture
+def wallet(sim):
+    return Wallet(sim.token, number=sim.number)
+
+
+def test_create_wallet(sim):
+    assert Wallet(sim.token).number == sim.number
+
+
+def test_check_history(wallet):
+    history = wallet.history()
+    assert len(history['transactions']) == 20
+    for tnx in history['transactions']:
+        assert isinstance(tnx, pyqiwi.types.Transaction)
+    assert isinstance(history['next_txn_date'], datetime.datetime)
+    assert isinstance(history['next_txn_id'], int)
+
+
+def test_profile_stat_and_accounts(wallet):
+    assert isinstance(wallet.profile, pyqiwi.types.Profile)
+    assert isinstance(wallet.stat(), pyqiwi.types.Statistics)
+    accounts = wallet.offered_accounts
+    assert accounts
+    for account in accounts:
+        assert isinstance(account, pyqiwi.types.Account)
+
+
+def test_commission(wallet):
+    commission = wallet.get_commission('26476')
+    assert isinstance(commission, pyqiwi.types.Commission)
+    rate = commission.ranges[0].rate
+    online_commission = wallet.commission('26476', wallet.number, 100)
+    assert online_commission.qw_commission.amount == pytest.approx(100 * rate)
+
+
+def test_cross_rates(wallet):
+    rates = wallet.cross_rates
+    assert rates
+    for rate in rates:
+        assert isinstance(rate, pyqiwi.types.Rate)
+
+
+def test_webhooks(sim, wallet):
+    # Без зарегистрированного обработчика тестовое уведомление не отправить
+    with pytest.raises(pyqiwi.exceptions.APIError):
+        apihelper.send_test_webhook(sim.token)
+    hook = wallet.register_webhook('https://example.com/qiwi')
+    assert wallet.active_webhook['hookId'] == hook['hookId']
+    assert apihelper.send_test_webhook(sim.token) == {'response': 'Webhook sent'}
+    assert wallet.webhook_key(hook['hookId'])
+    wallet.delete_webhook(hook['hookId'])
+    with pytest.raises(pyqiwi.exceptions.APIError):
+        wallet.active_webhook
+
+
+def test_bulk_transactions(monkeypatch):
+    sim = Simulator(transactions=10)
+    transport = FakeTransport(sim.handle)
+    wallet = Wallet(sim.token, transport=transport)
+    rows = wallet.history(rows=10)['transactions']
+    waiting, failed = rows[0].raw, dict(rows[1].raw, status='ERROR')
+    transport.add('get', 'payment-history/v2/transactions/{0}'.format(waiting['txnId']),
+                  json=dict(waiting, status='WAITING'))
+    transport.add('get', 'payment-history/v2/transactions/{0}'.format(failed['txnId']), json=failed)
+    ids = [(t.txn_id, t.type) for t in rows]
+
+    sent = len(transport.requests)
+    result = wallet.transactions(ids + ids[:3] + [str(rows[2].txn_id)], txn_type=rows[2].type)
+    assert len(transport.requests) - sent == 10
+    assert list(result) == ids + [str(rows[2].txn_id)]
+    assert [result[key].txn_id for key in ids] == [t.txn_id for t in rows]
+    assert result[ids[0]].status == 'WAITING' and result[ids[1]].status == 'ERROR'
+
+    # Завершенные транзакции больше не запрашиваются
+    sent = len(transport.requests)
+    assert wallet.transactions(reversed(ids))[ids[0]].status == 'WAITING'
+    assert len(transport.requests) - sent == 1
+    assert transport.requests[-1].url.endswith('/{0}?type={1}'.format(*ids[0]))
+
+    executor = pyqiwi._executor
+    assert executor is not None
+    with pytest.raises(ValueError):
+        wallet.transactions([rows[2].txn_id])
+
+    sim.inject(500, endpoint='payment-history/v2/transactions')
+    with pytest.raises(pyqiwi.exceptions.APIError):
+        Wallet(sim.token, transport=transport).transactions(ids[2:])
+    assert wallet.transactions(ids[1:])[ids[1]].status == 'ERROR'
+
+    sim.clear_faults()
+    # Запоминаются только последние FINAL_TRANSACTIONS_SIZE завершенных транзакций
+    monkeypatch.setattr(pyqiwi, 'FINAL_TRANSACTIONS_SIZE', 3)
+    wallet = Wallet(sim.token, transport=transport)
+    wallet.transactions(ids[1:])
+    assert list(wallet._final_transactions) == [(str(t.txn_id), t.type) for t in rows[-3:]]
+    assert pyqiwi._executor is executor
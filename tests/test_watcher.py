@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from pyqiwi import Wallet, apihelper
+from pyqiwi.watcher import PaymentWatcher, SeenSet
+
+
+def make_row(txn_id):
+    amount = {'amount': 10.0, 'currency': 643}
+    return {'txnId': txn_id, 'personId': 79000000000, 'date': '2018-05-06T12:00:{0:02d}+03:00'.format(txn_id % 60),
+            'errorCode': 0, 'error': None, 'status': 'SUCCESS', 'type': 'IN', 'statusText': 'Success',
+            'trmTxnId': str(txn_id), 'account': '+79000000001', 'sum': amount, 'commission': amount,
+            'total': amount, 'provider': {'id': 99, 'shortName': 'QIWI', 'longName': 'QIWI', 'logoUrl': None,
+                                          'description': None, 'keys': None, 'siteUrl': None},
+            'source': [], 'comment': 'order-{0}'.format(txn_id), 'currencyRate': 1, 'features': {},
+            'view': {}}
+
+
+class FakeHistory:
+    def __init__(self):
+        self.txn_ids = []
+        self.calls = 0
+
+    def __call__(self, token, number, rows, operation=None, next_txn_id=None, **kwargs):
+        self.calls += 1
+        ids = sorted(self.txn_ids, reverse=True)
+        if next_txn_id is not None:
+            ids = [txn_id for txn_id in ids if txn_id < next_txn_id]
+        page = ids[:rows]
+        result = {'data': [make_row(txn_id) for txn_id in page], 'nextTxnDate': None, 'nextTxnId': None}
+        if len(ids) > rows:
+            result['nextTxnDate'] = make_row(page[-1])['date']
+            result['nextTxnId'] = page[-1]
+        return result
+
+
+def test_seen_set_is_bounded():
+    seen = SeenSet(3)
+    for item in range(5):
+        assert seen.add(item)
+    assert not seen.add(4)
+    assert len(seen) == 3 and 0 not in seen and 1 not in seen
+
+
+def test_watcher_dispatches_only_new(monkeypatch):
+    history = FakeHistory()
+    history.txn_ids = [1, 2, 3]
+    monkeypatch.setattr(apihelper, 'payment_history', history)
+    watcher = PaymentWatcher(Wallet('token', number='79000000000', contract_info=False),
+                             min_interval=1, max_interval=8, rows=2)
+    received = []
+    watcher.add_callback(received.append)
+
+    assert watcher.poll() == []
+    assert watcher.interval == 2
+    history.txn_ids += [4, 5, 6, 7, 8]
+    new = watcher.poll()
+    assert [t.txn_id for t in new] == [4, 5, 6, 7, 8]
+    assert [t.txn_id for t in received] == [4, 5, 6, 7, 8]
+    assert watcher.interval == 1
+
+    history.calls = 0
+    assert watcher.poll() == []
+    assert history.calls == 1
+    assert watcher.interval == 2
+
+
+def test_watcher_retries_failed_callback(monkeypatch):
+    history = FakeHistory()
+    history.txn_ids = [1, 2, 3]
+    monkeypatch.setattr(apihelper, 'payment_history', history)
+    watcher = PaymentWatcher(Wallet('token', number='79000000000', contract_info=False), since=1)
+    received = []
+    failures = [RuntimeError('database is down')]
+
+    def callback(transaction):
+        if transaction.txn_id == 3 and failures:
+            raise failures.pop()
+        received.append(transaction.txn_id)
+
+    watcher.add_callback(callback)
+    with pytest.raises(RuntimeError):
+        watcher.poll()
+    assert 2 in watcher.seen and 3 not in watcher.seen
+    assert [t.txn_id for t in watcher.poll()] == [3]
+    assert received == [2, 3]
+
+
+def test_stop_right_after_start(monkeypatch):
+    monkeypatch.setattr(apihelper, 'payment_history', FakeHistory())
+    watcher = PaymentWatcher(Wallet('token', number='79000000000', contract_info=False), min_interval=60)
+    thread = watcher.start()
+    watcher.stop()
+    assert not thread.is_alive()
+
+
+def test_watcher_queue(monkeypatch):
+    history = FakeHistory()
+    history.txn_ids = [10, 11]
+    monkeypatch.setattr(apihelper, 'payment_history', history)
+    watcher = PaymentWatcher(Wallet('token', number='79000000000', contract_info=False), since=10)
+
+    async def consume():
+        queue = watcher.add_queue(asyncio.Queue())
+        await asyncio.get_running_loop().run_in_executor(None, watcher.poll)
+        return await asyncio.wait_for(queue.get(), 1)
+
+    assert asyncio.run(consume()).txn_id == 11
+
+
+def test_run_async_stops_without_waiting_and_restarts(monkeypatch):
+    history = FakeHistory()
+    history.txn_ids = [1]
+    monkeypatch.setattr(apihelper, 'payment_history', history)
+    watcher = PaymentWatcher(Wallet('token', number='79000000000', contract_info=False), min_interval=30)
+
+    async def run_then_stop():
+        calls = history.calls
+        task = asyncio.ensure_future(watcher.run_async())
+        while history.calls == calls:
+            await asyncio.sleep(0.01)
+        # stop() из другого потока прерывает ожидание следующего опроса
+        await asyncio.get_running_loop().run_in_executor(None, watcher.stop)
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(run_then_stop())
+    assert history.calls == 1
+    # После stop() опрос запускается снова
+    asyncio.run(run_then_stop())
+    assert history.calls == 2
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import base64
+import datetime
+import json
+
+import pytest
+
+from pyqiwi import exceptions, webhook
+
+KEY = base64.b64encode(b'secret-key').decode()
+
+
+def make_payment(txn_id, amount=100.5):
+    return {'txnId': str(txn_id), 'date': '2018-06-27T13:39:00+03:00', 'type': 'IN', 'status': 'SUCCESS',
+            'errorCode': '0', 'personId': 78000008000, 'account': '+79165238345', 'comment': 'order-1',
+            'provider': 7, 'sum': {'amount': amount, 'currency': 643},
+            'commission': {'amount': 0, 'currency': 643}, 'total': {'amount': amount, 'currency': 643}}
+
+
+def test_signature_roundtrip():
+    notification = webhook.make_notification(make_payment(1), KEY)
+    webhook.verify(notification, KEY)
+    notification['payment']['sum']['amount'] = 1000
+    with pytest.raises(exceptions.SignatureError):
+        webhook.verify(notification, KEY)
+
+
+def test_receiver_over_http():
+    receiver = webhook.WebhookReceiver(KEY)
+    received = []
+    receiver.add_handler(received.append)
+    server = receiver.serve('127.0.0.1', 0, background=True)
+    url = 'http://127.0.0.1:{0}/'.format(server.server_address[1])
+    try:
+        assert webhook.send_notification(url, make_payment(11), KEY) == 200
+        assert webhook.send_notification(url, make_payment(11), KEY) == 200
+        assert webhook.send_notification(url, make_payment(12), base64.b64encode(b'other').decode()) == 403
+    finally:
+        receiver.shutdown()
+    assert len(received) == 1
+    transaction = received[0]
+    assert transaction.txn_id == 11
+    assert transaction.sum.amount == 100.5
+    assert transaction.provider.id == 7
+    assert receiver.last_date == transaction.date
+
+
+def test_gap_fill():
+    class FakeWallet:
+        def history_since(self, since, operation=None):
+            self.since = since
+            return [webhook.to_transaction(make_payment(txn_id)) for txn_id in (3, 2)]
+
+    wallet = FakeWallet()
+    receiver = webhook.WebhookReceiver(KEY, wallet=wallet, since=datetime.datetime(2018, 6, 27))
+    receiver.handle(json.dumps(webhook.make_notification(make_payment(2), KEY)))
+    filled = receiver.gap_fill()
+    assert [t.txn_id for t in filled] == [3]
+    assert wallet.since.tzinfo is not None
+
+
+def test_redelivery_after_handler_failure():
+    receiver = webhook.WebhookReceiver(KEY)
+    received = []
+
+    def handler(transaction):
+        if not received:
+            received.append(None)
+            raise RuntimeError('database is down')
+        received.append(transaction)
+
+    receiver.add_handler(handler)
+    body = json.dumps(webhook.make_notification(make_payment(21), KEY))
+    with pytest.raises(RuntimeError):
+        receiver.handle(body)
+    assert receiver.last_date is None
+    # Qiwi повторяет уведомление после ответа 500, и платеж доходит до обработчика
+    assert receiver.handle(body).txn_id == 21
+    assert receiver.handle(body) is None
+    assert [t.txn_id for t in received[1:]] == [21]
+
+
+def test_missing_signed_field():
+    notification = webhook.make_notification(make_payment(31), KEY)
+    del notification['payment']['account']
+    with pytest.raises(exceptions.SignatureError):
+        webhook.verify(notification, KEY)
+    notification['payment']['sum'] = '100.5'
+    with pytest.raises(exceptions.SignatureError):
+        webhook.WebhookReceiver(KEY).handle(json.dumps(notification))